@@ -2,7 +2,6 @@
 This file contains the different actions that can be made by a Player.
 """
 from __future__ import annotations
-import pygame
 from block import Block, ROT_CW, ROT_CCW, SWAP_HORZ, SWAP_VERT
 
 
@@ -35,6 +34,14 @@ class Action:
         """
         raise NotImplementedError
 
+    def can_apply(self, block: Block, extra_info: dict) -> bool:
+        """
+        Return True iff this action can be successfully applied to the given
+        <block>, without mutating it. <extra_info> contains the same values
+        that would be passed to apply.
+        """
+        raise NotImplementedError
+
 
 class RotateClockwise(Action):
     """Rotate clockwise action"""
@@ -45,6 +52,9 @@ class RotateClockwise(Action):
     def apply(self, block: Block, extra_info: dict) -> bool:
         return block.rotate(ROT_CW)
 
+    def can_apply(self, block: Block, extra_info: dict) -> bool:
+        return block.children != []
+
 
 class RotateCounterClockwise(Action):
     """Rotate counterclockwise action"""
@@ -55,6 +65,9 @@ class RotateCounterClockwise(Action):
     def apply(self, block: Block, extra_info: dict) -> bool:
         return block.rotate(ROT_CCW)
 
+    def can_apply(self, block: Block, extra_info: dict) -> bool:
+        return block.children != []
+
 
 class SwapHorizontal(Action):
     """swap horizontal action"""
@@ -65,6 +78,9 @@ class SwapHorizontal(Action):
     def apply(self, block: Block, extra_info: dict) -> bool:
         return block.swap(SWAP_HORZ)
 
+    def can_apply(self, block: Block, extra_info: dict) -> bool:
+        return block.children != []
+
 
 class SwapVertical(Action):
     """swap vertical action"""
@@ -75,6 +91,9 @@ class SwapVertical(Action):
     def apply(self, block: Block, extra_info: dict) -> bool:
         return block.swap(SWAP_VERT)
 
+    def can_apply(self, block: Block, extra_info: dict) -> bool:
+        return block.children != []
+
 
 class Smash(Action):
     """smash action"""
@@ -85,6 +104,9 @@ class Smash(Action):
     def apply(self, block: Block, extra_info: dict) -> bool:
         return block.smash()
 
+    def can_apply(self, block: Block, extra_info: dict) -> bool:
+        return block.smashable()
+
 
 class Combine(Action):
     """combine action"""
@@ -95,6 +117,9 @@ class Combine(Action):
     def apply(self, block: Block, extra_info: dict) -> bool:
         return block.combine()
 
+    def can_apply(self, block: Block, extra_info: dict) -> bool:
+        return block.combinable()
+
 
 class Paint(Action):
     """paint action"""
@@ -105,6 +130,9 @@ class Paint(Action):
     def apply(self, block: Block, extra_info: dict) -> bool:
         return block.paint(extra_info['colour'])
 
+    def can_apply(self, block: Block, extra_info: dict) -> bool:
+        return block.paintable(extra_info['colour'])
+
 
 class Pass(Action):
     """pass action"""
@@ -115,6 +143,9 @@ class Pass(Action):
     def apply(self, block: Block, extra_info: dict) -> bool:
         return True
 
+    def can_apply(self, block: Block, extra_info: dict) -> bool:
+        return True
+
 
 # Actions that can be performed in the game
 ROTATE_CLOCKWISE = RotateClockwise()
@@ -125,14 +156,3 @@ SMASH = Smash()
 COMBINE = Combine()
 PAINT = Paint()
 PASS = Pass()
-
-KEY_ACTION = {
-    pygame.K_d: ROTATE_CLOCKWISE,
-    pygame.K_a: ROTATE_COUNTER_CLOCKWISE,
-    pygame.K_q: SWAP_HORIZONTAL,
-    pygame.K_e: SWAP_VERTICAL,
-    pygame.K_SPACE: SMASH,
-    pygame.K_c: COMBINE,
-    pygame.K_r: PAINT,
-    pygame.K_TAB: PASS
-}
@@ -0,0 +1,470 @@
+""" Module Description:
+
+This file contains the BatchBoards class, which stores thousands of Blocky
+boards in NumPy arrays and applies actions and scores goals on all of them at
+once, along with batch equivalents of the RandomPlayer and SmartPlayer
+policies.
+
+Every board is stored as an implicit complete quadtree of depth max_depth,
+with the same heap layout as a HeapBoard.
+"""
+from __future__ import annotations
+import math
+
+import numpy as np
+
+from block import Block, ROT_CW, ROT_CCW, SWAP_HORZ, SWAP_VERT
+from heap_board import ROTATION_MAPS, SWAP_MAPS, first_descendant, \
+    num_nodes, subtree_permutation
+from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, COMBINE, PAINT, PASS
+from settings import COLOUR_LIST
+
+# The actions of a batch, in the order of their action ids.
+BATCH_ACTIONS = [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, SWAP_HORIZONTAL,
+                 SWAP_VERTICAL, SMASH, COMBINE, PAINT, PASS]
+ROTATE_CW_ID, ROTATE_CCW_ID, SWAP_HORZ_ID, SWAP_VERT_ID, SMASH_ID, \
+    COMBINE_ID, PAINT_ID, PASS_ID = range(len(BATCH_ACTIONS))
+# The penalty of each action, by action id.
+PENALTIES = np.array([action.penalty for action in BATCH_ACTIONS])
+
+# The goal kinds of a batch.
+PERIMETER = 0
+BLOB = 1
+
+# How the index of a child changes under each rotation and swap, by action id.
+_CHILD_MAPS = {ROTATE_CW_ID: ROTATION_MAPS[ROT_CW],
+               ROTATE_CCW_ID: ROTATION_MAPS[ROT_CCW],
+               SWAP_HORZ_ID: SWAP_MAPS[SWAP_HORZ],
+               SWAP_VERT_ID: SWAP_MAPS[SWAP_VERT]}
+
+
+class BatchBoards:
+    """A batch of Blocky boards with the same max_depth, stored as arrays.
+
+    Instance Attributes:
+    - max_depth: The max_depth of every board.
+    - split: An array with one row per board and one column per heap index,
+             that is True iff the node at that heap index has children.
+    - colour: An array of the same shape as split, that contains the index in
+              COLOUR_LIST of the colour of each leaf, and -1 for every other
+              heap index.
+    - levels: The level of the node at each heap index.
+
+    Private Instance Attributes:
+    - _rng: The random number generator used to smash blocks and to choose
+            random moves.
+    - _permutations: A dictionary mapping an action id and a depth to the
+                     permutation of the descendants at that depth below a node
+                     that the action causes, as in subtree_permutation.
+    - _cells: The column and row of the unit cell of each node at max_depth,
+              in heap order.
+
+    Representation Invariants:
+    - A heap index that is not a node of a board has split False and colour -1.
+    - split[b, i] is True only if level[i] < max_depth.
+    """
+    max_depth: int
+    split: np.ndarray
+    colour: np.ndarray
+    levels: np.ndarray
+    _rng: np.random.Generator
+    _permutations: dict[tuple[int, int], np.ndarray]
+    _cells: tuple[np.ndarray, np.ndarray]
+
+    def __init__(self, num_boards: int, max_depth: int,
+                 rng: np.random.Generator | None = None) -> None:
+        """Initialize this batch with <num_boards> boards of <max_depth> that
+        are undivided and have a random colour.
+
+        >>> boards = BatchBoards(3, 2)
+        >>> boards.split.shape
+        (3, 21)
+        >>> bool((boards.colour[:, 0] >= 0).all())
+        True
+        """
+        self.max_depth = max_depth
+        self._rng = np.random.default_rng() if rng is None else rng
+        self.split = np.zeros((num_boards, num_nodes(max_depth)), dtype=bool)
+        self.colour = np.full((num_boards, num_nodes(max_depth)), -1,
+                              dtype=np.int8)
+        self.colour[:, 0] = self._rng.integers(0, len(COLOUR_LIST),
+                                               num_boards)
+        self.levels = np.zeros(num_nodes(max_depth), dtype=np.int64)
+        for level in range(max_depth + 1):
+            self.levels[num_nodes(level - 1) if level > 0 else 0:
+                        num_nodes(level)] = level
+        self._permutations = {}
+        for action_id in _CHILD_MAPS:
+            for depth in range(1, max_depth + 1):
+                self._permutations[action_id, depth] = np.array(
+                    subtree_permutation(_CHILD_MAPS[action_id], depth,
+                                        action_id in (ROTATE_CW_ID,
+                                                      ROTATE_CCW_ID)))
+        cols = np.zeros(4 ** max_depth, dtype=np.int64)
+        rows = np.zeros(4 ** max_depth, dtype=np.int64)
+        offsets = np.arange(4 ** max_depth)
+        for k in range(max_depth):
+            half = 2 ** (max_depth - 1 - k)
+            digit = (offsets // 4 ** (max_depth - 1 - k)) % 4
+            cols += np.array([half, 0, 0, half])[digit]
+            rows += np.array([0, 0, half, half])[digit]
+        self._cells = (cols, rows)
+
+    def __len__(self) -> int:
+        return self.split.shape[0]
+
+    def copy(self) -> BatchBoards:
+        """Return a copy of this batch that shares no arrays with it.
+        """
+        copy = BatchBoards.__new__(BatchBoards)
+        copy.max_depth = self.max_depth
+        copy.split = self.split.copy()
+        copy.colour = self.colour.copy()
+        copy.levels = self.levels
+        copy._rng = self._rng
+        copy._permutations = self._permutations
+        copy._cells = self._cells
+        return copy
+
+    def set_board(self, b: int, block: Block) -> None:
+        """Replace board <b> of this batch with <block>.
+
+        Preconditions:
+        - block.level == 0 and block.max_depth == self.max_depth
+        """
+        self.split[b] = False
+        self.colour[b] = -1
+        stack = [(block, 0)]
+        while stack:
+            block, node = stack.pop()
+            if block.children == []:
+                self.colour[b, node] = COLOUR_LIST.index(block.colour)
+            else:
+                self.split[b, node] = True
+                for k in range(4):
+                    stack.append((block.children[k], 4 * node + 1 + k))
+
+    def to_block(self, b: int) -> Block:
+        """Return board <b> of this batch as a Block.
+
+        >>> from block import generate_board
+        >>> board = generate_board(3)
+        >>> boards = BatchBoards(1, 3)
+        >>> boards.set_board(0, board)
+        >>> boards.to_block(0) == board
+        True
+        """
+        root = Block(None, 0, self.max_depth)
+        stack = [(root, 0)]
+        while stack:
+            block, node = stack.pop()
+            if self.split[b, node]:
+                block.children = [Block(None, block.level + 1, self.max_depth)
+                                  for _ in range(4)]
+                for k in range(4):
+                    stack.append((block.children[k], 4 * node + 1 + k))
+            else:
+                block.colour = COLOUR_LIST[self.colour[b, node]]
+        return root
+
+    def _by_level(self, boards: np.ndarray, nodes: np.ndarray) \
+            -> list[tuple[int, np.ndarray, np.ndarray]]:
+        """Return a list of tuples, one for each level of the <nodes>, that
+        contain the level and the <boards> and <nodes> at that level.
+        """
+        node_levels = self.levels[nodes]
+        return [(level, boards[node_levels == level],
+                 nodes[node_levels == level])
+                for level in np.unique(node_levels)]
+
+    def _permute(self, boards: np.ndarray, nodes: np.ndarray,
+                 action_id: int) -> np.ndarray:
+        """Rotate or swap the node <nodes>[k] of board <boards>[k], for every
+        k, according to <action_id>.
+
+        Return an array that is True for every k such that the action was
+        performed.
+        """
+        valid = self.split[boards, nodes]
+        for level, group, targets in self._by_level(boards[valid],
+                                                    nodes[valid]):
+            rows = group[:, None]
+            for depth in range(1, self.max_depth - level + 1):
+                start = first_descendant(targets, depth)[:, None]
+                span = start + np.arange(4 ** depth)
+                source = start + self._permutations[action_id, depth]
+                self.split[rows, span] = self.split[rows, source]
+                self.colour[rows, span] = self.colour[rows, source]
+        return valid
+
+    def _smash(self, boards: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        """Smash the node <nodes>[k] of board <boards>[k], for every k, with
+        the same random procedure as Block.smash.
+
+        Return an array that is True for every k such that the smash was
+        performed.
+        """
+        valid = (self.colour[boards, nodes] >= 0) & (self.levels[nodes]
+                                                     < self.max_depth)
+        for level, group, targets in self._by_level(boards[valid],
+                                                    nodes[valid]):
+            self.split[group, targets] = True
+            self.colour[group, targets] = -1
+            rows = group[:, None]
+            active = np.ones((len(group), 1), dtype=bool)
+            for depth in range(1, self.max_depth - level + 1):
+                active = np.repeat(active, 4, axis=1)
+                span = (first_descendant(targets, depth)[:, None]
+                        + np.arange(4 ** depth))
+                if level + depth < self.max_depth:
+                    chance = math.exp(-0.25 * (level + depth - 1))
+                    smashed = active & (self._rng.random(active.shape)
+                                        < chance)
+                else:
+                    smashed = np.zeros(active.shape, dtype=bool)
+                colours = self._rng.integers(0, len(COLOUR_LIST),
+                                             active.shape)
+                self.split[rows, span] = smashed
+                self.colour[rows, span] = np.where(active & ~smashed,
+                                                   colours, -1)
+                active = smashed
+        return valid
+
+    def _majority(self, boards: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        """Return the index of the majority colour of the children of node
+        <nodes>[k] of board <boards>[k], for every k, or -1 if any child is not
+        a leaf or there is no majority colour.
+
+        Preconditions:
+        - Every node in <nodes> is above max_depth.
+        """
+        children = self.colour[boards[:, None],
+                               4 * nodes[:, None] + 1 + np.arange(4)]
+        counts = (children[:, :, None] == np.arange(len(COLOUR_LIST))).sum(1)
+        most = counts.max(axis=1)
+        unique = (counts == most[:, None]).sum(axis=1) == 1
+        valid = (children >= 0).all(axis=1) & unique
+        return np.where(valid, counts.argmax(axis=1), -1)
+
+    def _combine(self, boards: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        """Combine the node <nodes>[k] of board <boards>[k], for every k.
+
+        Return an array that is True for every k such that the combine was
+        performed.
+        """
+        valid = self.split[boards, nodes]
+        majority = np.full(len(boards), -1)
+        majority[valid] = self._majority(boards[valid], nodes[valid])
+        valid = majority >= 0
+        boards, nodes = boards[valid], nodes[valid]
+        self.split[boards, nodes] = False
+        self.colour[boards, nodes] = majority[valid]
+        self.colour[boards[:, None], 4 * nodes[:, None] + 1 + np.arange(4)] = -1
+        return valid
+
+    def _paint(self, boards: np.ndarray, nodes: np.ndarray,
+               colours: np.ndarray) -> np.ndarray:
+        """Paint the node <nodes>[k] of board <boards>[k] with the colour with
+        index <colours>[k], for every k.
+
+        Return an array that is True for every k such that the paint was
+        performed.
+        """
+        current = self.colour[boards, nodes]
+        valid = ((current >= 0) & (current != colours)
+                 & (self.levels[nodes] == self.max_depth))
+        self.colour[boards[valid], nodes[valid]] = colours[valid]
+        return valid
+
+    def apply(self, actions: np.ndarray, nodes: np.ndarray,
+              colours: np.ndarray) -> np.ndarray:
+        """Apply the action with id <actions>[b] to the node <nodes>[b] of
+        board b, painting with the colour with index <colours>[b], for every
+        board b of this batch.
+
+        Return an array that is True for every board on which the action was
+        successfully applied.
+        """
+        success = np.zeros(len(self), dtype=bool)
+        for action_id in range(len(BATCH_ACTIONS)):
+            boards = np.flatnonzero(actions == action_id)
+            if action_id == PASS_ID:
+                success[boards] = True
+            elif action_id == SMASH_ID:
+                success[boards] = self._smash(boards, nodes[boards])
+            elif action_id == COMBINE_ID:
+                success[boards] = self._combine(boards, nodes[boards])
+            elif action_id == PAINT_ID:
+                success[boards] = self._paint(boards, nodes[boards],
+                                              colours[boards])
+            else:
+                success[boards] = self._permute(boards, nodes[boards],
+                                                action_id)
+        return success
+
+    def valid_moves(self, colours: np.ndarray) -> np.ndarray:
+        """Return an array with one row per board and one column per action id
+        other than PASS and heap index, that is True iff the action can be
+        applied to that node of that board, painting with the colour with
+        index <colours>[b] for board b.
+        """
+        leaf = self.colour >= 0
+        internal = num_nodes(self.max_depth - 1)
+        combinable = np.zeros(self.split.shape, dtype=bool)
+        boards, nodes = np.nonzero(self.split[:, :internal])
+        combinable[boards, nodes] = self._majority(boards, nodes) >= 0
+        at_max_depth = self.levels == self.max_depth
+        moves = np.zeros((len(self), len(BATCH_ACTIONS) - 1,
+                          self.split.shape[1]), dtype=bool)
+        for action_id in _CHILD_MAPS:
+            moves[:, action_id] = self.split
+        moves[:, SMASH_ID] = leaf & ~at_max_depth
+        moves[:, COMBINE_ID] = combinable
+        moves[:, PAINT_ID] = (leaf & at_max_depth
+                              & (self.colour != colours[:, None]))
+        return moves
+
+    def grid(self) -> np.ndarray:
+        """Return an array with one row per board, whose entry [b, i, j] is
+        the index of the colour of the unit cell at column i and row j of board
+        b, like flatten.
+        """
+        colour = self.colour.astype(np.int64)
+        for level in range(1, self.max_depth + 1):
+            span = np.arange(num_nodes(level - 1), num_nodes(level))
+            colour[:, span] = np.where(colour[:, span] >= 0, colour[:, span],
+                                       colour[:, (span - 1) // 4])
+        size = 2 ** self.max_depth
+        grid = np.zeros((len(self), size, size), dtype=np.int64)
+        cols, rows = self._cells
+        grid[:, cols, rows] = colour[:, num_nodes(self.max_depth - 1):]
+        return grid
+
+    def perimeter_scores(self, colours: np.ndarray) -> np.ndarray:
+        """Return the PerimeterGoal score of every board for the colour with
+        index <colours>[b] on board b.
+        """
+        return _perimeter_counts(self.grid() == colours[:, None, None])
+
+    def blob_scores(self, colours: np.ndarray) -> np.ndarray:
+        """Return the BlobGoal score of every board for the colour with index
+        <colours>[b] on board b.
+        """
+        return _largest_blobs(self.grid() == colours[:, None, None])
+
+    def scores(self, kinds: np.ndarray, colours: np.ndarray) -> np.ndarray:
+        """Return the score of the goal of every board, where board b has a
+        goal of kind <kinds>[b] (PERIMETER or BLOB) for the colour with index
+        <colours>[b].
+        """
+        mask = self.grid() == colours[:, None, None]
+        scores = _perimeter_counts(mask)
+        blobs = kinds == BLOB
+        if blobs.any():
+            scores[blobs] = _largest_blobs(mask[blobs])
+        return scores
+
+
+def _perimeter_counts(mask: np.ndarray) -> np.ndarray:
+    """Return the number of True unit cells on the perimeter of each board in
+    <mask>, where corner cells count twice.
+    """
+    return (mask[:, 0, :].sum(axis=1) + mask[:, -1, :].sum(axis=1)
+            + mask[:, :, 0].sum(axis=1) + mask[:, :, -1].sum(axis=1))
+
+
+def _largest_blobs(mask: np.ndarray) -> np.ndarray:
+    """Return the size of the largest connected group of True unit cells on
+    each board in <mask>.
+
+    The cells of every blob are labelled with the largest label in the blob,
+    by repeatedly spreading labels to neighbouring cells in the blob. Boards
+    are dropped from the spreading once none of their labels change.
+    """
+    cells = mask.shape[1] * mask.shape[2]
+    labels = np.where(mask, np.arange(1, cells + 1).reshape(mask.shape[1:]),
+                      0)
+    active = np.arange(len(mask))
+    while len(active) > 0:
+        current = labels[active]
+        spread = current.copy()
+        spread[:, 1:, :] = np.maximum(spread[:, 1:, :], current[:, :-1, :])
+        spread[:, :-1, :] = np.maximum(spread[:, :-1, :], current[:, 1:, :])
+        spread[:, :, 1:] = np.maximum(spread[:, :, 1:], current[:, :, :-1])
+        spread[:, :, :-1] = np.maximum(spread[:, :, :-1], current[:, :, 1:])
+        spread = np.where(mask[active], spread, 0)
+        changed = (spread != current).any(axis=(1, 2))
+        labels[active] = spread
+        active = active[changed]
+    offsets = np.arange(len(mask))[:, None, None] * (cells + 1)
+    sizes = np.bincount((labels + offsets).ravel(),
+                        minlength=len(mask) * (cells + 1))
+    sizes = sizes.reshape(len(mask), cells + 1)
+    sizes[:, 0] = 0
+    return sizes.max(axis=1)
+
+
+def random_boards(num_boards: int, max_depth: int,
+                  rng: np.random.Generator | None = None) -> BatchBoards:
+    """Return a batch of <num_boards> random boards of <max_depth>, generated
+    the same way as generate_board.
+    """
+    boards = BatchBoards(num_boards, max_depth, rng)
+    boards.apply(np.full(num_boards, SMASH_ID), np.zeros(num_boards, dtype=int),
+                 np.zeros(num_boards, dtype=int))
+    return boards
+
+
+def batch_random_moves(boards: BatchBoards, colours: np.ndarray) \
+        -> tuple[np.ndarray, np.ndarray]:
+    """Return the action ids and heap indices of a uniformly random valid move
+    on every board of <boards>, like RandomPlayer, painting with the colour
+    with index <colours>[b] on board b.
+
+    The action is PASS on the boards that have no valid move.
+    """
+    moves = boards.valid_moves(colours).reshape(len(boards), -1)
+    counts = np.cumsum(moves, axis=1)
+    totals = counts[:, -1]
+    picks = np.floor(boards._rng.random(len(boards)) * totals)
+    choices = (counts > picks[:, None]).argmax(axis=1)
+    actions = np.where(totals > 0, choices // boards.split.shape[1], PASS_ID)
+    return actions, choices % boards.split.shape[1]
+
+
+def batch_smart_moves(boards: BatchBoards, kinds: np.ndarray,
+                      colours: np.ndarray, num_test: int) \
+        -> tuple[np.ndarray, np.ndarray]:
+    """Return the action ids and heap indices of the best of <num_test>
+    random valid moves on every board of <boards>, like SmartPlayer, for a goal
+    of kind <kinds>[b] and the colour with index <colours>[b] on board b.
+
+    The score of a move accounts for its penalty, and the action is PASS on
+    the boards where no move beats the current score.
+    """
+    best_actions = np.full(len(boards), PASS_ID)
+    best_nodes = np.zeros(len(boards), dtype=np.int64)
+    best_scores = boards.scores(kinds, colours)
+    for _ in range(num_test):
+        actions, nodes = batch_random_moves(boards, colours)
+        trial = boards.copy()
+        trial.apply(actions, nodes, colours)
+        scores = trial.scores(kinds, colours) - PENALTIES[actions]
+        better = scores > best_scores
+        best_scores[better] = scores[better]
+        best_actions[better] = actions[better]
+        best_nodes[better] = nodes[better]
+    return best_actions, best_nodes
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'math', 'numpy',
+            'actions', 'block', 'heap_board', 'settings'
+        ],
+        'max-attributes': 10
+    })
@@ -0,0 +1,388 @@
+""" Module Description:
+
+This file contains benchmarks for the performance-sensitive parts of the
+Blocky game. Run this file to print the results of every benchmark.
+"""
+from __future__ import annotations
+import json
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch import random_boards, batch_smart_moves
+from block import Block, generate_board, _block_to_squares, \
+    normalize_board, _num_blocks, _lod_squares
+from board_sync import BoardSync, apply_patch
+from codec import encode_board
+from goal import BlobGoal, PerimeterGoal, flatten
+from offscreen import draw_record
+from heap_board import HeapBoard, generate_heap_board, heap_board_from_block
+from parallel import EVAL_ACTIONS, ParallelEvaluator, valid_moves
+from move_index import get_move_index
+from renderer import Renderer
+from player import SmartPlayer, _move_score
+from actions import SMASH
+from settings import BOARD_SIZE, COLOUR_LIST
+
+
+def bench_canonical_dedupe(depths: list[int], boards_per_depth: int) -> None:
+    """Print how many goal evaluations are needed to score every valid move of
+    a random board, with and without deduplicating the resulting boards by
+    their canonical_key, and the milliseconds taken to score every move of a
+    board both ways with _move_score, which decides DEDUPE_SCORES in
+    player.py.
+    """
+    print('Symmetry-canonical deduplication of one-move results')
+    print(f'{"depth":>5} {"evaluations":>12} {"distinct":>9} {"saved":>7} '
+          f'{"plain ms":>9} {"dedupe ms":>10}')
+    for depth in depths:
+        total = 0
+        distinct = 0
+        plain_time = 0
+        dedupe_time = 0
+        for _ in range(boards_per_depth):
+            board = generate_board(depth)
+            goal = random.choice([PerimeterGoal, BlobGoal])(
+                random.choice(COLOUR_LIST))
+            moves = get_move_index(board).moves(goal.colour)
+            start = time.perf_counter()
+            for move in moves:
+                _move_score(board, move, goal, None)
+            plain_time += time.perf_counter() - start
+            start = time.perf_counter()
+            cache = {}
+            for move in moves:
+                _move_score(board, move, goal, cache)
+            dedupe_time += time.perf_counter() - start
+            total += len(moves)
+            distinct += len(cache['scores'])
+        saved = 100 * (total - distinct) / total
+        print(f'{depth:>5} {total:>12} {distinct:>9} {saved:>6.1f}% '
+              f'{1000 * plain_time / boards_per_depth:>9.1f} '
+              f'{1000 * dedupe_time / boards_per_depth:>10.1f}')
+
+
+def bench_board_sync(depths: list[int], moves_per_depth: int) -> None:
+    """Print the average number of bytes sent per random move to keep a
+    remote copy of a random board in sync, as a patch, as the full binary
+    encoding, and as the JSON of the full list of squares.
+    """
+    print('Bytes per move to sync a remote board')
+    print(f'{"depth":>5} {"patch":>8} {"encoding":>9} {"squares":>9}')
+    for depth in depths:
+        board = generate_board(depth)
+        remote = board.create_copy()
+        sync = BoardSync(board)
+        index = get_move_index(board)
+        totals = [0, 0, 0]
+        for _ in range(moves_per_depth):
+            action, block = index.random_move(random.choice(COLOUR_LIST))
+            action.apply(block, {'colour': random.choice(COLOUR_LIST)})
+            patch = sync.patch(board)
+            remote = apply_patch(remote, patch)
+            assert remote == board
+            totals[0] += len(patch)
+            totals[1] += len(encode_board(board))
+            totals[2] += len(json.dumps(_block_to_squares(board)))
+        patch, encoding, squares = [total / moves_per_depth
+                                    for total in totals]
+        print(f'{depth:>5} {patch:>8.1f} {encoding:>9.1f} {squares:>9.1f}')
+
+
+def bench_batch_play(depths: list[int], num_boards: int,
+                     difficulty: int) -> None:
+    """Print the number of SmartPlayer moves chosen per second on random
+    boards, one board at a time and as a batch of <num_boards> boards.
+    """
+    print(f'SmartPlayer moves per second, difficulty {difficulty}')
+    print(f'{"depth":>5} {"single":>9} {"batch":>9}')
+    rng = np.random.default_rng(148)
+    for depth in depths:
+        boards = random_boards(num_boards, depth, rng)
+        kinds = rng.integers(0, 2, num_boards)
+        colours = rng.integers(0, len(COLOUR_LIST), num_boards)
+        players = []
+        for b in range(num_boards // 10):
+            goal = [PerimeterGoal, BlobGoal][kinds[b]](COLOUR_LIST[colours[b]])
+            players.append((SmartPlayer(0, goal, difficulty),
+                            boards.to_block(b)))
+        start = time.perf_counter()
+        for player, board in players:
+            player._proceed = True
+            player.generate_move(board)
+        single = (num_boards // 10) / (time.perf_counter() - start)
+        start = time.perf_counter()
+        actions, nodes = batch_smart_moves(boards, kinds, colours, difficulty)
+        boards.apply(actions, nodes, colours)
+        batch = num_boards / (time.perf_counter() - start)
+        print(f'{depth:>5} {single:>9.0f} {batch:>9.0f}')
+
+
+def bench_heap_board(depths: list[int], repeats: int) -> None:
+    """Print the average time in microseconds to copy, flatten, list the
+    squares of and compare random boards, stored as trees of Blocks and as
+    HeapBoards.
+    """
+    print('Microseconds per operation, Block / HeapBoard')
+    print(f'{"depth":>5} {"copy":>15} {"flatten":>15} {"squares":>15} '
+          f'{"==":>15}')
+    for depth in depths:
+        board = generate_board(depth)
+        heap = heap_board_from_block(board)
+        operations = [
+            (board.create_copy, heap.copy),
+            (lambda: flatten(board), heap.flatten),
+            (lambda: _block_to_squares(board), heap.squares),
+            (lambda: board == board.create_copy(),
+             lambda: heap.view() == heap.copy().view())]
+        row = f'{depth:>5}'
+        for block_operation, heap_operation in operations:
+            times = []
+            for operation in (block_operation, heap_operation):
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    operation()
+                times.append(1e6 * (time.perf_counter() - start) / repeats)
+            row += f' {times[0]:>7.0f}/{times[1]:<7.0f}'
+        print(row)
+
+
+def _score_pickled(board: HeapBoard, goal: PerimeterGoal,
+                   moves: list[tuple[int, int]]) -> list[int]:
+    """Return the score for <goal> of each move in <moves>, given as an action
+    id in EVAL_ACTIONS and a heap index, on a copy of <board>.
+
+    This is how a worker would score moves if the board was pickled to it on
+    every move.
+    """
+    scores = []
+    for action_id, node in moves:
+        copy = board.copy()
+        EVAL_ACTIONS[action_id].apply(copy.view(node), {'colour': goal.colour})
+        scores.append(goal.score(copy.view()))
+    return scores
+
+
+def bench_parallel_evaluation(depths: list[int], num_workers: int,
+                              num_moves: int, repeats: int) -> None:
+    """Print the milliseconds to score <num_moves> moves on <num_workers>
+    worker processes, when the board is pickled to the workers with every
+    batch of moves and when it is shared with them through shared memory,
+    along with the bytes pickled per batch of moves in each case.
+    """
+    print(f'Milliseconds to score {num_moves} moves on {num_workers} workers')
+    print(f'{"depth":>5} {"pickled":>8} {"shared":>8} {"pickle B":>9} '
+          f'{"shared B":>9}')
+    goal = PerimeterGoal(COLOUR_LIST[0])
+    for depth in depths:
+        board = generate_heap_board(depth)
+        moves = [move for move in valid_moves(board, goal.colour)
+                 if move[0] is not SMASH][:num_moves]
+        jobs = [(EVAL_ACTIONS.index(action), node) for action, node in moves]
+        chunks = [jobs[i::num_workers] for i in range(num_workers)]
+        with ProcessPoolExecutor(num_workers) as executor:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                list(executor.map(_score_pickled, [board] * num_workers,
+                                  [goal] * num_workers, chunks))
+            pickled = 1000 * (time.perf_counter() - start) / repeats
+        evaluator = ParallelEvaluator(depth, num_moves, num_workers)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            evaluator.evaluate(board, goal, moves)
+        shared = 1000 * (time.perf_counter() - start) / repeats
+        evaluator.close()
+        pickle_bytes = sum(len(pickle.dumps((board, goal, chunk)))
+                           for chunk in chunks)
+        shared_bytes = sum(len(pickle.dumps((depth, goal,
+                                             [(0,) + job for job in chunk])))
+                           for chunk in chunks)
+        print(f'{depth:>5} {pickled:>8.1f} {shared:>8.1f} '
+              f'{pickle_bytes:>9} {shared_bytes:>9}')
+
+
+def bench_move_bounds(depths: list[int], difficulty: int,
+                      boards_per_depth: int) -> None:
+    """Print the percentage of the moves sampled by a SmartPlayer with
+    <difficulty> that are pruned by the upper bounds of their goal, and the
+    milliseconds to choose a move with and without pruning.
+    """
+    print(f'SmartPlayer pruning, difficulty {difficulty}')
+    print(f'{"depth":>5} {"pruned %":>9} {"full ms":>8} {"pruned ms":>10}')
+    for depth in depths:
+        pruned = 0
+        total = 0
+        full_time = 0.0
+        pruned_time = 0.0
+        for _ in range(boards_per_depth):
+            board = generate_board(depth)
+            goal = random.choice([PerimeterGoal, BlobGoal])(
+                random.choice(COLOUR_LIST))
+            index = get_move_index(board)
+            candidates = [index.random_move(goal.colour)
+                          for _ in range(difficulty)]
+            start = time.perf_counter()
+            max_score = goal.score(board)
+            for move in candidates:
+                max_score = max(max_score,
+                                _move_score(board, move, goal, None))
+            full_time += time.perf_counter() - start
+            start = time.perf_counter()
+            max_score = goal.score(board)
+            bounds = {}
+            for action, block in candidates:
+                total += 1
+                if (goal.move_bound(board, block, bounds) - action.penalty
+                        <= max_score):
+                    pruned += 1
+                    continue
+                max_score = max(max_score, _move_score(board, (action, block),
+                                                       goal, None))
+            pruned_time += time.perf_counter() - start
+        print(f'{depth:>5} {100 * pruned / total:>9.1f} '
+              f'{1000 * full_time / boards_per_depth:>8.1f} '
+              f'{1000 * pruned_time / boards_per_depth:>10.1f}')
+
+
+def bench_worker_startup(modules: list[str], repeats: int) -> None:
+    """Print the median milliseconds for a new Python process to import each
+    module in <modules>, as a worker process does when it starts, and whether
+    the import loads pygame.
+
+    Before the engine modules stopped importing pygame, importing any of them
+    imported pygame first, so the "before" column times importing pygame and
+    then the module, and the "after" column times importing the module alone.
+    """
+    print('Milliseconds for a new process to import a module')
+    print(f'{"module":>9} {"before":>7} {"after":>6} {"pygame":>7}')
+    for module in modules:
+        row = f'{module:>9}'
+        loaded = ''
+        for imports, width in [(f'pygame, {module}', 7), (module, 6)]:
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                loaded = subprocess.run(
+                    [sys.executable, '-c',
+                     f'import sys, {imports}; print("pygame" in sys.modules)'],
+                    capture_output=True, text=True,
+                    check=True).stdout.split()[-1]
+                times.append(time.perf_counter() - start)
+            row += f' {1000 * sorted(times)[repeats // 2]:>{width}.0f}'
+        print(f'{row} {loaded:>7}')
+
+
+def bench_offscreen_render(depths: list[int], num_frames: int) -> None:
+    """Print the frames per second of a headless Renderer drawing the frames
+    of <num_frames> dataset records at each depth in <depths>, with the board
+    drawn one square at a time and rasterized with NumPy, without and with
+    saving each frame to a PNG file.
+    """
+    print(f'Frames per second of {num_frames} offscreen frames')
+    print(f'{"depth":>5} {"squares":>8} {"raster":>8} {"squares+png":>12} '
+          f'{"raster+png":>11}')
+    renderer = Renderer(BOARD_SIZE, headless=True)
+    directory = tempfile.mkdtemp()
+    for depth in depths:
+        records = [(encode_board(generate_board(depth)), 0, 0, 0,
+                    (0, 0), 0, 0) for _ in range(num_frames)]
+        row = f'{depth:>5}'
+        for rasterized, save, width in [(False, False, 8), (True, False, 8),
+                                         (False, True, 12), (True, True, 11)]:
+            start = time.perf_counter()
+            for i, record in enumerate(records):
+                draw_record(renderer, record, BOARD_SIZE, depth, rasterized)
+                if save:
+                    renderer.save_to_file(f'{directory}/{i}.png')
+            rate = num_frames / (time.perf_counter() - start)
+            row += f' {rate:>{width}.1f}'
+        print(row)
+
+
+def bench_normalization(depths: list[int], boards_per_depth: int) -> None:
+    """Print the average number of Blocks of a generated board before and
+    after normalize_board, and the milliseconds that it takes.
+    """
+    print('Blocks per generated board, before and after normalization')
+    print(f'{"depth":>5} {"before":>8} {"after":>8} {"removed":>8} '
+          f'{"ms":>6}')
+    for depth in depths:
+        before = 0
+        removed = 0
+        elapsed = 0.0
+        for _ in range(boards_per_depth):
+            board = generate_board(depth)
+            before += _num_blocks(board)
+            start = time.perf_counter()
+            removed += normalize_board(board)
+            elapsed += time.perf_counter() - start
+        print(f'{depth:>5} {before / boards_per_depth:>8.1f} '
+              f'{(before - removed) / boards_per_depth:>8.1f} '
+              f'{100 * removed / before:>7.1f}% '
+              f'{1000 * elapsed / boards_per_depth:>6.2f}')
+
+
+def _deep_board(depth: int, num_smashes: int) -> Block:
+    """Return a board with <depth> that is smashed at <num_smashes> leaves,
+    each found by descending through random children, so that it has leaves
+    at every level down to <depth>.
+    """
+    board = Block(random.choice(COLOUR_LIST), 0, depth)
+    for _ in range(num_smashes):
+        block = board
+        while block.children != []:
+            block = random.choice(block.children)
+        block.smash()
+    return board
+
+
+def bench_lod_render(depths: list[int], num_smashes: int, zooms: list[int],
+                     repeats: int) -> None:
+    """Print the number of squares drawn for a board with each depth in
+    <depths> smashed at <num_smashes> leaves, and the milliseconds to draw
+    it, with every leaf and with the level of detail of a headless Renderer
+    zoomed in by each of <zooms> into the middle of the board.
+    """
+    print(f'Drawing deep boards smashed {num_smashes} times, '
+          f'squares / milliseconds')
+    print(f'{"depth":>5} {"zoom":>5} {"leaves":>15} {"lod":>15}')
+    renderer = Renderer(BOARD_SIZE, headless=True)
+    for depth in depths:
+        board = _deep_board(depth, num_smashes)
+        for zoom in zooms:
+            renderer.viewport.zoom_by(zoom.bit_length()
+                                      - renderer.viewport.zoom.bit_length())
+            row = f'{depth:>5} {zoom:>5}'
+            for get_squares in (
+                    lambda: _block_to_squares(board),
+                    lambda: _lod_squares(
+                        board, renderer.min_block_width(depth),
+                        renderer.viewport.cell_region(depth))):
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    squares = get_squares()
+                    renderer.draw_board(squares, depth)
+                elapsed = 1000 * (time.perf_counter() - start) / repeats
+                row += f' {len(squares):>7} {elapsed:>7.1f}'
+            print(row)
+
+
+if __name__ == '__main__':
+    random.seed(148)
+    bench_canonical_dedupe([3, 4, 5, 6], 3)
+    bench_board_sync([3, 4, 5, 6, 7, 8], 100)
+    bench_batch_play([3, 4, 5], 2000, 5)
+    bench_heap_board([3, 4, 5, 6], 20)
+    bench_parallel_evaluation([3, 5, 7], 4, 64, 10)
+    bench_move_bounds([3, 4, 5, 6], 50, 10)
+    bench_worker_startup(['actions', 'player', 'dataset', 'parallel',
+                          'server'], 7)
+    bench_offscreen_render([3, 4, 5, 6, 7], 50)
+    bench_normalization([3, 4, 5, 6, 7], 100)
+    bench_lod_render([6, 8, 10], 2000, [1, 4, 16], 5)
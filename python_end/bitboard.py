@@ -0,0 +1,120 @@
+""" Module Description:
+
+This file contains the BitBoard class, which stores the unit cells of each
+colour of a Block as the bits of a Python int so that goals can be scored with
+word-level operations.
+"""
+from __future__ import annotations
+
+from block import Block
+
+# The deepest board (relative to its root) that is scored with a BitBoard.
+MAX_BITBOARD_DEPTH = 8
+
+
+def _column_mask(width: int, height: int, n: int) -> int:
+    """Return a mask of the <width> by <height> square of cells whose upper
+    left corner is at column 0 and row 0 of a board with <n> columns.
+    """
+    rows = 0
+    for row in range(height):
+        rows |= 1 << (row * n)
+    return ((1 << width) - 1) * rows
+
+
+class BitBoard:
+    """The unit cells of a Block, stored as one bit mask per colour.
+
+    The cell at column i and row j (which is flatten(block)[i][j]) is stored
+    in bit j * size + i of the mask of its colour.
+
+    Instance Attributes:
+    - size: The number of unit cells along each side of the board.
+    - masks: A dictionary mapping each colour on the board to the mask of the
+             unit cells of that colour.
+
+    Private Instance Attributes:
+    - _left: The mask of the cells in the leftmost column.
+    - _right: The mask of the cells in the rightmost column.
+
+    Representation Invariants:
+    - The masks in self.masks are pairwise disjoint, and together cover all
+      size * size cells.
+    """
+    size: int
+    masks: dict[tuple[int, int, int], int]
+    _left: int
+    _right: int
+
+    def __init__(self, board: Block) -> None:
+        """Initialize this BitBoard with the unit cells of <board>.
+
+        >>> from settings import COLOUR_LIST
+        >>> board = Block(COLOUR_LIST[0], 0, 2)
+        >>> bits = BitBoard(board)
+        >>> bits.size
+        4
+        >>> bits.masks[COLOUR_LIST[0]] == 2 ** 16 - 1
+        True
+        """
+        self.size = 2 ** (board.max_depth - board.level)
+        n = self.size
+        self.masks = {}
+        self._left = _column_mask(1, n, n)
+        self._right = self._left << (n - 1)
+        self._add_block(board, 0, 0)
+
+    def _add_block(self, block: Block, col: int, row: int) -> None:
+        """Add the unit cells of <block>, whose upper left unit cell is at
+        <col> and <row>, to the masks of this BitBoard.
+        """
+        if block.children == []:
+            width = 2 ** (block.max_depth - block.level)
+            square = _column_mask(width, width, self.size)
+            square <<= row * self.size + col
+            self.masks[block.colour] = self.masks.get(block.colour, 0) | square
+        else:
+            half = 2 ** (block.max_depth - block.level - 1)
+            self._add_block(block.children[0], col + half, row)
+            self._add_block(block.children[1], col, row)
+            self._add_block(block.children[2], col, row + half)
+            self._add_block(block.children[3], col + half, row + half)
+
+    def largest_blob(self, colour: tuple[int, int, int]) -> int:
+        """Return the number of unit cells in the largest connected blob of
+        <colour> on this board.
+
+        Each blob is found by repeatedly growing a single cell by one cell in
+        every direction, restricted to the cells of <colour>, until it stops
+        changing.
+        """
+        n = self.size
+        mask = self.masks.get(colour, 0)
+        not_left = ~self._left
+        not_right = ~self._right
+        remaining = mask
+        largest = 0
+        while remaining.bit_count() > largest:
+            blob = remaining & -remaining
+            while True:
+                grown = (blob | ((blob << 1) & not_left)
+                         | ((blob >> 1) & not_right)
+                         | (blob << n) | (blob >> n)) & mask
+                if grown == blob:
+                    break
+                blob = grown
+            remaining &= ~blob
+            largest = max(largest, blob.bit_count())
+        return largest
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'block',
+            'settings'
+        ],
+        'max-attributes': 15
+    })
@@ -6,14 +6,28 @@ from __future__ import annotations
 import random
 import math
 
+from typing import TYPE_CHECKING, Iterator
+
 from settings import colour_name, COLOUR_LIST
 
+if TYPE_CHECKING:
+    from move_index import MoveIndex
+
 # constants
 ROT_CW = 1
 ROT_CCW = 3
 SWAP_HORZ = 0
 SWAP_VERT = 1
 
+# For each of the 8 dihedral transforms of a Block (mirror left-right if
+# the first entry is True, then rotate clockwise the second entry times), the
+# index of the original child that ends up at child index 0, 1, 2 and 3.
+_DIHEDRAL_SOURCES = [
+    [(i + rot) % 4 if not mirror else [1, 0, 3, 2][(i + rot) % 4]
+     for i in range(4)]
+    for mirror in (False, True) for rot in range(4)
+]
+
 
 def _block_to_squares(board: Block) -> list[tuple[tuple[int, int, int],
                                                   tuple[int, int], int]]:
@@ -24,53 +38,300 @@ def _block_to_squares(board: Block) -> list[tuple[tuple[int, int, int],
     For every undivided Block, the list must contain one tuple that describes
     the square to draw for that Block. Each tuple contains:
     - the colour of the block,
-    - the (x, y) coordinates of the top left corner of the block, and
-    - the size of the block,
+    - the (column, row) of the upper left unit cell of the block, and
+    - the width of the block, in unit cells,
     in that order.
 
+    The squares are given in unit cells, and the Renderer finds the pixels
+    that they cover on the screen.
+
     The order of the tuples does not matter.
     """
-    if board.children == []:
-        return [(board.colour, board.position, board.size)]
+    return [(block.colour, cell, width)
+            for block, cell, width in iter_blocks(board)
+            if block.children == []]
+
+
+def _lod_squares(board: Block, min_width: float,
+                 region: tuple[tuple[float, float], float] | None = None) \
+        -> list[tuple[tuple[int, int, int], tuple[int, int], int]]:
+    """Return a list of tuples describing the squares to draw in order to
+    render <board>, like _block_to_squares, at a level of detail of
+    <min_width> unit cells.
+
+    A Block that is divided but narrower than <min_width> is drawn as a single
+    square of its average colour, instead of the squares of its leaves. If
+    <region> is not None, it is the upper left corner and the width of the
+    square region of the board that is visible, in unit cells, and the Blocks
+    outside it are left out.
+
+    >>> board = generate_board(3)
+    >>> _lod_squares(board, 0) == _block_to_squares(board)
+    True
+    >>> _lod_squares(board, 9) == [(board.colour or
+    ...                             board.average_colour(), (0, 0), 8)]
+    True
+    >>> len(_lod_squares(board, 0, ((0, 0), 1))) <= len(
+    ...     _lod_squares(board, 0))
+    True
+    """
+    _, col, row = board._locate()
     squares = []
-    for child in board.children:
-        squares.extend(_block_to_squares(child))
+    stack = [(board, col, row)]
+    while stack:
+        block, col, row = stack.pop()
+        width = 1 << (block.max_depth - block.level)
+        if region is not None and (
+                col >= region[0][0] + region[1]
+                or row >= region[0][1] + region[1]
+                or col + width <= region[0][0]
+                or row + width <= region[0][1]):
+            continue
+        children = block.children
+        if children == []:
+            squares.append((block.colour, (col, row), width))
+        elif width < min_width:
+            squares.append((block.average_colour(), (col, row), width))
+        else:
+            half = width >> 1
+            stack.append((children[3], col + half, row + half))
+            stack.append((children[2], col, row + half))
+            stack.append((children[1], col, row))
+            stack.append((children[0], col + half, row))
     return squares
 
 
-def generate_board(max_depth: int, size: int) -> Block:
-    """Return a new game board with a depth of <max_depth> and dimensions of
-    <size> by <size>.
+def iter_blocks(board: Block) \
+        -> Iterator[tuple[Block, tuple[int, int], int]]:
+    """Yield a tuple for <board> and each of its descendants, in preorder,
+    containing the block, the (column, row) of its upper left unit cell, and
+    its width in unit cells.
+
+    The unit cells of the blocks are computed during the traversal, from the
+    unit cell of <board> and the index of each block in its parent's list of
+    children.
+
+    >>> board = Block(COLOUR_LIST[0], 0, 1)
+    >>> board.smash()
+    True
+    >>> [(cell, width) for _, cell, width in iter_blocks(board)]
+    [((0, 0), 2), ((1, 0), 1), ((0, 0), 1), ((0, 1), 1), ((1, 1), 1)]
+    """
+    _, col, row = board._locate()
+    stack = [(board, col, row)]
+    while stack:
+        block, col, row = stack.pop()
+        width = 1 << (block.max_depth - block.level)
+        yield block, (col, row), width
+        children = block.children
+        if children != []:
+            half = width >> 1
+            stack.append((children[3], col + half, row + half))
+            stack.append((children[2], col, row + half))
+            stack.append((children[1], col, row))
+            stack.append((children[0], col + half, row))
+
+
+def _transformed_keys(block: Block, keys: dict[tuple, int],
+                      memo: dict[int, tuple[int, ...]] | None = None) \
+        -> tuple[int, ...]:
+    """Return the key of <block> under each of the 8 dihedral transforms, in
+    the order of _DIHEDRAL_SOURCES.
+
+    Keys are numbers handed out by <keys>, which maps the colour of a leaf, or
+    the keys of the four children of a Block after a transform, to the key of
+    that leaf or Block. Two Blocks get the same key exactly when they have the
+    same colours in the same layout, and each Block takes a constant number of
+    lookups once its children have keys.
+
+    If <memo> is not None, the keys of <block> and its descendants are looked
+    up in and added to it, by their id.
+    """
+    if memo is not None and id(block) in memo:
+        return memo[id(block)]
+    if block.children == []:
+        result = (keys.setdefault(block.colour, len(keys)),) * 8
+    else:
+        child_keys = [_transformed_keys(child, keys, memo)
+                      for child in block.children]
+        result = _parent_keys(child_keys, keys)
+    if memo is not None:
+        memo[id(block)] = result
+    return result
+
+
+def _parent_keys(child_keys: list[tuple[int, ...]], keys: dict[tuple, int]) \
+        -> tuple[int, ...]:
+    """Return the keys under each of the 8 dihedral transforms of a Block
+    whose children have <child_keys>, as in _transformed_keys.
+    """
+    return tuple(keys.setdefault(tuple(child_keys[k][g] for k in sources),
+                                 len(keys))
+                 for g, sources in enumerate(_DIHEDRAL_SOURCES))
+
+
+def canonical_key(block: Block, keys: dict[tuple, int]) -> int:
+    """Return a key for <block> that is the same for all the boards that can
+    be obtained from one another by rotating or reflecting the whole Block.
+
+    Goal scores are invariant under these transforms, so the key can be used
+    to store a single score for each equivalence class of boards. Keys are
+    only comparable between boards that were given the same <keys>, as
+    described in _transformed_keys.
 
-    >>> board = generate_board(3, 750)
+    >>> keys = {}
+    >>> board = generate_board(3)
+    >>> key = canonical_key(board, keys)
+    >>> board.rotate(ROT_CW)
+    True
+    >>> canonical_key(board, keys) == key
+    True
+    """
+    return min(_transformed_keys(block, keys))
+
+
+def replaced_key(board: Block, block: Block, replacement: Block,
+                 keys: dict[tuple, int], memo: dict[int, tuple[int, ...]]) \
+        -> int:
+    """Return the canonical_key that <board> would have if its descendant
+    <block> were replaced by <replacement>, given <keys>.
+
+    Only the keys of <replacement> and of the ancestors of <block> are
+    computed, and the keys of the other Blocks of <board> are read from, or
+    added to, <memo> as in _transformed_keys. <memo> is only valid for as long
+    as <board> is not changed.
+
+    Preconditions:
+    - <block> is <board> or one of its descendants.
+    - <replacement> has the same level and max_depth as <block>.
+
+    >>> keys = {}
+    >>> board = Block(COLOUR_LIST[0], 0, 2)
+    >>> board.smash()
+    True
+    >>> copy = board.create_copy()
+    >>> children = copy.children
+    >>> copy.children = children[:2] + [Block(COLOUR_LIST[1], 1, 2)] \\
+    ...     + children[3:]
+    >>> replacement = Block(COLOUR_LIST[1], 1, 2)
+    >>> replaced_key(board, board.children[2], replacement, keys, {}) \\
+    ...     == canonical_key(copy, keys)
+    True
+    """
+    result = _transformed_keys(replacement, keys)
+    while block is not board:
+        parent = block._parent
+        children = parent.children
+        child_keys = [result if child is block
+                      else _transformed_keys(child, keys, memo)
+                      for child in children]
+        result = _parent_keys(child_keys, keys)
+        block = parent
+    return min(result)
+
+
+def generate_board(max_depth: int, normalized: bool = False) -> Block:
+    """Return a new game board with a depth of <max_depth>.
+
+    If <normalized>, the board is normalized by normalize_board.
+
+    >>> board = generate_board(3)
     >>> board.max_depth
     3
-    >>> board.size
-    750
+    >>> board.cell
+    (0, 0)
     >>> len(board.children) == 4
     True
     """
-    board = Block((0, 0), size, random.choice(COLOUR_LIST), 0, max_depth)
+    board = Block(random.choice(COLOUR_LIST), 0, max_depth)
     board.smash()
+    if normalized:
+        normalize_board(board)
 
     return board
 
 
+def _num_blocks(block: Block) -> int:
+    """Return the number of Blocks in the tree rooted at <block>.
+    """
+    return 1 + sum(_num_blocks(child) for child in block.children)
+
+
+def normalize_board(board: Block) -> int:
+    """Turn every Block of <board> whose unit cells all have the same colour
+    into a leaf of that colour, and return the number of Blocks removed.
+
+    The colour of every unit cell stays the same, and no penalty applies, as
+    opposed to the Combine action. Uniform Blocks are found from their colour
+    counts, so the descendants of a uniform Block are never visited, and one
+    pass from the root merges every uniform subtree, however deep.
+
+    >>> quarter = Block(None, 1, 2)
+    >>> quarter.children = [Block(COLOUR_LIST[1], 2, 2) for _ in range(4)]
+    >>> board = Block(None, 0, 2)
+    >>> board.children = [quarter] + [Block(COLOUR_LIST[1], 1, 2)
+    ...                               for _ in range(3)]
+    >>> normalize_board(board)
+    8
+    >>> board == Block(COLOUR_LIST[1], 0, 2)
+    True
+    """
+    removed = 0
+    stack = [board]
+    while stack:
+        block = stack.pop()
+        children = block.children
+        if children == []:
+            continue
+        if len(block.colour_counts()) == 1:
+            removed += _num_blocks(block) - 1
+            block.restore_leaf(next(iter(block.colour_counts())))
+        else:
+            stack.extend(children)
+    return removed
+
+
+class _Epoch:
+    """The number of rotations made in a tree of Blocks, which is shared by
+    all the Blocks of the tree.
+
+    When a tree is attached to a Block of another tree, the _Epoch of the
+    attached tree forwards to the _Epoch of the other tree, as in a
+    union-find, so that its Blocks need not be visited.
+
+    Instance Attributes:
+    - count: The number of rotations made in the tree, which is greater than
+             the count of every _Epoch that forwards to this one.
+    - forward: The _Epoch that this _Epoch was merged into, or None if it is
+               the _Epoch of its tree.
+    """
+    __slots__ = ('count', 'forward')
+    count: int
+    forward: _Epoch | None
+
+    def __init__(self) -> None:
+        """Initialize this _Epoch for a tree with no rotations.
+        """
+        self.count = 0
+        self.forward = None
+
+
 class Block:
     """A square Block in the Blocky game, represented as a tree.
 
-    In addition to its tree-related attributes, a Block also contains attributes
-    that describe how the Block appears on a Cartesian plane. All positions
-    describe the upper left corner (x, y), and the origin is at (0, 0). All
-    positions and sizes are in the unit of pixels.
+    A Block is located on the board by its unit cell: the column and row of
+    its upper left unit cell, where the unit cells are the 2 ** max_depth by
+    2 ** max_depth cells of a board of max_depth, and the upper left unit cell
+    of the board is (0, 0). A Block at level i is 2 ** (max_depth - i) unit
+    cells wide. Blocks know nothing of pixels, which are computed from unit
+    cells by the Renderer when the board is drawn.
 
     When a block has four children, the order of its children impacts each
-    child's position. Indices 0, 1, 2, and 3 are the upper-right child,
+    child's unit cell. Indices 0, 1, 2, and 3 are the upper-right child,
     upper-left child, lower-left child, and lower-right child, respectively.
 
     Attributes
-    - position: The (x, y) coordinates of the upper left corner of this Block.
-    - size: The height and width of this square Block.
+    - cell: The (column, row) of the upper left unit cell of this Block.
     - colour: If this block is not subdivided, <colour> stores its colour.
               Otherwise, <colour> is None.
     - level: The level of this block within the overall block structure.
@@ -82,43 +343,80 @@ class Block:
                 stored in this order: upper-right child, upper-left child,
                 lower-left child, lower-right child.
 
+    Private Instance Attributes:
+    - _index: The MoveIndex of the board this Block belongs to, which is
+              notified whenever this Block is smashed, combined or painted, or
+              None if the board is not indexed.
+    - _parent: The Block that this Block is a child of, or None if this Block
+               is the root of its tree.
+    - _rotation: The number of clockwise quarter turns that were applied to
+                 this Block by rotate but have not yet been pushed down to its
+                 children.
+    - _epoch: The _Epoch of the tree of this Block, or an _Epoch that
+              forwards to it.
+    - _checked: The count of the _Epoch of the tree of this Block when the
+                pending rotation of this Block was last known to be up to
+                date.
+    - _cell: The unit cell of this Block if it is the root of its tree.
+    - _colour: The colour of this Block, as described by colour.
+    - _counts: The number of unit cells of each colour in this Block, without
+               the colours that it has no unit cells of.
+
+    Rotations are applied lazily, like the pending updates of a segment tree:
+    rotate only records the turn in _rotation, and the reordering of the
+    children is resolved one level at a time, whenever the children of a Block
+    are accessed.
+
+    Only the root of a tree stores its unit cell. The unit cell of every other
+    Block is computed from the path from the root to it, so moving a subtree
+    never needs to update the unit cells of its descendants.
+
+    Every Block keeps _counts up to date for itself and its ancestors whenever
+    the colour of a leaf or the children of a Block are set, so the colours of
+    any subtree are counted without visiting it. Rotating and swapping never
+    change them.
+
     Representation Invariants:
     - self.level <= self.max_depth
     - len(self.children) == 0 or len(self.children) == 4
     - If this Block has children:
         - their max_depth is the same as that of this Block.
-        - their size is half that of this Block.
         - their level is one greater than that of this Block.
-        - their position is determined by the position and size of this Block,
-          and their index in this Block's list of children.
+        - their unit cell is determined by the unit cell and level of this
+          Block, and their index in this Block's list of children.
         - this Block's colour is None.
     - If this Block has no children:
         - its colour is not None.
+    - self._counts is the sum of the _counts of the children of this Block if
+      it has any, and otherwise holds the 4 ** (max_depth - level) unit cells
+      of its colour.
     """
-    position: tuple[int, int]
-    size: int
     colour: tuple[int, int, int] | None
     level: int
     max_depth: int
     children: list[Block]
-
-    def __init__(self, position: tuple[int, int], size: int,
-                 colour: tuple[int, int, int] | None, level: int,
+    _index: MoveIndex | None
+    _parent: Block | None
+    _rotation: int
+    _epoch: _Epoch
+    _checked: int
+    _cell: tuple[int, int]
+    _colour: tuple[int, int, int] | None
+    _counts: dict[tuple[int, int, int], int]
+    _children: list[Block]
+
+    def __init__(self, colour: tuple[int, int, int] | None, level: int,
                  max_depth: int) -> None:
-        """Initialize this block with <position>, dimensions <size> by <size>,
-        the given <colour>, at <level>, and with no children.
+        """Initialize this block with the given <colour>, at <level>, and with
+        no children, at the upper left unit cell of the board.
 
         Preconditions:
-        - position[0] >= 0 and position[1] >= 0
-        - size > 0
         - level >= 0
         - max_depth >= level
 
-        >>> block = Block((0, 0), 750, (0, 0, 0), 0, 1)
-        >>> block.position
+        >>> block = Block((0, 0, 0), 0, 1)
+        >>> block.cell
         (0, 0)
-        >>> block.size
-        750
         >>> block.colour
         (0, 0, 0)
         >>> block.level
@@ -126,29 +424,234 @@ class Block:
         >>> block.max_depth
         1
         """
-        self.position = position
-        self.size = size
-        self.colour = colour
+        self._parent = None
+        self._rotation = 0
+        self._epoch = _Epoch()
+        self._checked = -1
+        self._cell = (0, 0)
         self.level = level
         self.max_depth = max_depth
-        self.children = []
+        self._children = []
+        self._index = None
+        self._colour = None
+        self._counts = {}
+        self.colour = colour
+
+    @property
+    def cell(self) -> tuple[int, int]:
+        """The column and row of the upper left unit cell of this Block.
+
+        >>> board = Block(COLOUR_LIST[0], 0, 2)
+        >>> board.smash()
+        True
+        >>> [child.cell for child in board.children]
+        [(2, 0), (0, 0), (0, 2), (2, 2)]
+        """
+        _, col, row = self._locate()
+        return col, row
+
+    def _locate(self) -> tuple[Block, int, int]:
+        """Return the root of the tree of this Block, and the column and row
+        of the upper left unit cell of this Block.
+        """
+        col, row = 0, 0
+        block = self
+        while block._parent is not None:
+            siblings = block._parent.children
+            i = 0
+            while siblings[i] is not block:
+                i += 1
+            width = 1 << (block.max_depth - block.level)
+            if i == 0 or i == 3:
+                col += width
+            if i >= 2:
+                row += width
+            block = block._parent
+        return block, block._cell[0] + col, block._cell[1] + row
+
+    def _detach(self) -> None:
+        """Make this Block the root of its own tree, keeping its unit cell.
+
+        The Blocks of the new tree are given an _Epoch of their own, so that
+        rotations in either tree do not affect the other.
+        """
+        _, col, row = self._locate()
+        self._cell = (col, row)
+        self._parent = None
+        epoch = _Epoch()
+        stack = [self]
+        while stack:
+            block = stack.pop()
+            block._epoch = epoch
+            block._checked = -1
+            stack.extend(block._children)
+
+    @property
+    def colour(self) -> tuple[int, int, int] | None:
+        """The colour of this Block if it has no children, and otherwise None.
+        """
+        return self._colour
+
+    @colour.setter
+    def colour(self, colour: tuple[int, int, int] | None) -> None:
+        if self._children == []:
+            cells = 4 ** (self.max_depth - self.level)
+            if self._colour is not None:
+                self._add_cells(self._colour, -cells)
+            if colour is not None:
+                self._add_cells(colour, cells)
+        self._colour = colour
+
+    def _add_cells(self, colour: tuple[int, int, int], cells: int) -> None:
+        """Add <cells> unit cells of <colour>, which may be negative, to the
+        counts of this Block and all its ancestors.
+        """
+        block = self
+        while block is not None:
+            count = block._counts.get(colour, 0) + cells
+            if count == 0:
+                del block._counts[colour]
+            else:
+                block._counts[colour] = count
+            block = block._parent
+
+    def colour_count(self, colour: tuple[int, int, int]) -> int:
+        """Return the number of unit cells of <colour> in this Block.
+
+        >>> board = Block(COLOUR_LIST[0], 0, 2)
+        >>> board.colour_count(COLOUR_LIST[0])
+        16
+        >>> board.smash()
+        True
+        >>> sum(board.colour_count(colour) for colour in COLOUR_LIST)
+        16
+        >>> from goal import flatten
+        >>> board.children[1].colour_count(COLOUR_LIST[0]) == sum(
+        ...     row.count(COLOUR_LIST[0])
+        ...     for row in flatten(board.children[1]))
+        True
+        """
+        return self._counts.get(colour, 0)
+
+    def colour_counts(self) -> dict[tuple[int, int, int], int]:
+        """Return the number of unit cells of each colour in this Block,
+        leaving out the colours that it has none of.
+        """
+        return dict(self._counts)
+
+    def average_colour(self) -> tuple[int, int, int]:
+        """Return the average colour of the unit cells of this Block, rounded
+        to the nearest integers.
+
+        >>> board = Block((0, 100, 200), 0, 1)
+        >>> board.average_colour()
+        (0, 100, 200)
+        >>> board.smash()
+        True
+        >>> board.children[0].paint((100, 200, 0))
+        True
+        >>> board.average_colour() == tuple(
+        ...     round(sum(child.colour[k] for child in board.children) / 4)
+        ...     for k in range(3))
+        True
+        """
+        total = sum(self._counts.values())
+        return tuple(round(sum(colour[k] * count
+                               for colour, count in self._counts.items())
+                           / total) for k in range(3))
+
+    @property
+    def children(self) -> list[Block]:
+        """The blocks into which this block is subdivided, in the order
+        upper-right, upper-left, lower-left, lower-right.
+        """
+        epoch = self._epoch
+        if epoch.forward is not None:
+            epoch = self._tree_epoch()
+        if self._checked != epoch.count:
+            self._resolve()
+        if self._rotation != 0:
+            self._push()
+        return self._children
+
+    @children.setter
+    def children(self, children: list[Block]) -> None:
+        for colour, count in list(self._counts.items()):
+            self._add_cells(colour, -count)
+        self._children = children
+        self._rotation = 0
+        epoch = self._tree_epoch()
+        for child in children:
+            child._parent = self
+            if child._epoch is not epoch:
+                child_epoch = child._tree_epoch()
+                if child_epoch is not epoch:
+                    # The checked counts of the attached tree must all be out
+                    # of date in this tree
+                    epoch.count = max(epoch.count, child_epoch.count + 1)
+                    child_epoch.forward = epoch
+            for colour, count in child._counts.items():
+                self._add_cells(colour, count)
+        if children == [] and self._colour is not None:
+            self._add_cells(self._colour, 4 ** (self.max_depth - self.level))
+
+    def _resolve(self) -> None:
+        """Push down the pending rotations of every ancestor of this Block,
+        from the root down, so that the pending rotation of this Block is up to
+        date.
+        """
+        count = self._tree_epoch().count
+        unchecked = []
+        block = self
+        while block._parent is not None and block._checked != count:
+            unchecked.append(block)
+            block = block._parent
+        block._checked = count
+        for block in reversed(unchecked):
+            block._parent._push()
+            block._checked = count
+
+    def _tree_epoch(self) -> _Epoch:
+        """Return the _Epoch of the tree of this Block, and remember it.
+        """
+        epoch = self._epoch
+        while epoch.forward is not None:
+            epoch = epoch.forward
+        self._epoch = epoch
+        return epoch
+
+    def _push(self) -> None:
+        """Apply the pending rotation of this Block to the order of its
+        children and pass the rotation on to them.
+
+        Precondition:
+        - The pending rotation of this Block is up to date.
+        """
+        if self._rotation != 0:
+            turns = self._rotation
+            self._rotation = 0
+            self._children = [self._children[(i + turns) % 4]
+                              for i in range(4)]
+            for child in self._children:
+                if child._children != []:
+                    child._rotation = (child._rotation + turns) % 4
 
     def __str__(self) -> str:
         """Return this Block in a string format.
 
-        >>> block = Block((0, 0), 750, (1, 128, 181), 0, 1)
+        >>> block = Block((1, 128, 181), 0, 1)
         >>> str(block)
-        'Leaf: colour=Pacific Point, pos=(0, 0), size=750, level=0'
+        'Leaf: colour=Pacific Point, cell=(0, 0), level=0'
         """
         if len(self.children) == 0:
             indents = '\t' * self.level
             colour = colour_name(self.colour)
-            return f'{indents}Leaf: colour={colour}, pos={self.position}, ' \
-                   f'size={self.size}, level={self.level}'
+            return f'{indents}Leaf: colour={colour}, cell={self.cell}, ' \
+                   f'level={self.level}'
         else:
             indents = '\t' * self.level
-            result = f'{indents}Parent: pos={self.position},' \
-                     f'size={self.size}, level={self.level}'
+            result = f'{indents}Parent: cell={self.cell}, ' \
+                     f'level={self.level}'
 
             for child in self.children:
                 result += f'\n{child}'
@@ -159,18 +662,17 @@ class Block:
         """Return True iff this Block and all its descendents are equivalent to
         the <other> Block and all its descendents.
 
-        >>> b1 = Block((0, 0), 750, (0, 0, 0), 0, 1)
-        >>> b2 = Block((0, 0), 750, (0, 0, 0), 0, 1)
+        >>> b1 = Block((0, 0, 0), 0, 1)
+        >>> b2 = Block((0, 0, 0), 0, 1)
         >>> b1 == b2
         True
-        >>> b3 = Block((0, 0), 750, (255, 255, 255), 0, 1)
+        >>> b3 = Block((255, 255, 255), 0, 1)
         >>> b1 == b3
         False
         """
         if len(self.children) == 0 and len(other.children) == 0:
             # Both self and other are leaves.
-            return (self.position == other.position
-                    and self.size == other.size
+            return (self.cell == other.cell
                     and self.colour == other.colour
                     and self.level == other.level
                     and self.max_depth == other.max_depth)
@@ -183,38 +685,6 @@ class Block:
             # than the children, since will eventually hit base case!
             return self.children == other.children  # elementwise compare
 
-    def child_size(self) -> int:
-        """Return the size of this Block's children.
-        """
-        return round(self.size / 2.0)
-
-    def children_positions(self) -> list[tuple[int, int]]:
-        """Return the (x, y) coordinates of this Block's four children.
-
-        The positions are returned in this order: upper-right child, upper-left
-        child, lower-left child, lower-right child.
-        """
-        x = self.position[0]
-        y = self.position[1]
-        size = self.child_size()
-
-        return [(x + size, y), (x, y), (x, y + size), (x + size, y + size)]
-
-    def _update_children_positions(self, position: tuple[int, int]) -> None:
-        """Set the position of this Block to <position> and update all its
-        descendants to have positions consistent with this Block's position.
-
-        <position> is the (x, y) coordinates of the upper-left corner of this
-        Block.
-        """
-        self.position = position
-        x, y = position
-        size = self.child_size()
-        positions = [(x + size, y), (x, y), (x, y + size), (x + size, y + size)]
-        if self.children != []:
-            for i in range(4):
-                self.children[i]._update_children_positions(positions[i])
-
     def smashable(self) -> bool:
         """Return True iff this block can be smashed.
 
@@ -245,16 +715,12 @@ class Block:
         If this Block's level is <max_depth>, do nothing. If this block has
         children, do nothing.
 
-        >>> position = (0, 0)
-        >>> size = 750
         >>> level = 0
         >>> max_depth = 1
-        >>> b1 = Block(position, size, (0, 0, 0), level, max_depth)
+        >>> b1 = Block((0, 0, 0), level, max_depth)
         >>> b1.smash()
         True
-        >>> b1.position == position
-        True
-        >>> b1.size == size
+        >>> b1.cell == (0, 0)
         True
         >>> b1.level == level
         True
@@ -268,17 +734,24 @@ class Block:
         if not self.smashable():
             return False
         self.colour = None
-        positions = self.children_positions()
+        epoch = self._tree_epoch()
+        children = []
+        # The children are built before they are attached, so that the colour
+        # counts of their subtrees are added to the ancestors of this Block
+        # once, instead of once for every new leaf
         for i in range(4):
             num = random.random()
-            child = Block(positions[i], self.child_size(), None,
-                          self.level + 1, self.max_depth)
-            self.children.append(child)
+            child = Block(None, self.level + 1, self.max_depth)
+            child._epoch = epoch
+            children.append(child)
             if num < math.exp(-0.25 * self.level):
                 if not child.smash():
                     child.colour = COLOUR_LIST[random.randint(0, 3)]
             else:
                 child.colour = COLOUR_LIST[random.randint(0, 3)]
+        self.children = children
+        if self._index is not None:
+            self._index.smashed(self)
         return True
 
     def swap(self, direction: int) -> bool:
@@ -295,24 +768,14 @@ class Block:
         """
         if self.children == []:
             return False
+        children = self._children
         if direction == SWAP_VERT:
-            save = self.children[0]
-            self.children[0] = self.children[3]
-            self.children[3] = save
-            save = self.children[1]
-            self.children[1] = self.children[2]
-            self.children[2] = save
-            self._update_children_positions(self.position)
-            return True
+            self._children = [children[3], children[2], children[1],
+                              children[0]]
         else:
-            save = self.children[0]
-            self.children[0] = self.children[1]
-            self.children[1] = save
-            save = self.children[2]
-            self.children[2] = self.children[3]
-            self.children[3] = save
-            self._update_children_positions(self.position)
-            return True
+            self._children = [children[1], children[0], children[3],
+                              children[2]]
+        return True
 
     def rotate(self, direction: int) -> bool:
         """Rotate this Block and all its descendents.
@@ -328,28 +791,19 @@ class Block:
         """
         if self.children == []:
             return False
-        for child in self.children:
-            child.rotate(direction)
-        if direction == ROT_CW:
-            save_3 = self.children[3]
-            self.children[3] = self.children[0]
-            save_2 = self.children[2]
-            self.children[2] = save_3
-            save_1 = self.children[1]
-            self.children[1] = save_2
-            self.children[0] = save_1
-            self._update_children_positions(self.position)
-            return True
-        else:
-            save_0 = self.children[0]
-            self.children[0] = self.children[3]
-            save_1 = self.children[1]
-            self.children[1] = save_0
-            save_2 = self.children[2]
-            self.children[2] = save_1
-            self.children[3] = save_2
-            self._update_children_positions(self.position)
-            return True
+        # ROT_CW and ROT_CCW are one and three clockwise quarter turns
+        self._rotation = (self._rotation + direction) % 4
+        self._tree_epoch().count += 1
+        return True
+
+    def paintable(self, colour: tuple[int, int, int]) -> bool:
+        """Return True iff this block can be painted with <colour>.
+
+        A block can be painted if it is a leaf at a level of max_depth and its
+        colour is different from <colour>.
+        """
+        return (self.children == [] and self.level == self.max_depth
+                and self.colour != colour)
 
     def paint(self, colour: tuple[int, int, int]) -> bool:
         """Change this Block's colour iff it is a leaf at a level of max_depth
@@ -357,12 +811,55 @@ class Block:
 
         Return True iff this Block's colour was changed.
         """
-        if (self.children == [] and self.level == self.max_depth
-                and self.colour != colour):
+        if self.paintable(colour):
             self.colour = colour
+            if self._index is not None:
+                self._index.painted(self)
             return True
         return False
 
+    def _majority_colour(self) -> tuple[int, int, int] | None:
+        """Return the majority colour of this Block's children, or None if
+        this Block has no children, any of its children is not a leaf, or there
+        is no majority colour.
+
+        The majority colour is the colour with the most child blocks of that
+        colour, and a tie does not constitute a majority.
+        """
+        if self.children == []:
+            return None
+        for child in self.children:
+            if child.children != []:
+                return None
+        # Every child is a leaf with the same number of unit cells, so the
+        # colour with the most unit cells is the colour of the most children
+        pick = max(self._counts, key=self._counts.get)
+        for colour, count in self._counts.items():
+            if colour != pick and count == self._counts[pick]:
+                return None
+        return pick
+
+    def combinable(self) -> bool:
+        """Return True iff this block can be combined.
+
+        A block can be combined if all of its children are leaves and they have
+        a majority colour.
+
+        >>> block = Block(COLOUR_LIST[0], 0, 1)
+        >>> block.combinable()
+        False
+        >>> block.smash()
+        True
+        >>> for child, colour in zip(block.children, [0, 0, 1, 2]):
+        ...     child.colour = COLOUR_LIST[colour]
+        >>> block.combinable()
+        True
+        >>> block.children[3].colour = COLOUR_LIST[1]
+        >>> block.combinable()
+        False
+        """
+        return self._majority_colour() is not None
+
     def combine(self) -> bool:
         """Turn this Block into a leaf based on the majority colour of its
         children.  Each child block must also be a leaf.
@@ -377,46 +874,84 @@ class Block:
 
         Return True iff this Block was turned into a leaf node.
         """
-        if self.children == []:
+        pick = self._majority_colour()
+        if pick is None:
             return False
-        colour_streak = {}
-        for child in self.children:
-            if child.children != []:
-                return False
-            if child.colour in colour_streak:
-                colour_streak[child.colour] += 1
-            else:
-                colour_streak[child.colour] = 1
-                pick = child.colour
-        for colour in colour_streak:
-            if colour_streak[colour] > colour_streak[pick]:
-                pick = colour
-        for colour in colour_streak:
-            if colour != pick and colour_streak[colour] == colour_streak[pick]:
-                return False
-        self.children = []
-        self.colour = pick
+        self.restore_leaf(pick)
         return True
 
+    def restore_leaf(self, colour: tuple[int, int, int]) -> list[Block]:
+        """Remove the children of this Block, and make it a leaf of <colour>.
+        Return the removed children, which keep their descendants and can be
+        given back by restore_children.
+
+        This undoes a smash, or redoes a combine.
+
+        >>> block = Block(COLOUR_LIST[0], 0, 1)
+        >>> block.smash()
+        True
+        >>> children = block.restore_leaf(COLOUR_LIST[0])
+        >>> block == Block(COLOUR_LIST[0], 0, 1)
+        True
+        >>> block.restore_children(children)
+        >>> block.children == children
+        True
+        """
+        old_children = self.children
+        for child in old_children:
+            child._detach()
+        self.children = []
+        self.colour = colour
+        if self._index is not None:
+            self._index.combined(self, old_children)
+        return old_children
+
+    def restore_children(self, children: list[Block]) -> None:
+        """Give this leaf back the <children> returned by restore_leaf, or
+        those of another Block at the same level.
+
+        This undoes a combine, or redoes a smash.
+
+        Preconditions:
+        - This Block has no children.
+        """
+        self._resolve()
+        self.colour = None
+        self.children = children
+        if self._index is not None:
+            self._index.smashed(self)
+
     def create_copy(self) -> Block:
         """Return a new Block that is a deep copy of this Block.
 
         Remember that a deep copy has new blocks (not aliases) at every level.
 
-        >>> block = generate_board(3, 750)
+        >>> block = generate_board(3)
         >>> copy = block.create_copy()
         >>> id(block) != id(copy)
         True
         >>> block == copy
         True
         """
-        if self.children == []:
-            return Block(self.position, self.size, self.colour, self.level,
-                         self.max_depth)
-        copy = Block(self.position, self.size, self.colour, self.level,
-                     self.max_depth)
-        for child in self.children:
-            copy.children.append(child.create_copy())
+        self._resolve()
+        copy = self._copy_tree(_Epoch())
+        _, col, row = self._locate()
+        copy._cell = (col, row)
+        return copy
+
+    def _copy_tree(self, epoch: _Epoch) -> Block:
+        """Return a deep copy of this Block that keeps the pending rotations of
+        this Block and its descendants, with <epoch> as the _Epoch of every
+        Block of the copy.
+        """
+        copy = Block(self.colour, self.level, self.max_depth)
+        copy._rotation = self._rotation
+        copy._epoch = epoch
+        copy._counts = dict(self._counts)
+        for child in self._children:
+            child_copy = child._copy_tree(epoch)
+            child_copy._parent = copy
+            copy._children.append(child_copy)
         return copy
 
 
@@ -426,7 +961,7 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', '__future__', 'math',
-            'settings'
+            'settings', 'move_index'
         ],
         'max-attributes': 15,
         'max-args': 6
@@ -437,11 +972,11 @@ if __name__ == '__main__':
     doctest.testmod()
 
     # This is a board consisting of only one block.
-    b1 = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
+    b1 = Block(COLOUR_LIST[0], 0, 1)
     print("tiny board:")
     print(b1)
 
     # Now let's make a random board.
-    b2 = generate_board(3, 750)
+    b2 = generate_board(3)
     print("\nrandom board:")
     print(b2)
@@ -0,0 +1,239 @@
+""" Module Description:
+
+This file contains the functions that keep remote copies of a board in sync by
+sending only the subtrees that a move changed.
+
+A patch is a list of replacements. Each replacement is the path from the root
+to a Block (the index of the child taken at each level), followed by the
+binary encoding of the new subtree at that path, as defined in codec.py.
+
+A BoardSync makes the patches for one remote copy, and remembers the layout of
+the board that the remote copy holds so that it is not read again for every
+patch.
+"""
+from __future__ import annotations
+
+from block import Block
+from codec import BitReader, BitWriter, COLOUR_BITS, read_block, \
+    write_block
+
+# The number of bits used to encode the length of a path.
+PATH_LENGTH_BITS = 5
+# The number of bits used to encode each step of a path.
+PATH_STEP_BITS = 2
+
+
+class BoardSync:
+    """The patches that keep a remote copy of a board in sync with it.
+
+    Every subtree that this BoardSync has seen is given a node number, so that
+    two subtrees have the same node number exactly when they have the same
+    colours in the same layout. A leaf is keyed by its level and colour, and
+    any other Block by the node numbers of its children, and node numbers are
+    looked up in a dict, which compares the keys themselves whenever their
+    hashes are equal, so different subtrees never share a node number.
+
+    The node numbers of the board that the remote copy holds are kept between
+    patches, so each patch only numbers the new board.
+
+    Instance Attributes:
+    - _nodes: The node numbers of the children of each node, or None if it is
+              a leaf, and the number of bits in its encoding, by node number.
+    - _numbers: The node number of each key, as described above.
+    - _remote: The node number of the board that the remote copy holds.
+
+    Representation Invariants:
+    - self._numbers maps the key of each node to its index in self._nodes
+    - 0 <= self._remote < len(self._nodes)
+
+    >>> from block import generate_board, ROT_CW
+    >>> board = generate_board(3)
+    >>> remote = board.create_copy()
+    >>> sync = BoardSync(board)
+    >>> sync.patch(board)
+    b'\\x00'
+    >>> board.rotate(ROT_CW)
+    True
+    >>> apply_patch(remote, sync.patch(board)) == board
+    True
+    """
+    _nodes: list[tuple[tuple[int, int, int, int] | None, int]]
+    _numbers: dict[tuple, int]
+    _remote: int
+
+    def __init__(self, board: Block) -> None:
+        """Initialize this BoardSync for a remote copy that holds a copy of
+        <board>.
+        """
+        self._nodes = []
+        self._numbers = {}
+        self._remote = self._number(board, {})
+
+    def _number(self, block: Block, numbers: dict[int, int]) -> int:
+        """Return the node number of <block>, numbering it and any of its
+        descendants that have not been seen yet, and record the node numbers
+        of <block> and every one of its descendants in <numbers>, by their id.
+        """
+        if block.children == []:
+            children = None
+            key = (block.level, block.colour)
+            bits = COLOUR_BITS + (1 if block.level < block.max_depth else 0)
+        else:
+            children = tuple(self._number(child, numbers)
+                             for child in block.children)
+            key = children
+            bits = 1 + sum(self._nodes[child][1] for child in children)
+        node = self._numbers.get(key)
+        if node is None:
+            node = len(self._nodes)
+            self._numbers[key] = node
+            self._nodes.append((children, bits))
+        numbers[id(block)] = node
+        return node
+
+    def _diff(self, old: int, new: Block, path: list[int],
+              numbers: dict[int, int]) \
+            -> tuple[list[tuple[list[int], Block]], int]:
+        """Return the replacements that turn the subtree with node number
+        <old> into <new>, which are both at <path>, and the number of bits
+        they take in a patch.
+
+        Identical subtrees are skipped by comparing their node numbers, which
+        are in <numbers> for <new>. A Block is replaced as a whole if that
+        takes no more bits than the replacements inside it.
+        """
+        node = numbers[id(new)]
+        if node == old:
+            return [], 0
+        replace_bits = (PATH_LENGTH_BITS + PATH_STEP_BITS * len(path)
+                        + self._nodes[node][1])
+        old_children = self._nodes[old][0]
+        if old_children is None or new.children == []:
+            return [(path, new)], replace_bits
+        replacements = []
+        bits = 0
+        for i in range(4):
+            child_replacements, child_bits = self._diff(old_children[i],
+                                                        new.children[i],
+                                                        path + [i], numbers)
+            replacements.extend(child_replacements)
+            bits += child_bits
+        if bits >= replace_bits:
+            return [(path, new)], replace_bits
+        return replacements, bits
+
+    def patch(self, board: Block) -> bytes:
+        """Return a patch that turns the remote copy into <board>, and record
+        that the remote copy now holds <board>.
+
+        Node numbers of subtrees that are no longer on the board are dropped
+        once there are more of them than subtrees on the board.
+
+        Preconditions:
+        - <board> has the same unit cell, level and max_depth as the board
+          that the remote copy holds.
+        """
+        numbers = {}
+        node = self._number(board, numbers)
+        replacements = self._diff(self._remote, board, [], numbers)[0]
+        if len(self._nodes) > 2 * len(numbers):
+            self._nodes = []
+            self._numbers = {}
+            node = self._number(board, {})
+        self._remote = node
+        writer = BitWriter()
+        count = len(replacements)
+        while count >= 128:
+            writer.write(count & 127 | 128, 8)
+            count >>= 7
+        writer.write(count, 8)
+        for path, block in replacements:
+            writer.write(len(path), PATH_LENGTH_BITS)
+            for step in path:
+                writer.write(step, PATH_STEP_BITS)
+            write_block(block, writer)
+        return writer.to_bytes()
+
+
+def diff_boards(old: Block, new: Block) -> bytes:
+    """Return a patch that turns a copy of the board <old> into the board
+    <new>.
+
+    To keep a remote copy in sync over many moves, use a BoardSync instead,
+    which does not number the old board again for every patch.
+
+    Preconditions:
+    - <old> and <new> have the same unit cell, level and max_depth.
+
+    >>> from block import generate_board
+    >>> board = generate_board(3)
+    >>> diff_boards(board, board.create_copy())
+    b'\\x00'
+    """
+    return BoardSync(old).patch(new)
+
+
+def apply_patch(board: Block, patch: bytes) -> Block:
+    """Apply <patch> to <board> and return the resulting board.
+
+    The root of the result is <board>, unless the patch replaces the whole
+    board. Every Block that is replaced becomes the root of its own tree, at
+    the unit cell where it was.
+
+    Preconditions:
+    - <board> is not indexed by a MoveIndex.
+
+    >>> from block import generate_board, ROT_CW
+    >>> board = generate_board(3)
+    >>> copy = board.create_copy()
+    >>> board.rotate(ROT_CW)
+    True
+    >>> apply_patch(copy, diff_boards(copy, board)) == board
+    True
+    >>> from settings import COLOUR_LIST
+    >>> board = Block(COLOUR_LIST[0], 0, 1)
+    >>> board.smash()
+    True
+    >>> copy = board.create_copy()
+    >>> old = copy.children[3]
+    >>> board.children[3].paint(COLOUR_LIST[1] if old.colour == COLOUR_LIST[0]
+    ...                         else COLOUR_LIST[0])
+    True
+    >>> copy = apply_patch(copy, diff_boards(copy, board))
+    >>> copy.children[3] is not old and old.cell == (1, 1)
+    True
+    """
+    reader = BitReader(patch)
+    count = 0
+    shift = 0
+    byte = reader.read(8)
+    while byte >= 128:
+        count |= (byte & 127) << shift
+        shift += 7
+        byte = reader.read(8)
+    count |= byte << shift
+    for _ in range(count):
+        path = [reader.read(PATH_STEP_BITS)
+                for _ in range(reader.read(PATH_LENGTH_BITS))]
+        if path == []:
+            board = read_block(reader, board.level, board.max_depth)
+            continue
+        parent = board
+        for step in path[:-1]:
+            parent = parent.children[step]
+        children = list(parent.children)
+        old = children[path[-1]]
+        old._detach()
+        children[path[-1]] = read_block(reader, old.level, old.max_depth)
+        parent.children = children
+    return board
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'block', 'codec'
+        ]
+    })
@@ -0,0 +1,158 @@
+""" Module Description:
+
+This file contains the binary encoding of Blocks, which is used to send and
+store boards compactly.
+
+A Block is encoded in preorder, one bit at a time. Every Block below max_depth
+starts with one bit that is 1 iff it has children. A parent is followed by the
+encodings of its four children, and a leaf is followed by the index of its
+colour in COLOUR_LIST, in two bits. Leaves at max_depth cannot have children,
+so they are encoded by their colour alone.
+"""
+from __future__ import annotations
+
+from block import Block
+from settings import COLOUR_LIST
+
+# The number of bits used to encode the colour of a leaf.
+COLOUR_BITS = 2
+
+
+class BitWriter:
+    """A sequence of bits that is written one value at a time.
+
+    Private Instance Attributes:
+    - _bytes: The complete bytes written so far.
+    - _current: The bits of the incomplete last byte.
+    - _num_bits: The number of bits in _current.
+    """
+    _bytes: bytearray
+    _current: int
+    _num_bits: int
+
+    def __init__(self) -> None:
+        """Initialize this BitWriter with no bits.
+        """
+        self._bytes = bytearray()
+        self._current = 0
+        self._num_bits = 0
+
+    def write(self, value: int, num_bits: int) -> None:
+        """Write the <num_bits> lowest bits of <value>, lowest bit first.
+        """
+        self._current |= (value & ((1 << num_bits) - 1)) << self._num_bits
+        self._num_bits += num_bits
+        while self._num_bits >= 8:
+            self._bytes.append(self._current & 0xFF)
+            self._current >>= 8
+            self._num_bits -= 8
+
+    def to_bytes(self) -> bytes:
+        """Return the bits written so far, padded with zeros to a whole number
+        of bytes.
+        """
+        if self._num_bits == 0:
+            return bytes(self._bytes)
+        return bytes(self._bytes) + bytes([self._current])
+
+
+class BitReader:
+    """A sequence of bits that is read one value at a time, in the order that
+    a BitWriter wrote them.
+
+    Private Instance Attributes:
+    - _data: The bytes being read.
+    - _position: The index of the next bit to read.
+    """
+    _data: bytes
+    _position: int
+
+    def __init__(self, data: bytes, start: int = 0) -> None:
+        """Initialize this BitReader to read <data>, starting at the bit with
+        index <start>.
+        """
+        self._data = data
+        self._position = start
+
+    def read(self, num_bits: int) -> int:
+        """Return the next <num_bits> bits as an int, lowest bit first.
+        """
+        value = 0
+        for i in range(num_bits):
+            bit = (self._data[self._position >> 3] >> (self._position & 7)) & 1
+            value |= bit << i
+            self._position += 1
+        return value
+
+
+def write_block(block: Block, writer: BitWriter) -> None:
+    """Write the encoding of <block> to <writer>.
+    """
+    if block.level < block.max_depth:
+        writer.write(block.children != [], 1)
+    if block.children == []:
+        writer.write(COLOUR_LIST.index(block.colour), COLOUR_BITS)
+    else:
+        for child in block.children:
+            write_block(child, writer)
+
+
+def read_block(reader: BitReader, level: int, max_depth: int) -> Block:
+    """Return the Block at <level> and with <max_depth> whose encoding is next
+    in <reader>.
+    """
+    block = Block(None, level, max_depth)
+    if level < max_depth and reader.read(1) == 1:
+        block.children = [read_block(reader, level + 1, max_depth)
+                          for _ in range(4)]
+    else:
+        block.colour = COLOUR_LIST[reader.read(COLOUR_BITS)]
+    return block
+
+
+def encoded_bits(block: Block) -> int:
+    """Return the number of bits in the encoding of <block>.
+    """
+    bits = 1 if block.level < block.max_depth else 0
+    if block.children == []:
+        return bits + COLOUR_BITS
+    return bits + sum(encoded_bits(child) for child in block.children)
+
+
+def encode_board(board: Block) -> bytes:
+    """Return the binary encoding of <board>.
+
+    >>> board = Block(COLOUR_LIST[2], 0, 1)
+    >>> encode_board(board)
+    b'\\x04'
+    >>> board.smash()
+    True
+    >>> len(encode_board(board))
+    2
+    """
+    writer = BitWriter()
+    write_block(board, writer)
+    return writer.to_bytes()
+
+
+def decode_board(data: bytes, max_depth: int, level: int = 0) -> Block:
+    """Return the Block at <level> and with <max_depth> that is encoded by
+    <data>.
+
+    >>> from block import generate_board
+    >>> board = generate_board(4)
+    >>> decode_board(encode_board(board), 4) == board
+    True
+    """
+    return read_block(BitReader(data), level, max_depth)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'block',
+            'settings'
+        ]
+    })
@@ -0,0 +1,117 @@
+""" Module Description:
+
+This file contains the key bindings of the Blocky game and the functions that
+read the input of a human player from pygame events.
+
+This is the only module that players need pygame for, and they import it only
+when they handle input, so the engine modules can be imported without pygame.
+
+The position of the mouse is converted to the unit cell of the board under
+it by the Viewport given to set_viewport, which the board is drawn through.
+"""
+from __future__ import annotations
+import pygame
+
+from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, COMBINE, PAINT, PASS
+from viewport import Viewport
+
+KEY_ACTION = {
+    pygame.K_d: ROTATE_CLOCKWISE,
+    pygame.K_a: ROTATE_COUNTER_CLOCKWISE,
+    pygame.K_q: SWAP_HORIZONTAL,
+    pygame.K_e: SWAP_VERTICAL,
+    pygame.K_SPACE: SMASH,
+    pygame.K_c: COMBINE,
+    pygame.K_r: PAINT,
+    pygame.K_TAB: PASS
+}
+
+# The keys that change the level of the block selected by a human player, and
+# the change in level for each key.
+KEY_LEVEL = {
+    pygame.K_w: -1,
+    pygame.K_s: 1
+}
+
+# The keys that undo and redo the most recent move.
+KEY_UNDO = pygame.K_z
+KEY_REDO = pygame.K_y
+
+# The keys that zoom the board in and out, and the number of times that each
+# key doubles the zoom.
+KEY_ZOOM = {
+    pygame.K_EQUALS: 1,
+    pygame.K_MINUS: -1
+}
+
+# The keys that pan the board, and how far each key moves the region that is
+# shown to the right and down, as a fraction of its size.
+KEY_PAN = {
+    pygame.K_LEFT: (-0.25, 0),
+    pygame.K_RIGHT: (0.25, 0),
+    pygame.K_UP: (0, -0.25),
+    pygame.K_DOWN: (0, 0.25)
+}
+
+# The Viewport that the board is shown through, or None if it is not shown.
+_viewport = None
+
+
+def set_viewport(viewport: Viewport | None) -> None:
+    """Convert the positions of the mouse through <viewport> from now on, or
+    to no unit cell at all if it is None.
+    """
+    global _viewport
+    _viewport = viewport
+
+
+def mouse_cell(max_depth: int) -> tuple[int, int] | None:
+    """Return the unit cell of the board of <max_depth> under the mouse, or
+    None if the mouse is not over the board.
+    """
+    if _viewport is None:
+        return None
+    return _viewport.to_cell(pygame.mouse.get_pos(), max_depth)
+
+
+def released_key(event: pygame.event.Event) -> int | None:
+    """Return the key that was released in <event>, or None if <event> is not
+    the release of a key.
+    """
+    if event.type == pygame.KEYUP:
+        return event.key
+    return None
+
+
+def process_view_event(viewport: Viewport, event: pygame.event.Event) -> bool:
+    """Zoom or pan <viewport> if <event> is the release of a key in KEY_ZOOM
+    or KEY_PAN, and return True iff it is.
+    """
+    key = released_key(event)
+    if key in KEY_ZOOM:
+        viewport.zoom_by(KEY_ZOOM[key])
+    elif key in KEY_PAN:
+        viewport.pan(*KEY_PAN[key])
+    else:
+        return False
+    return True
+
+
+def is_left_click(event: pygame.event.Event) -> bool:
+    """Return True iff <event> is a press of the left mouse button.
+    """
+    return (event.type == pygame.MOUSEBUTTONDOWN
+            and event.button == pygame.BUTTON_LEFT)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'actions',
+            'viewport', 'pygame'
+        ],
+        'generated-members': 'pygame.*'
+    })
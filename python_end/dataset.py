@@ -0,0 +1,345 @@
+""" Module Description:
+
+This file contains a self-play dataset generator, which plays seeded games of
+Blocky between computer players in worker processes and streams one record per
+move to disk, and a reader that iterates over the records lazily.
+
+A record contains:
+- the binary encoding of the board before the move, as defined in codec.py,
+- the kind of the moving player's goal (its index in GOAL_KINDS) and the index
+  of its colour in COLOUR_LIST,
+- the move, as the index of its action in RECORD_ACTIONS and the unit cell
+  and level of the block it was applied to, and
+- the score of the player's goal after the move, without penalties.
+
+Records are written to numbered chunk files of up to a fixed number of
+records. Each chunk file starts with a header of CHUNK_HEADER, which holds
+CHUNK_MAGIC, the number of records in the chunk and the length of the
+uncompressed records, followed by the zlib-compressed records. Each record is
+the length of the board encoding as RECORD_HEADER, the encoding, and the rest
+of the record as RECORD_BODY.
+"""
+from __future__ import annotations
+import multiprocessing
+import os
+import random
+import struct
+import traceback
+import zlib
+from queue import Empty
+from typing import BinaryIO, Iterator
+
+from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, COMBINE, PAINT, PASS
+from block import generate_board
+from codec import encode_board
+from goal import BlobGoal, PerimeterGoal
+from player import create_players
+from settings import COLOUR_LIST
+
+# The actions of records, in the order of their ids.
+RECORD_ACTIONS = [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, SWAP_HORIZONTAL,
+                  SWAP_VERTICAL, SMASH, COMBINE, PAINT, PASS]
+# The kinds of goals of records, in the order of their ids.
+GOAL_KINDS = [PerimeterGoal, BlobGoal]
+
+CHUNK_MAGIC = b'BLKY'
+CHUNK_HEADER = struct.Struct('<4sII')
+RECORD_HEADER = struct.Struct('<I')
+RECORD_BODY = struct.Struct('<BBBBHHi')
+# The number of compressed bytes that are read from a chunk file at a time.
+READ_SIZE = 1 << 16
+# The number of seconds to wait for records before checking that the workers
+# are still running.
+POLL_INTERVAL = 1.0
+
+
+def _chunk_path(directory: str, number: int) -> str:
+    """Return the path of the chunk file with <number> in <directory>.
+    """
+    return os.path.join(directory, f'chunk-{number:06d}.bin')
+
+
+class DatasetWriter:
+    """A writer of records to compressed chunk files.
+
+    Private Instance Attributes:
+    - _directory: The directory that the chunk files are written to.
+    - _records_per_chunk: The largest number of records in a chunk file.
+    - _records: The encoded records of the chunk being filled.
+    - _num_chunks: The number of chunk files written so far.
+    """
+    _directory: str
+    _records_per_chunk: int
+    _records: list[bytes]
+    _num_chunks: int
+
+    def __init__(self, directory: str, records_per_chunk: int) -> None:
+        """Initialize this DatasetWriter to write chunk files of up to
+        <records_per_chunk> records to <directory>, which is created if it does
+        not exist.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._records_per_chunk = records_per_chunk
+        self._records = []
+        self._num_chunks = 0
+
+    def add(self, record: tuple[bytes, int, int, int, tuple[int, int], int,
+                                int]) -> None:
+        """Add <record>, a tuple of a board encoding, goal kind, colour index,
+        action id, unit cell, level and score, writing a chunk file if it is
+        full.
+        """
+        encoding, kind, colour, action, (x, y), level, score = record
+        self._records.append(RECORD_HEADER.pack(len(encoding)) + encoding
+                             + RECORD_BODY.pack(kind, colour, action, level,
+                                                x, y, score))
+        if len(self._records) == self._records_per_chunk:
+            self._flush()
+
+    def _flush(self) -> None:
+        """Write the records added since the last chunk file to a new chunk
+        file.
+        """
+        if self._records == []:
+            return
+        data = b''.join(self._records)
+        with open(_chunk_path(self._directory, self._num_chunks), 'wb') as f:
+            f.write(CHUNK_HEADER.pack(CHUNK_MAGIC, len(self._records),
+                                      len(data)))
+            f.write(zlib.compress(data))
+        self._num_chunks += 1
+        self._records = []
+
+    def close(self) -> None:
+        """Write the remaining records to a last chunk file.
+        """
+        self._flush()
+
+
+def play_game(seed: int, max_depth: int, num_random: int,
+              smart_players: list[int], max_turns: int) \
+        -> list[tuple[bytes, int, int, int, tuple[int, int], int, int]]:
+    """Return the records of every move of a game between <num_random>
+    RandomPlayers and a SmartPlayer for each difficulty in <smart_players>, on
+    a board of <max_depth> generated with the random <seed>.
+
+    The same arguments always give the same records.
+
+    >>> play_game(148, 3, 1, [2], 2) == play_game(148, 3, 1, [2], 2)
+    True
+    >>> len(play_game(148, 3, 1, [2], 2))
+    4
+    """
+    random.seed(seed)
+    board = generate_board(max_depth)
+    players = create_players(0, num_random, smart_players)
+    records = []
+    for _ in range(max_turns):
+        for player in players:
+            goal = player.goal
+            encoding = encode_board(board)
+            player._proceed = True
+            move = player.generate_move(board)
+            action, block = PASS, board
+            if move is not None and move[0].apply(move[1],
+                                                  {'colour': goal.colour}):
+                action, block = move
+            records.append((encoding, GOAL_KINDS.index(type(goal)),
+                            COLOUR_LIST.index(goal.colour),
+                            RECORD_ACTIONS.index(action), block.cell,
+                            block.level, goal.score(board)))
+    return records
+
+
+def _produce(seeds: list[int], game_args: tuple[int, int, list[int], int],
+             queue: multiprocessing.Queue) -> None:
+    """Put the records of the game for each seed in <seeds>, played with
+    <game_args> by play_game, on <queue>, one list per game, followed by None.
+
+    If a game raises an exception, put its traceback as a str instead of the
+    rest of the games, so that the writer can report it. None is put even
+    then, so that the writer never waits for this worker forever.
+
+    Each put blocks while <queue> is full, until the writer catches up.
+    """
+    try:
+        for seed in seeds:
+            queue.put(play_game(seed, *game_args))
+    except Exception:
+        queue.put(traceback.format_exc())
+    finally:
+        queue.put(None)
+
+
+def _check_workers(workers: list[multiprocessing.Process]) -> None:
+    """Raise a RuntimeError if one of <workers> has exited abnormally, and so
+    may never put its None.
+    """
+    for worker in workers:
+        if worker.exitcode not in (None, 0):
+            raise RuntimeError('a dataset worker exited with code '
+                               f'{worker.exitcode}')
+
+
+def generate_dataset(directory: str, seeds: list[int], max_depth: int,
+                     num_workers: int, num_random: int = 1,
+                     smart_players: list[int] | None = None,
+                     max_turns: int = 5, records_per_chunk: int = 4096,
+                     queue_size: int = 16) -> int:
+    """Play a game for every seed in <seeds> with <num_workers> worker
+    processes, as described by play_game, and write the records of every move
+    to chunk files in <directory>. Return the number of records written.
+
+    At most <queue_size> games of records wait to be written at once, so
+    memory use stays bounded however many games are played.
+
+    Raise a RuntimeError if a game raises an exception or a worker dies, after
+    stopping the other workers.
+    """
+    if smart_players is None:
+        smart_players = [3]
+    game_args = (max_depth, num_random, smart_players, max_turns)
+    queue = multiprocessing.Queue(queue_size)
+    workers = [multiprocessing.Process(target=_produce,
+                                       args=(seeds[i::num_workers], game_args,
+                                             queue))
+               for i in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    writer = DatasetWriter(directory, records_per_chunk)
+    num_records = 0
+    running = num_workers
+    try:
+        while running > 0:
+            try:
+                records = queue.get(timeout=POLL_INTERVAL)
+            except Empty:
+                _check_workers(workers)
+                continue
+            if records is None:
+                running -= 1
+            elif isinstance(records, str):
+                raise RuntimeError(f'a dataset worker failed:\n{records}')
+            else:
+                for record in records:
+                    writer.add(record)
+                num_records += len(records)
+    except BaseException:
+        for worker in workers:
+            worker.terminate()
+        raise
+    finally:
+        for worker in workers:
+            worker.join()
+    writer.close()
+    return num_records
+
+
+class _ChunkReader:
+    """A reader of the decompressed records of a chunk file, which reads and
+    decompresses only as much of the file as has been asked for.
+
+    Private Instance Attributes:
+    - _file: The chunk file, positioned after the compressed data read so far.
+    - _decompressor: The decompressor of the compressed records.
+    - _buffer: The decompressed data that has not been read yet, from
+               _offset on.
+    - _offset: The index in _buffer of the next byte to read.
+    """
+    _file: BinaryIO
+    _decompressor: zlib.Decompress
+    _buffer: bytes
+    _offset: int
+
+    def __init__(self, file: BinaryIO) -> None:
+        """Initialize this _ChunkReader of the compressed records that start
+        at the current position of <file>.
+        """
+        self._file = file
+        self._decompressor = zlib.decompressobj()
+        self._buffer = b''
+        self._offset = 0
+
+    def read(self, size: int) -> bytes:
+        """Return the next <size> bytes of the decompressed records.
+
+        Raise a ValueError if the records end first.
+        """
+        while len(self._buffer) - self._offset < size:
+            data = self._file.read(READ_SIZE)
+            if data == b'':
+                raise ValueError('chunk file is truncated')
+            data = self._decompressor.decompress(data)
+            self._buffer = self._buffer[self._offset:] + data
+            self._offset = 0
+        start = self._offset
+        self._offset += size
+        return self._buffer[start:self._offset]
+
+
+def iter_chunk(path: str) \
+        -> Iterator[tuple[bytes, int, int, int, tuple[int, int], int, int]]:
+    """Yield the records of the chunk file at <path>, in order.
+
+    The file is read and decompressed a block at a time as the records are
+    yielded, so only a small part of the chunk is held in memory at once.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(CHUNK_HEADER.size)
+        if len(header) < CHUNK_HEADER.size \
+                or CHUNK_HEADER.unpack(header)[0] != CHUNK_MAGIC:
+            raise ValueError(f'{path} is not a chunk file')
+        num_records = CHUNK_HEADER.unpack(header)[1]
+        reader = _ChunkReader(f)
+        for _ in range(num_records):
+            size = RECORD_HEADER.unpack(reader.read(RECORD_HEADER.size))[0]
+            encoding = reader.read(size)
+            kind, colour, action, level, x, y, score = RECORD_BODY.unpack(
+                reader.read(RECORD_BODY.size))
+            yield encoding, kind, colour, action, (x, y), level, score
+
+
+def chunk_paths(directory: str) -> list[str]:
+    """Return the paths of the chunk files of the dataset in <directory>, in
+    order.
+    """
+    paths = []
+    while os.path.exists(_chunk_path(directory, len(paths))):
+        paths.append(_chunk_path(directory, len(paths)))
+    return paths
+
+
+def iter_records(directory: str) \
+        -> Iterator[tuple[bytes, int, int, int, tuple[int, int], int, int]]:
+    """Yield every record of the dataset in <directory>, one chunk file at a
+    time, so that only one chunk is held in memory at once.
+
+    >>> import tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> generate_dataset(directory, [1, 2, 3], 3, 2, max_turns=2,
+    ...                  records_per_chunk=5)
+    12
+    >>> len(os.listdir(directory))
+    3
+    >>> records = list(iter_records(directory))
+    >>> sorted(records) == sorted(play_game(1, 3, 1, [3], 2)
+    ...                           + play_game(2, 3, 1, [3], 2)
+    ...                           + play_game(3, 3, 1, [3], 2))
+    True
+    """
+    for path in chunk_paths(directory):
+        yield from iter_chunk(path)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'multiprocessing',
+            'os', 'queue', 'random', 'struct', 'traceback', 'zlib', 'actions',
+            'block', 'codec', 'goal', 'player', 'settings'
+        ]
+    })
@@ -7,8 +7,10 @@ can call to try playing the game in several different configurations.
 """
 import pygame
 
+import controls
 from block import generate_board
-from state import GameData, GameState, MainState
+from game_data import GameData
+from state import GameState, MainState
 from player import create_players
 from renderer import Renderer
 from settings import BOARD_SIZE
@@ -37,10 +39,11 @@ class Game:
         Preconditions:
         - 2 <= max_depth <= 5
         """
-        board = generate_board(max_depth, BOARD_SIZE)
+        board = generate_board(max_depth)
         players = create_players(num_human, num_random, smart_players)
 
         self._renderer = Renderer(BOARD_SIZE)
+        controls.set_viewport(self._renderer.viewport)
         self._data = GameData(board, players)
         self._state = MainState(self._data)
 
@@ -60,7 +63,8 @@ class Game:
             for e in pygame.event.get():
                 if e.type == pygame.QUIT:
                     return
-                else:
+                elif not controls.process_view_event(self._renderer.viewport,
+                                                     e):
                     self._state.process_event(e)
 
             # Update the state of the game
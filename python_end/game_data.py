@@ -0,0 +1,75 @@
+""" Module Description:
+
+This file contains the GameData class, the data of a Blocky game, which is
+shared by the game states and the headless server. It does not import pygame,
+so that the server can run without a display.
+"""
+from __future__ import annotations
+
+from block import Block
+from goal import score_goals
+from player import Player
+
+
+class GameData:
+    """
+    A bundle of the data needed for a Blocky game.
+
+    Instance Attributes:
+    - max_turns: The maximum number of turns for the game.
+    - board: The Blocky board on which this game will be played.
+    - players: The entities that are playing this game.
+
+    Representation Invariants:
+    - len(self.players) >= 1
+    - self.max_turns >= 1
+    """
+    max_turns: int
+    board: Block
+    players: list[Player]
+
+    def __init__(self, board: Block, players: list[Player]) -> None:
+        """Initialize the game data, saving a reference to <board> and
+        <players>. The max_turns attribute is initially zero and will be later
+        set by the actual game when it is played.
+
+        Preconditions:
+        - len(players) >= 1
+        """
+        self.max_turns = 0
+        self.board = board
+        self.players = players
+
+    def calculate_score(self, player_id: int) -> tuple[int, int]:
+        """Return a tuple containing first the <player_id>'s score based on
+        their goal in the game and second the deductions from their score based
+        on the actions they've taken.
+        """
+        goal_score = self.players[player_id].goal.score(self.board)
+
+        penalty = self.players[player_id].penalty
+
+        return goal_score, penalty
+
+    def calculate_all_scores(self) -> list[tuple[int, int]]:
+        """Return a list containing, for every player in order, the same tuple
+        as calculate_score.
+
+        The goals of all the players are scored together in a single pass over
+        the board.
+        """
+        goal_scores = score_goals(self.board,
+                                  [player.goal for player in self.players])
+        return [(goal_scores[i], self.players[i].penalty)
+                for i in range(len(self.players))]
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'block', 'goal',
+            'player'
+        ]
+    })
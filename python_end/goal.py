@@ -5,8 +5,28 @@ This file contains the hierarchy of Goal classes and related helper functions.
 from __future__ import annotations
 import random
 from block import Block
+from bitboard import BitBoard, MAX_BITBOARD_DEPTH
+from grid_view import GridView, _QUADRANT
 from settings import colour_name, COLOUR_LIST
 
+# The edges of a board, as bits, and the edges of its parent that each child
+# of a Block touches, by index.
+_TOP, _BOTTOM, _LEFT, _RIGHT = 1, 2, 4, 8
+_CHILD_EDGES = [_TOP | _RIGHT, _TOP | _LEFT, _BOTTOM | _LEFT, _BOTTOM | _RIGHT]
+
+# The offset of the Block on each side of a Block of width w, in units of w,
+# and the indices of its children that touch that Block: on the left, the
+# right, above and below.
+_SIDES = [(-1, 0, (0, 3)), (1, 0, (1, 2)), (0, -1, (2, 3)), (0, 1, (0, 1))]
+
+# The kinds of the tasks of _leaf_blobs: the Blocks under a Block, and
+# a pair of Blocks side by side or one above the other.
+_FACE, _BESIDE, _ABOVE = 0, 1, 2
+
+# A board is scored from its leaves, rather than from its unit cells, when it
+# has at least this many times as many unit cells as leaves.
+LEAF_GRAPH_RATIO = 8
+
 
 def generate_goals(num_goals: int) -> list[Goal]:
     """Return a randomly generated list of goals with length <num_goals>.
@@ -42,6 +62,9 @@ def flatten(block: Block) -> list[list[tuple[int, int, int]]]:
     of the block at the cell location[i][j].
 
     L[0][0] represents the unit cell in the upper left corner of the Block.
+
+    To read only some of the unit cells, a GridView of <block> can be indexed
+    in the same way without building L.
     """
     if block.children == [] and block.max_depth == block.level:
         return [[block.colour]]
@@ -66,6 +89,311 @@ def flatten(block: Block) -> list[list[tuple[int, int, int]]]:
         return columns
 
 
+def _perimeter(flat_board: list[list[tuple[int, int, int]]]) \
+        -> list[tuple[int, int, int]]:
+    """Return the colours of the cells on the perimeter of <flat_board>, with
+    every corner cell appearing twice.
+    """
+    return (list(flat_board[0]) + [col[0] for col in flat_board]
+            + list(flat_board[-1]) + [col[-1] for col in flat_board])
+
+
+def _perimeter_counts(board: Block) -> dict[tuple[int, int, int], int]:
+    """Return the number of unit cells of each colour on the perimeter of
+    <board>, with corner cells counting twice, leaving out the colours with no
+    cells on the perimeter.
+
+    Only the Blocks that touch an edge of <board> are visited. A leaf has
+    2 ** (max_depth - level) unit cells along each edge of <board> that it
+    touches, so a leaf in a corner counts its corner cell once for each of the
+    two edges.
+
+    The counts are the same as those of the perimeter of the flattened board:
+
+    >>> from block import generate_board
+    >>> boards = [generate_board(random.randint(0, 6))
+    ...           for _ in range(50)]
+    >>> all(_perimeter_counts(board).get(colour, 0)
+    ...     == _perimeter(flatten(board)).count(colour)
+    ...     for board in boards for colour in COLOUR_LIST)
+    True
+    """
+    counts = {}
+    stack = [(board, _TOP | _BOTTOM | _LEFT | _RIGHT)]
+    while stack:
+        block, edges = stack.pop()
+        children = block.children
+        if children == []:
+            cells = edges.bit_count() << (block.max_depth - block.level)
+            counts[block.colour] = counts.get(block.colour, 0) + cells
+        else:
+            for i in range(4):
+                if edges & _CHILD_EDGES[i]:
+                    stack.append((children[i], edges & _CHILD_EDGES[i]))
+    return counts
+
+
+def _largest_blobs(flat_board: list[list[tuple[int, int, int]]]) \
+        -> dict[tuple[int, int, int], int]:
+    """Return a dictionary mapping each colour in <flat_board> to the number of
+    unit cells in the largest connected blob of that colour.
+
+    Every cell is visited once, labelling the blobs of all colours together.
+    """
+    size = len(flat_board)
+    visited = [[False for _ in col] for col in flat_board]
+    largest = {}
+    for i in range(size):
+        for j in range(size):
+            if visited[i][j]:
+                continue
+            colour = flat_board[i][j]
+            visited[i][j] = True
+            stack = [(i, j)]
+            blob = 0
+            while stack:
+                x, y = stack.pop()
+                blob += 1
+                for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                    if (0 <= nx < size and 0 <= ny < size
+                            and not visited[nx][ny]
+                            and flat_board[nx][ny] == colour):
+                        visited[nx][ny] = True
+                        stack.append((nx, ny))
+            if blob > largest.get(colour, 0):
+                largest[colour] = blob
+    return largest
+
+
+def _find(parents: dict[int, int], key: int) -> int:
+    """Return the representative of the set of <key> in the disjoint sets
+    stored as <parents>, halving the path to it along the way.
+    """
+    while parents[key] != key:
+        parents[key] = parents[parents[key]]
+        key = parents[key]
+    return key
+
+
+def _largest_leaf_blobs(board: Block) -> dict[tuple[int, int, int], int]:
+    """Return a dictionary mapping each colour of a leaf of <board> to the
+    number of unit cells in the largest connected blob of that colour.
+
+    This gives the same result as _largest_blobs(flatten(board)), in time
+    proportional to the number of leaves of <board> rather than to its number
+    of unit cells, by reading the sets of _leaf_blobs.
+
+    >>> from block import generate_board
+    >>> boards = [generate_board(random.randint(0, 5))
+    ...           for _ in range(100)]
+    >>> all(_largest_leaf_blobs(board) == _largest_blobs(flatten(board))
+    ...     for board in boards)
+    True
+    """
+    parents, cells, colours = _leaf_blobs(board)
+    largest = {}
+    for key, parent in parents.items():
+        if key == parent and cells[key] > largest.get(colours[key], 0):
+            largest[colours[key]] = cells[key]
+    return largest
+
+
+def _leaf_blobs(board: Block) -> tuple[dict[int, int], dict[int, int],
+                                       dict[int, tuple[int, int, int]]]:
+    """Return the connected blobs of <board> as disjoint sets of its leaves,
+    stored as a tuple containing the parent of each leaf, the number of unit
+    cells in the set of each representative leaf, and the colour of each leaf,
+    all by the id of the leaf. The representative of the set of a leaf is
+    found with _find.
+
+    Neighbouring leaves are found from the tree: the leaves on either side of
+    the edge between two children of a Block are paired by following the
+    children of each side that touch that edge, down to the leaves.
+    Neighbouring leaves of the same colour are then merged in a union-find,
+    where each set counts the unit cells of its leaves.
+
+    The leaves are told apart by their identity, so <board> must be a Block,
+    and not a view such as a HeapBlock, whose children are new objects each
+    time.
+    """
+    parents = {}
+    cells = {}
+    colours = {}
+    # The tasks of each Block are pushed before the Blocks under its children,
+    # so every leaf has been added by the time that it is paired.
+    stack = [(_FACE, board, None)]
+    while stack:
+        kind, first, second = stack.pop()
+        if kind == _FACE:
+            children = first.children
+            if children == []:
+                key = id(first)
+                parents[key] = key
+                cells[key] = 4 ** (first.max_depth - first.level)
+                colours[key] = first.colour
+            else:
+                stack.extend([(_BESIDE, children[1], children[0]),
+                              (_BESIDE, children[2], children[3]),
+                              (_ABOVE, children[1], children[2]),
+                              (_ABOVE, children[0], children[3])])
+                stack.extend((_FACE, child, None) for child in children)
+            continue
+        # <first> is to the left of or above <second>.
+        first_children = first.children
+        second_children = second.children
+        if first_children == [] and second_children == []:
+            if first.colour == second.colour:
+                a = _find(parents, id(first))
+                b = _find(parents, id(second))
+                if a != b:
+                    if cells[a] < cells[b]:
+                        a, b = b, a
+                    parents[b] = a
+                    cells[a] += cells[b]
+        elif kind == _BESIDE:
+            stack.append((kind, first_children[0] if first_children else first,
+                          second_children[1] if second_children else second))
+            stack.append((kind, first_children[3] if first_children else first,
+                          second_children[2] if second_children else second))
+        else:
+            stack.append((kind, first_children[2] if first_children else first,
+                          second_children[1] if second_children else second))
+            stack.append((kind, first_children[3] if first_children else first,
+                          second_children[0] if second_children else second))
+    return parents, cells, colours
+
+
+def _is_sparse(board: Block) -> bool:
+    """Return True iff <board> is a Block with at least LEAF_GRAPH_RATIO times
+    as many unit cells as leaves, so that it is faster to score its BlobGoals
+    with _largest_leaf_blobs.
+
+    The leaves are counted only until there are too many of them.
+    """
+    if not isinstance(board, Block):
+        return False
+    limit = 4 ** (board.max_depth - board.level) // LEAF_GRAPH_RATIO
+    num_leaves = 0
+    stack = [board]
+    while stack:
+        children = stack.pop().children
+        if children == []:
+            num_leaves += 1
+            if num_leaves > limit:
+                return False
+        else:
+            stack.extend(children)
+    return True
+
+
+def _unit_cell(board: Block, block: Block) -> tuple[int, int]:
+    """Return the column and row, in the flattened <board>, of the upper left
+    unit cell of <block>.
+
+    Preconditions:
+    - <block> is <board> or one of its descendants.
+    """
+    col, row = block.cell
+    x, y = board.cell
+    return col - x, row - y
+
+
+def _bordering_leaves(board: Block, block: Block) -> list[Block]:
+    """Return the leaves of <board> outside <block> that share an edge with a
+    unit cell of <block>.
+
+    The Block of the same size on each side of <block> is found by descending
+    from <board>, or a larger leaf if there is one, and its leaves along the
+    edge that it shares with <block> are then collected.
+
+    Preconditions:
+    - <block> is <board> or one of its descendants.
+
+    >>> board = Block(COLOUR_LIST[0], 0, 1)
+    >>> board.smash()
+    True
+    >>> leaves = _bordering_leaves(board, board.children[1])
+    >>> leaves == [board.children[0], board.children[2]]
+    True
+    """
+    n = 2 ** (board.max_depth - board.level)
+    width = 2 ** (block.max_depth - block.level)
+    col, row = _unit_cell(board, block)
+    leaves = []
+    for dx, dy, edge in _SIDES:
+        i = col + dx * width
+        j = row + dy * width
+        if not (0 <= i < n and 0 <= j < n):
+            continue
+        side = board
+        half = n // 2
+        while side.level < block.level and side.children != []:
+            side = side.children[_QUADRANT[j >= half][i >= half]]
+            i %= half
+            j %= half
+            half //= 2
+        stack = [side]
+        while stack:
+            leaf = stack.pop()
+            children = leaf.children
+            if children == []:
+                leaves.append(leaf)
+            else:
+                stack.extend(children[k] for k in edge)
+    return leaves
+
+
+def _fits_bitboard(board: Block) -> bool:
+    """Return True iff <board> is shallow enough to be scored with a BitBoard.
+    """
+    return board.max_depth - board.level <= MAX_BITBOARD_DEPTH
+
+
+def score_goals(board: Block, goals: list[Goal]) -> list[int]:
+    """Return the score of each goal in <goals> on <board>, in order.
+
+    The scores of all PerimeterGoals are read from a single walk of the
+    perimeter of <board>. For BlobGoals, the connected blobs of every colour
+    are found once from the leaves of <board> if it is sparse, and otherwise
+    <board> is converted to a single BitBoard (or flattened once if it is too
+    deep), and their scores are read from it, using a single labelling of the
+    connected blobs of every colour for flattened boards.
+
+    >>> from block import generate_board
+    >>> board = generate_board(3)
+    >>> goals = [PerimeterGoal(COLOUR_LIST[0]), BlobGoal(COLOUR_LIST[1])]
+    >>> score_goals(board, goals) == [goal.score(board) for goal in goals]
+    True
+    """
+    perimeter_counts = None
+    sparse = None
+    bits = None
+    largest = None
+    scores = []
+    for goal in goals:
+        if isinstance(goal, BlobGoal) and sparse is None:
+            sparse = _is_sparse(board)
+        if isinstance(goal, PerimeterGoal):
+            if perimeter_counts is None:
+                perimeter_counts = _perimeter_counts(board)
+            scores.append(perimeter_counts.get(goal.colour, 0))
+        elif isinstance(goal, BlobGoal) and sparse:
+            if largest is None:
+                largest = _largest_leaf_blobs(board)
+            scores.append(largest.get(goal.colour, 0))
+        elif isinstance(goal, BlobGoal) and _fits_bitboard(board):
+            if bits is None:
+                bits = BitBoard(board)
+            scores.append(bits.largest_blob(goal.colour))
+        elif isinstance(goal, BlobGoal):
+            if largest is None:
+                largest = _largest_blobs(flatten(board))
+            scores.append(largest.get(goal.colour, 0))
+        else:
+            scores.append(goal.score(board))
+    return scores
+
+
 class Goal:
     """A player goal in the game of Blocky.
 
@@ -89,6 +417,16 @@ class Goal:
         """
         raise NotImplementedError
 
+    def move_bound(self, board: Block, block: Block, cache: dict) -> int:
+        """Return an upper bound on the score for this goal on <board> after
+        any action is applied to <block>, which is <board> or one of its
+        descendants.
+
+        <cache> holds the data about <board> that is shared by the bounds of
+        different blocks, and is filled in on the first call for <board>.
+        """
+        raise NotImplementedError
+
     def description(self) -> str:
         """Return a description of this goal.
         """
@@ -108,15 +446,52 @@ class PerimeterGoal(Goal):
         The score for a PerimeterGoal is defined to be the number of unit cells
         on the perimeter whose colour is this goal's target colour. Corner cells
         count twice toward the score.
+
+        The score is counted by _perimeter_counts, which only visits the
+        Blocks on the perimeter.
+
+        >>> board = Block(COLOUR_LIST[0], 0, 2)
+        >>> PerimeterGoal(COLOUR_LIST[0]).score(board)
+        16
         """
-        flat_board = flatten(board)
-        perimeter = (flat_board[0] + [col[0] for col in flat_board]
-                     + flat_board[-1] + [col[-1] for col in flat_board])
-        score = 0
-        for cell in perimeter:
-            if cell == self.colour:
-                score += 1
-        return score
+        return _perimeter_counts(board).get(self.colour, 0)
+
+    def move_bound(self, board: Block, block: Block, cache: dict) -> int:
+        """Return an upper bound on the score for this goal on <board> after
+        any action is applied to <block>, which is <board> or one of its
+        descendants.
+
+        An action only changes the unit cells of <block>, so at most the cells
+        of <block> on the perimeter that are not already of this goal's colour
+        can be added to the current score.
+
+        >>> board = Block(COLOUR_LIST[0], 0, 1)
+        >>> board.smash()
+        True
+        >>> goal = PerimeterGoal(COLOUR_LIST[0])
+        >>> goal.move_bound(board, board, {})
+        8
+        >>> child = board.children[0]
+        >>> goal.move_bound(board, child, {}) == goal.score(board) + 2 * (
+        ...     child.colour != COLOUR_LIST[0])
+        True
+        """
+        if 'score' not in cache:
+            cache['score'] = self.score(board)
+        view = GridView(board)
+        n = len(view)
+        width = 2 ** (block.max_depth - block.level)
+        col, row = _unit_cell(board, block)
+        edges = []
+        if col == 0:
+            edges.extend(view.column(0, row, row + width))
+        if col + width == n:
+            edges.extend(view.column(n - 1, row, row + width))
+        if row == 0:
+            edges.extend(view.row(0, col, col + width))
+        if row + width == n:
+            edges.extend(view.row(n - 1, col, col + width))
+        return cache['score'] + sum(cell != self.colour for cell in edges)
 
     def description(self) -> str:
         """Return a description of this goal.
@@ -137,7 +512,20 @@ class BlobGoal(Goal):
 
         The score for a BlobGoal is defined to be the total number of
         unit cells in the largest connected blob within this Block.
+
+        Sparse boards are scored from their leaves, as described by
+        _is_sparse.
+
+        >>> board = Block(COLOUR_LIST[0], 0, 10)
+        >>> _is_sparse(board)
+        True
+        >>> BlobGoal(COLOUR_LIST[0]).score(board)
+        1048576
         """
+        if _is_sparse(board):
+            return _largest_leaf_blobs(board).get(self.colour, 0)
+        if _fits_bitboard(board):
+            return BitBoard(board).largest_blob(self.colour)
         flat_board = flatten(board)
         visited = [[-1 for _ in col] for col in flat_board]
         blob_max = 0
@@ -187,6 +575,51 @@ class BlobGoal(Goal):
             visited[i][j] = 0
         return blob
 
+    def move_bound(self, board: Block, block: Block, cache: dict) -> int:
+        """Return an upper bound on the score for this goal on <board> after
+        any action is applied to <block>, which is <board> or one of its
+        descendants.
+
+        An action only changes the unit cells of <block>, so a blob that is
+        larger than the current largest blob afterwards must include cells of
+        <block>. Such a blob is at most every cell of <block>, plus every cell
+        of this goal's colour outside <block>, which is read from the colour
+        counts of <board> and <block>, and it is also at most every cell of
+        <block>, plus every blob of this goal's colour that is currently next
+        to <block>.
+
+        The blobs are the sets of leaves of _leaf_blobs, which are found once
+        for <board> and kept in <cache>, in time proportional to its number of
+        leaves, and the blobs next to <block> are those of the leaves from
+        _bordering_leaves.
+
+        >>> board = Block(COLOUR_LIST[0], 0, 2)
+        >>> board.smash()
+        True
+        >>> goal = BlobGoal(COLOUR_LIST[0])
+        >>> goal.move_bound(board, board, {})
+        16
+        >>> all(goal.move_bound(board, child, {}) >= goal.score(board)
+        ...     for child in board.children)
+        True
+        """
+        if 'parents' not in cache:
+            parents, cells, colours = _leaf_blobs(board)
+            cache['parents'] = parents
+            cache['cells'] = cells
+            cache['score'] = max((cells[key] for key, parent in parents.items()
+                                  if key == parent
+                                  and colours[key] == self.colour), default=0)
+        parents = cache['parents']
+        width = 2 ** (block.max_depth - block.level)
+        roots = {_find(parents, id(leaf))
+                 for leaf in _bordering_leaves(board, block)
+                 if leaf.colour == self.colour}
+        bound = width * width + min(
+            board.colour_count(self.colour) - block.colour_count(self.colour),
+            sum(cache['cells'][root] for root in roots))
+        return max(cache['score'], bound)
+
     def description(self) -> str:
         """Return a description of this goal.
         """
@@ -198,8 +631,8 @@ if __name__ == '__main__':
 
     python_ta.check_all(config={
         'allowed-import-modules': [
-            'doctest', 'python_ta', 'random', 'typing', 'block', 'settings',
-            'math', '__future__'
+            'doctest', 'python_ta', 'random', 'typing', 'block', 'bitboard',
+            'grid_view', 'settings', 'math', '__future__'
         ],
         'max-attributes': 15
     })
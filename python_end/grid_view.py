@@ -0,0 +1,237 @@
+""" Module Description:
+
+This file contains the GridView class, a read-only view of the unit cells of a
+Block that is indexed like the result of flatten in goal.py, without building
+it.
+
+A cell is found by descending from the Block to the leaf that includes it, in
+time proportional to the depth of the Block, and a row or column is read by
+visiting only the Blocks that it crosses. A view stores nothing but its
+Block, so it always shows the current cells of the Block.
+
+Reading every cell of a view is slower than flattening the Block once, so
+code that scans the whole board should still use flatten.
+"""
+from __future__ import annotations
+from itertools import chain, repeat
+from typing import Iterator
+
+from block import Block
+
+# The index of the child of a Block that includes the cells in its lower half
+# (or upper half), and in its right half (or left half), by those two bools.
+_QUADRANT = ((1, 0), (2, 3))
+# The children of a Block that a column (or a row) crosses, in order, when it
+# is in the right half (or the lower half) of the Block, by that bool.
+_COLUMN_CHILDREN = ((1, 2), (0, 3))
+_ROW_CHILDREN = ((1, 0), (2, 3))
+
+
+class GridView:
+    """A read-only view of the unit cells of a Block.
+
+    view[i][j] and view.cell(i, j) are the colour of the unit cell at column i
+    and row j, which is flatten(block)[i][j], and view[i] is a GridColumn of
+    the cells of column i. The view can also be iterated over, and measured
+    with len, like the result of flatten.
+
+    Instance Attributes:
+    - block: The Block whose unit cells are viewed.
+
+    >>> from block import generate_board
+    >>> from goal import flatten
+    >>> board = generate_board(3)
+    >>> view = GridView(board)
+    >>> len(view)
+    8
+    >>> [list(column) for column in view] == flatten(board)
+    True
+    >>> view[-1][2] == view.cell(7, 2) == flatten(board)[7][2]
+    True
+    """
+    block: Block
+
+    def __init__(self, block: Block) -> None:
+        """Initialize this GridView of the unit cells of <block>.
+        """
+        self.block = block
+
+    def __len__(self) -> int:
+        """Return the number of columns (and rows) of unit cells of the block
+        of this view.
+        """
+        return 1 << (self.block.max_depth - self.block.level)
+
+    def __getitem__(self, i: int) -> GridColumn:
+        """Return the column at index <i> of this view, where negative indices
+        count from the right, as for a list.
+        """
+        return GridColumn(self, _list_index(i, len(self)))
+
+    def __iter__(self) -> Iterator[GridColumn]:
+        """Return an iterator over the columns of this view, from left to
+        right.
+        """
+        return (GridColumn(self, i) for i in range(len(self)))
+
+    def cell(self, i: int, j: int) -> tuple[int, int, int]:
+        """Return the colour of the unit cell at column <i> and row <j>.
+
+        Preconditions:
+        - 0 <= i < len(self) and 0 <= j < len(self)
+        """
+        block = self.block
+        half = len(self) >> 1
+        children = block.children
+        while children != []:
+            right = i >= half
+            lower = j >= half
+            block = children[_QUADRANT[lower][right]]
+            i -= half * right
+            j -= half * lower
+            half >>= 1
+            children = block.children
+        return block.colour
+
+    def column(self, i: int, start: int = 0, stop: int | None = None) \
+            -> Iterator[tuple[int, int, int]]:
+        """Return an iterator over the colours of the unit cells of column <i>,
+        from row <start> down to row <stop>, not including <stop>, or to the
+        bottom if <stop> is None.
+
+        >>> from settings import COLOUR_LIST
+        >>> board = Block(COLOUR_LIST[0], 0, 2)
+        >>> list(GridView(board).column(1, 1, 3)) == [COLOUR_LIST[0]] * 2
+        True
+        """
+        return self._line(i, start, stop, _COLUMN_CHILDREN)
+
+    def row(self, j: int, start: int = 0, stop: int | None = None) \
+            -> Iterator[tuple[int, int, int]]:
+        """Return an iterator over the colours of the unit cells of row <j>,
+        from column <start> right to column <stop>, not including <stop>, or
+        to the right edge if <stop> is None.
+        """
+        return self._line(j, start, stop, _ROW_CHILDREN)
+
+    def edges(self) -> Iterator[tuple[int, int, int]]:
+        """Return an iterator over the colours of the unit cells on the edges
+        of this view, in the order of _perimeter in goal.py: the left column,
+        the top row, the right column and then the bottom row, so that every
+        corner cell appears twice.
+
+        >>> from block import generate_board
+        >>> from goal import flatten, _perimeter
+        >>> board = generate_board(4)
+        >>> list(GridView(board).edges()) == _perimeter(flatten(board))
+        True
+        """
+        last = len(self) - 1
+        return chain(self.column(0), self.row(0), self.column(last),
+                     self.row(last))
+
+    def _line(self, index: int, start: int, stop: int | None,
+              line_children: tuple[tuple[int, int], tuple[int, int]]) \
+            -> Iterator[tuple[int, int, int]]:
+        """Yield the colours of the unit cells from <start> to <stop> along
+        the column or row at <index>, whose children of a Block are given by
+        <line_children> as in _COLUMN_CHILDREN.
+
+        Each leaf that the line crosses yields its colour once for each of its
+        unit cells between <start> and <stop>.
+        """
+        if stop is None:
+            stop = len(self)
+        # Each Block that the line crosses, the offset along the line of its
+        # first cell, and the offset of the line across it.
+        stack = [(self.block, 0, index)]
+        while stack:
+            block, along, across = stack.pop()
+            width = 1 << (block.max_depth - block.level)
+            if along >= stop or along + width <= start:
+                continue
+            children = block.children
+            if children == []:
+                yield from repeat(block.colour,
+                                  min(stop, along + width) - max(start, along))
+            else:
+                half = width >> 1
+                second_half = across >= half
+                first, second = line_children[second_half]
+                across -= half * second_half
+                stack.append((children[second], along + half, across))
+                stack.append((children[first], along, across))
+
+
+class GridColumn:
+    """A read-only view of a column of unit cells of a Block.
+
+    column[j] is the colour of the unit cell at row j of the column, and
+    column[start:stop] is a list of the colours of its cells from start to
+    stop, as for a list.
+
+    Instance Attributes:
+    - view: The GridView that this column belongs to.
+    - index: The index of this column in view.
+    """
+    view: GridView
+    index: int
+
+    def __init__(self, view: GridView, index: int) -> None:
+        """Initialize this GridColumn of the column at <index> of <view>.
+        """
+        self.view = view
+        self.index = index
+
+    def __len__(self) -> int:
+        """Return the number of unit cells in this column.
+        """
+        return len(self.view)
+
+    def __getitem__(self, j: int | slice) \
+            -> tuple[int, int, int] | list[tuple[int, int, int]]:
+        """Return the colour of the cell at row <j> of this column, or a list
+        of the colours of the cells of the rows in <j> if it is a slice.
+        """
+        if isinstance(j, slice):
+            start, stop, step = j.indices(len(self))
+            if step != 1:
+                return list(self)[j]
+            return list(self.view.column(self.index, start, max(start, stop)))
+        return self.view.cell(self.index, _list_index(j, len(self)))
+
+    def __iter__(self) -> Iterator[tuple[int, int, int]]:
+        """Return an iterator over the colours of the cells of this column,
+        from top to bottom.
+        """
+        return self.view.column(self.index)
+
+    def __eq__(self, other: GridColumn | list) -> bool:
+        """Return True iff this column has the same colours as <other>, in the
+        same order.
+        """
+        return list(self) == list(other)
+
+
+def _list_index(i: int, n: int) -> int:
+    """Return the index in a list of length <n> that <i> refers to, counting
+    from the end if <i> is negative.
+
+    Raise an IndexError if <i> is out of range, as for a list.
+    """
+    if i < 0:
+        i += n
+    if not 0 <= i < n:
+        raise IndexError('grid index out of range')
+    return i
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'itertools',
+            'block', 'settings', 'goal'
+        ]
+    })
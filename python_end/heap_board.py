@@ -0,0 +1,528 @@
+""" Module Description:
+
+This file contains the HeapBoard class, an alternative board backend that
+stores a whole board in one flat buffer, and the HeapBlock class, a thin view
+of one node of a HeapBoard that can be used wherever a Block is read or acted
+on.
+
+The buffer of a board of max_depth d holds one byte for every node of a
+complete quadtree of depth d, in level order: the node with heap index i has
+its children at heap indices 4i + 1 to 4i + 4, in the same order as
+Block.children. The descendants of node i at r levels below it are the 4^r
+consecutive heap indices starting at 4^r * i + (4^r - 1) / 3, so rotating or
+swapping a subtree is a fixed permutation of each of those ranges.
+"""
+from __future__ import annotations
+import math
+import random
+
+from block import Block
+from settings import COLOUR_LIST
+
+# The byte stored for a node that has children. A leaf stores the index of its
+# colour in COLOUR_LIST, and a heap index that is not a node of the board
+# stores ABSENT.
+SPLIT = len(COLOUR_LIST)
+ABSENT = 255
+
+# How the index of a child changes under a clockwise rotation, by the number of
+# clockwise quarter turns, and under a swap, by direction.
+ROTATION_MAPS = {1: [1, 2, 3, 0], 3: [3, 0, 1, 2]}
+SWAP_MAPS = {0: [1, 0, 3, 2], 1: [3, 2, 1, 0]}
+
+# The permutations returned by subtree_permutation, by their arguments.
+_PERMUTATIONS = {}
+
+
+def num_nodes(max_depth: int) -> int:
+    """Return the number of nodes in a complete quadtree of depth
+    <max_depth>.
+
+    >>> num_nodes(0), num_nodes(1), num_nodes(2)
+    (1, 5, 21)
+    """
+    return (4 ** (max_depth + 1) - 1) // 3
+
+
+def first_descendant(node: int, depth: int) -> int:
+    """Return the heap index of the first descendant of <node> that is <depth>
+    levels below it.
+
+    >>> first_descendant(0, 1), first_descendant(2, 1), first_descendant(2, 2)
+    (1, 9, 37)
+    """
+    return node * 4 ** depth + (4 ** depth - 1) // 3
+
+
+def node_level(node: int) -> int:
+    """Return the level of the node with heap index <node>.
+
+    >>> node_level(0), node_level(4), node_level(5)
+    (0, 1, 2)
+    """
+    level = 0
+    while node >= num_nodes(level):
+        level += 1
+    return level
+
+
+def subtree_permutation(child_map: list[int], depth: int,
+                        every_level: bool) -> list[int]:
+    """Return the permutation P of the 4^<depth> descendants of a node at
+    <depth> levels below it, so that the new descendant at offset j is the old
+    descendant at offset P[j].
+
+    The new child with index k of a node is its old child with index
+    <child_map>[k]. This applies to the children of the node itself, and also
+    to the children of its descendants iff <every_level> is True, as it is for
+    rotations.
+
+    >>> subtree_permutation([1, 2, 3, 0], 1, True)
+    [1, 2, 3, 0]
+    >>> subtree_permutation([1, 0, 3, 2], 2, False)[:8]
+    [4, 5, 6, 7, 0, 1, 2, 3]
+    """
+    permutation = []
+    for offset in range(4 ** depth):
+        source = 0
+        for k in range(depth):
+            weight = 4 ** (depth - 1 - k)
+            digit = (offset // weight) % 4
+            if k == 0 or every_level:
+                digit = child_map[digit]
+            source += digit * weight
+        permutation.append(source)
+    return permutation
+
+
+def _permutation(child_map: list[int], depth: int,
+                 every_level: bool) -> list[int]:
+    """Return subtree_permutation(<child_map>, <depth>, <every_level>),
+    computing it only once.
+    """
+    key = (tuple(child_map), depth, every_level)
+    if key not in _PERMUTATIONS:
+        _PERMUTATIONS[key] = subtree_permutation(child_map, depth,
+                                                 every_level)
+    return _PERMUTATIONS[key]
+
+
+class HeapBoard:
+    """A board of Blocky, stored as one byte per node of a complete quadtree.
+
+    Instance Attributes:
+    - max_depth: The deepest level allowed on the board.
+    - cells: The byte of every heap index, as described by SPLIT and ABSENT.
+
+    Representation Invariants:
+    - len(cells) == num_nodes(max_depth)
+    - cells[0] != ABSENT
+    - The children of a node are ABSENT iff the node is not SPLIT.
+    - No node at max_depth is SPLIT.
+    """
+    max_depth: int
+    cells: bytearray
+
+    def __init__(self, colour: tuple[int, int, int], max_depth: int) -> None:
+        """Initialize this HeapBoard with <max_depth>, as a single leaf of
+        <colour>.
+
+        >>> board = HeapBoard(COLOUR_LIST[1], 1)
+        >>> list(board.cells)
+        [1, 255, 255, 255, 255]
+        """
+        self.max_depth = max_depth
+        self.cells = bytearray([ABSENT]) * num_nodes(max_depth)
+        self.cells[0] = COLOUR_LIST.index(colour)
+
+    def __eq__(self, other: HeapBoard) -> bool:
+        """Return True iff this HeapBoard has the same max_depth and blocks as
+        <other>.
+        """
+        return self.max_depth == other.max_depth and self.cells == other.cells
+
+    def copy(self) -> HeapBoard:
+        """Return a copy of this HeapBoard, which copies its buffer once.
+        """
+        copy = HeapBoard.__new__(HeapBoard)
+        copy.max_depth = self.max_depth
+        copy.cells = bytearray(self.cells)
+        return copy
+
+    def view(self, node: int = 0) -> HeapBlock:
+        """Return a HeapBlock viewing the node at heap index <node>.
+        """
+        return HeapBlock(self, node)
+
+    def cell(self, node: int) -> tuple[int, int]:
+        """Return the column and row of the upper left unit cell of the node
+        at heap index <node>.
+
+        >>> board = HeapBoard(COLOUR_LIST[0], 2)
+        >>> board.cell(1), board.cell(20)
+        ((2, 0), (3, 3))
+        """
+        col, row = 0, 0
+        width = 1 << (self.max_depth - node_level(node))
+        while node > 0:
+            step = (node - 1) % 4
+            col += width if step in (0, 3) else 0
+            row += width if step in (2, 3) else 0
+            node = (node - 1) // 4
+            width <<= 1
+        return col, row
+
+    def nodes(self) -> list[int]:
+        """Return the heap indices of the nodes of this board, in preorder.
+
+        >>> board = HeapBoard(COLOUR_LIST[0], 1)
+        >>> board.nodes()
+        [0]
+        >>> board.cells[0] = SPLIT
+        >>> board.cells[1:5] = bytes(4)
+        >>> board.nodes()
+        [0, 1, 2, 3, 4]
+        """
+        nodes = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            if self.cells[node] == SPLIT:
+                stack.extend(range(4 * node + 4, 4 * node, -1))
+        return nodes
+
+    def _iter_nodes(self, node: int) -> list[tuple[int, int, int, int]]:
+        """Return a list of tuples for the node at heap index <node> and each
+        of its descendants, in preorder, containing its heap index, its level,
+        and the column and row of its upper left unit cell relative to
+        <node>.
+        """
+        nodes = []
+        stack = [(node, node_level(node), 0, 0)]
+        while stack:
+            node, level, col, row = stack.pop()
+            nodes.append((node, level, col, row))
+            if self.cells[node] == SPLIT:
+                half = 2 ** (self.max_depth - level - 1)
+                first = 4 * node + 1
+                stack.append((first + 3, level + 1, col + half, row + half))
+                stack.append((first + 2, level + 1, col, row + half))
+                stack.append((first + 1, level + 1, col, row))
+                stack.append((first, level + 1, col + half, row))
+        return nodes
+
+    def squares(self) -> list[tuple[tuple[int, int, int], tuple[int, int],
+                                    int]]:
+        """Return the squares that must be drawn to render this board, like
+        _block_to_squares.
+        """
+        return [(COLOUR_LIST[self.cells[node]], (col, row),
+                 1 << (self.max_depth - level))
+                for node, level, col, row in self._iter_nodes(0)
+                if self.cells[node] != SPLIT]
+
+    def flatten(self, node: int = 0) -> list[list[tuple[int, int, int]]]:
+        """Return the unit cells of the node at heap index <node>, like
+        flatten in goal.py.
+
+        >>> board = generate_heap_board(2)
+        >>> from goal import flatten
+        >>> board.flatten() == flatten(board.to_block())
+        True
+        """
+        n = 2 ** (self.max_depth - node_level(node))
+        columns = [[None] * n for _ in range(n)]
+        for leaf, level, col, row in self._iter_nodes(node):
+            if self.cells[leaf] != SPLIT:
+                colour = COLOUR_LIST[self.cells[leaf]]
+                width = 2 ** (self.max_depth - level)
+                for i in range(col, col + width):
+                    columns[i][row:row + width] = [colour] * width
+        return columns
+
+    def smash(self, node: int) -> bool:
+        """Smash the node at heap index <node> with the same random procedure
+        as Block.smash.
+
+        Return True iff the smash was performed.
+        """
+        level = node_level(node)
+        if self.cells[node] == SPLIT or level == self.max_depth:
+            return False
+        self.cells[node] = SPLIT
+        for child in range(4 * node + 1, 4 * node + 5):
+            if (random.random() < math.exp(-0.25 * level)
+                    and level + 1 < self.max_depth):
+                self.cells[child] = 0
+                self.smash(child)
+            else:
+                self.cells[child] = random.randint(0, 3)
+        return True
+
+    def _permute(self, node: int, child_map: list[int],
+                 every_level: bool) -> bool:
+        """Reorder the descendants of the node at heap index <node> as
+        described by subtree_permutation.
+
+        Return True iff the node has children.
+        """
+        if self.cells[node] != SPLIT:
+            return False
+        for depth in range(1, self.max_depth - node_level(node) + 1):
+            start = first_descendant(node, depth)
+            old = self.cells[start:start + 4 ** depth]
+            self.cells[start:start + 4 ** depth] = bytes(
+                map(old.__getitem__,
+                    _permutation(child_map, depth, every_level)))
+        return True
+
+    def rotate(self, node: int, direction: int) -> bool:
+        """Rotate the node at heap index <node> like Block.rotate.
+        """
+        return self._permute(node, ROTATION_MAPS[direction], True)
+
+    def swap(self, node: int, direction: int) -> bool:
+        """Swap the children of the node at heap index <node> like
+        Block.swap.
+        """
+        return self._permute(node, SWAP_MAPS[direction], False)
+
+    def majority(self, node: int) -> int | None:
+        """Return the index in COLOUR_LIST of the majority colour of the
+        children of the node at heap index <node>, or None if it has no
+        children, any of its children is not a leaf, or there is no majority
+        colour.
+        """
+        if self.cells[node] != SPLIT:
+            return None
+        children = self.cells[4 * node + 1:4 * node + 5]
+        if SPLIT in children:
+            return None
+        counts = [children.count(colour) for colour in range(SPLIT)]
+        most = max(counts)
+        if counts.count(most) > 1:
+            return None
+        return counts.index(most)
+
+    def combine(self, node: int) -> bool:
+        """Combine the node at heap index <node> like Block.combine.
+        """
+        colour = self.majority(node)
+        if colour is None:
+            return False
+        self.cells[node] = colour
+        self.cells[4 * node + 1:4 * node + 5] = bytes([ABSENT]) * 4
+        return True
+
+    def paintable(self, node: int, colour: tuple[int, int, int]) -> bool:
+        """Return True iff the node at heap index <node> can be painted with
+        <colour>.
+        """
+        return (self.cells[node] != SPLIT
+                and node >= num_nodes(self.max_depth - 1)
+                and COLOUR_LIST[self.cells[node]] != colour)
+
+    def paint(self, node: int, colour: tuple[int, int, int]) -> bool:
+        """Paint the node at heap index <node> like Block.paint.
+        """
+        if not self.paintable(node, colour):
+            return False
+        self.cells[node] = COLOUR_LIST.index(colour)
+        return True
+
+    def to_block(self) -> Block:
+        """Return this board as a tree of Blocks.
+        """
+        root = Block(None, 0, self.max_depth)
+        stack = [(root, 0)]
+        while stack:
+            block, node = stack.pop()
+            if self.cells[node] == SPLIT:
+                block.children = [Block(None, block.level + 1, self.max_depth)
+                                  for _ in range(4)]
+                for k in range(4):
+                    stack.append((block.children[k], 4 * node + 1 + k))
+            else:
+                block.colour = COLOUR_LIST[self.cells[node]]
+        return root
+
+
+def heap_board_from_block(board: Block) -> HeapBoard:
+    """Return a HeapBoard with the same blocks as <board>.
+
+    Preconditions:
+    - board.level == 0
+    """
+    heap = HeapBoard(COLOUR_LIST[0], board.max_depth)
+    stack = [(board, 0)]
+    while stack:
+        block, node = stack.pop()
+        if block.children == []:
+            heap.cells[node] = COLOUR_LIST.index(block.colour)
+        else:
+            heap.cells[node] = SPLIT
+            for k in range(4):
+                stack.append((block.children[k], 4 * node + 1 + k))
+    return heap
+
+
+def heap_board_from_cells(max_depth: int,
+                          cells: bytes | memoryview) -> HeapBoard:
+    """Return a HeapBoard with <max_depth>, whose buffer is a copy of
+    <cells>.
+
+    Preconditions:
+    - len(cells) == num_nodes(max_depth)
+    """
+    board = HeapBoard(COLOUR_LIST[0], max_depth)
+    board.cells[:] = cells
+    return board
+
+
+def generate_heap_board(max_depth: int) -> HeapBoard:
+    """Return a new HeapBoard with a depth of <max_depth>, generated the same
+    way as generate_board.
+
+    >>> from block import generate_board
+    >>> random.seed(148)
+    >>> board = generate_board(4)
+    >>> random.seed(148)
+    >>> generate_heap_board(4).view() == board
+    True
+    """
+    board = HeapBoard(random.choice(COLOUR_LIST), max_depth)
+    board.smash(0)
+    return board
+
+
+class HeapBlock:
+    """A view of one node of a HeapBoard, with the same interface as a Block.
+
+    Instance Attributes:
+    - board: The HeapBoard that contains this node.
+    - node: The heap index of this node.
+    """
+    board: HeapBoard
+    node: int
+
+    def __init__(self, board: HeapBoard, node: int) -> None:
+        """Initialize this HeapBlock as a view of the node at heap index
+        <node> of <board>.
+        """
+        self.board = board
+        self.node = node
+
+    @property
+    def cell(self) -> tuple[int, int]:
+        """The column and row of the upper left unit cell of this block.
+        """
+        return self.board.cell(self.node)
+
+    @property
+    def level(self) -> int:
+        """The level of this block.
+        """
+        return node_level(self.node)
+
+    @property
+    def max_depth(self) -> int:
+        """The deepest level allowed on the board of this block.
+        """
+        return self.board.max_depth
+
+    @property
+    def colour(self) -> tuple[int, int, int] | None:
+        """The colour of this block, or None if it has children.
+        """
+        cell = self.board.cells[self.node]
+        return None if cell == SPLIT else COLOUR_LIST[cell]
+
+    @property
+    def children(self) -> list[HeapBlock]:
+        """Views of the children of this block, in the order of
+        Block.children.
+        """
+        if self.board.cells[self.node] != SPLIT:
+            return []
+        return [HeapBlock(self.board, child)
+                for child in range(4 * self.node + 1, 4 * self.node + 5)]
+
+    def __eq__(self, other: HeapBlock | Block) -> bool:
+        """Return True iff this block and all its descendants are equivalent
+        to <other> and all its descendants, like Block.__eq__.
+
+        Views of nodes at the same level are compared one range of
+        descendants at a time.
+        """
+        if not isinstance(other, HeapBlock):
+            return Block.__eq__(self, other)
+        if (self.level != other.level or self.max_depth != other.max_depth
+                or self.cell != other.cell):
+            return False
+        for depth in range(self.max_depth - self.level + 1):
+            mine = first_descendant(self.node, depth)
+            theirs = first_descendant(other.node, depth)
+            if (self.board.cells[mine:mine + 4 ** depth]
+                    != other.board.cells[theirs:theirs + 4 ** depth]):
+                return False
+        return True
+
+    def smashable(self) -> bool:
+        """Return True iff this block can be smashed.
+        """
+        return (self.board.cells[self.node] != SPLIT
+                and self.level != self.max_depth)
+
+    def smash(self) -> bool:
+        """Smash this block like Block.smash.
+        """
+        return self.board.smash(self.node)
+
+    def swap(self, direction: int) -> bool:
+        """Swap the children of this block like Block.swap.
+        """
+        return self.board.swap(self.node, direction)
+
+    def rotate(self, direction: int) -> bool:
+        """Rotate this block like Block.rotate.
+        """
+        return self.board.rotate(self.node, direction)
+
+    def paintable(self, colour: tuple[int, int, int]) -> bool:
+        """Return True iff this block can be painted with <colour>.
+        """
+        return self.board.paintable(self.node, colour)
+
+    def paint(self, colour: tuple[int, int, int]) -> bool:
+        """Paint this block like Block.paint.
+        """
+        return self.board.paint(self.node, colour)
+
+    def combinable(self) -> bool:
+        """Return True iff this block can be combined.
+        """
+        return self.board.majority(self.node) is not None
+
+    def combine(self) -> bool:
+        """Combine this block like Block.combine.
+        """
+        return self.board.combine(self.node)
+
+    def create_copy(self) -> HeapBlock:
+        """Return a view of the same node of a copy of the board of this
+        block, which copies the board's buffer once.
+        """
+        return HeapBlock(self.board.copy(), self.node)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'math', 'random',
+            'block', 'settings'
+        ],
+        'max-attributes': 10
+    })
@@ -0,0 +1,188 @@
+""" Module Description:
+
+This file contains the MoveHistory class, which records the moves made on a
+board so that they can be undone and redone.
+
+A move is recorded as the change it made, not as a copy of the board: nothing
+for rotations, swaps and passes, which are undone by the opposite rotation,
+the same swap or another pass, the previous and new colour of a painted
+block, and the previous colour of a smashed block or the new colour of a
+combined block, along with the children that the smash created or the combine
+removed. Undoing and redoing a move reuses those children, so the memory of a
+history is proportional to the number of blocks that its moves changed.
+"""
+from __future__ import annotations
+
+from actions import Action, ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, COMBINE, PAINT, PASS
+from block import Block
+
+# The action that undoes each action that needs no record of what it changed.
+_INVERSE_ACTION = {
+    ROTATE_CLOCKWISE: ROTATE_COUNTER_CLOCKWISE,
+    ROTATE_COUNTER_CLOCKWISE: ROTATE_CLOCKWISE,
+    SWAP_HORIZONTAL: SWAP_HORIZONTAL,
+    SWAP_VERTICAL: SWAP_VERTICAL,
+    PASS: PASS
+}
+
+
+def _contents(block: Block) -> tuple[int, int, int] | list[Block]:
+    """Return the colour of <block> if it is a leaf, and otherwise a list of
+    its children.
+    """
+    if block.children == []:
+        return block.colour
+    return list(block.children)
+
+
+def _restore(block: Block, contents: tuple[int, int, int] | list[Block]) \
+        -> None:
+    """Give <block> back the <contents> returned by _contents.
+    """
+    if isinstance(contents, list):
+        block.restore_children(contents)
+    elif block.children != []:
+        block.restore_leaf(contents)
+    else:
+        block.paint(contents)
+
+
+class MoveRecord:
+    """A move that was made on a board, and the change it made.
+
+    Instance Attributes:
+    - action: The action of the move.
+    - block: The block that the action was applied to.
+    - player_index: The index of the player who made the move.
+    - turn: The turn of the game when the move was made.
+    - score: The score of the player before the move, including penalties.
+
+    Private Instance Attributes:
+    - _before: The contents of block before the move, as returned by
+               _contents, or None if the action is in _INVERSE_ACTION.
+    - _after: The contents of block after the move, in the same way.
+    """
+    action: Action
+    block: Block
+    player_index: int
+    turn: int
+    score: int
+    _before: tuple[int, int, int] | list[Block] | None
+    _after: tuple[int, int, int] | list[Block] | None
+
+    def __init__(self, action: Action, block: Block, player_index: int,
+                 turn: int, score: int) -> None:
+        """Initialize this MoveRecord for <action> about to be applied to
+        <block> by the player at <player_index>, with <score>, on <turn>.
+        """
+        self.action = action
+        self.block = block
+        self.player_index = player_index
+        self.turn = turn
+        self.score = score
+        self._before = None
+        self._after = None
+        if action in (SMASH, COMBINE, PAINT):
+            self._before = _contents(block)
+
+    def applied(self) -> None:
+        """Record the change made by the action of this move, after it was
+        applied.
+        """
+        if self._before is not None:
+            self._after = _contents(self.block)
+
+    def undo(self) -> None:
+        """Undo the change made by this move.
+        """
+        if self._before is None:
+            _INVERSE_ACTION[self.action].apply(self.block, {})
+        else:
+            _restore(self.block, self._before)
+
+    def redo(self) -> None:
+        """Make the change of this move again, after it was undone.
+        """
+        if self._after is None:
+            self.action.apply(self.block, {})
+        else:
+            _restore(self.block, self._after)
+
+
+class MoveHistory:
+    """The moves made on a board, in order, and the moves that were undone
+    since the last new move.
+
+    Private Instance Attributes:
+    - _done: The moves that can be undone, the most recent last.
+    - _undone: The moves that can be redone, the most recently undone last.
+    """
+    _done: list[MoveRecord]
+    _undone: list[MoveRecord]
+
+    def __init__(self) -> None:
+        """Initialize this MoveHistory with no moves.
+        """
+        self._done = []
+        self._undone = []
+
+    def do(self, record: MoveRecord, colour: tuple[int, int, int]) -> bool:
+        """Apply the action of the move in <record>, for a player who paints
+        with <colour>, and return True iff it was applied.
+
+        If it was applied, record it as the most recent move and forget the
+        moves that were undone.
+
+        >>> from settings import COLOUR_LIST
+        >>> board = Block(COLOUR_LIST[0], 0, 1)
+        >>> history = MoveHistory()
+        >>> history.do(MoveRecord(SMASH, board, 0, 0, 0), COLOUR_LIST[0])
+        True
+        >>> children = board.children
+        >>> history.undo().block == Block(COLOUR_LIST[0], 0, 1)
+        True
+        >>> history.redo().block.children == children
+        True
+        >>> history.redo() is None
+        True
+        """
+        if not record.action.apply(record.block, {'colour': colour}):
+            return False
+        record.applied()
+        self._done.append(record)
+        self._undone = []
+        return True
+
+    def undo(self) -> MoveRecord | None:
+        """Undo the most recent move that has not been undone, and return it,
+        or return None if there is no such move.
+        """
+        if self._done == []:
+            return None
+        record = self._done.pop()
+        record.undo()
+        self._undone.append(record)
+        return record
+
+    def redo(self) -> MoveRecord | None:
+        """Redo the most recently undone move, and return it, or return None if
+        no move was undone since the last new move.
+        """
+        if self._undone == []:
+            return None
+        record = self._undone.pop()
+        record.redo()
+        self._done.append(record)
+        return record
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'actions',
+            'block', 'settings'
+        ]
+    })
@@ -0,0 +1,113 @@
+""" Module Description:
+
+This file contains a load generator for the Blocky game server. It plays many
+concurrent games, each with one human player controlled by this client and
+one SmartPlayer, and reports the number of games completed per second and the
+99th percentile latencies of the client's move requests and of its wait
+requests, which last until the SmartPlayer has moved.
+
+Run this file to measure a server started in the same process for 1, 100 and
+1000 concurrent games.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from server import GameServer, ACTIONS
+
+
+async def _request(reader: asyncio.StreamReader,
+                   writer: asyncio.StreamWriter, request: dict) -> dict:
+    """Send <request> to the server and return its response.
+    """
+    writer.write(json.dumps(request).encode() + b'\n')
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def play_game(path: str, max_depth: int, difficulty: int,
+                    max_turns: int, move_latencies: list[float],
+                    wait_latencies: list[float]) -> None:
+    """Play one game on the server listening on the Unix socket at <path>,
+    making random moves until the game is over.
+
+    The latency of every move request and every wait request, in seconds, is
+    appended to <move_latencies> and <wait_latencies> respectively.
+    """
+    reader, writer = await asyncio.open_unix_connection(path, limit=2 ** 20)
+    response = await _request(reader, writer, {
+        'op': 'new', 'max_depth': max_depth, 'num_human': 1,
+        'num_random': 0, 'smart_players': [difficulty],
+        'max_turns': max_turns})
+    game_id = response['game']
+    names = list(ACTIONS)
+    while True:
+        start = time.perf_counter()
+        status = await _request(reader, writer,
+                                {'op': 'wait', 'game': game_id})
+        wait_latencies.append(time.perf_counter() - start)
+        if status['over']:
+            break
+        moved = False
+        while not moved:
+            request = {'op': 'move', 'game': game_id,
+                       'action': random.choice(names),
+                       'x': random.randrange(2 ** max_depth),
+                       'y': random.randrange(2 ** max_depth),
+                       'level': random.randint(0, max_depth)}
+            start = time.perf_counter()
+            moved = (await _request(reader, writer, request))['ok']
+            move_latencies.append(time.perf_counter() - start)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run_load(num_games: int, max_depth: int = 3, difficulty: int = 5,
+                   max_turns: int = 5) -> tuple[float, float, float]:
+    """Start a GameServer on a temporary Unix socket and play <num_games>
+    concurrent games on it.
+
+    Return the number of games completed per second, and the 99th percentile
+    latencies of move requests and of wait requests in milliseconds.
+    """
+    server = GameServer()
+    path = os.path.join(tempfile.mkdtemp(), 'blocky.sock')
+    listener = await server.serve_unix(path)
+    move_latencies = []
+    wait_latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[play_game(path, max_depth, difficulty, max_turns,
+                                     move_latencies, wait_latencies)
+                           for _ in range(num_games)])
+    elapsed = time.perf_counter() - start
+    listener.close()
+    await listener.wait_closed()
+    os.remove(path)
+    return (num_games / elapsed, _p99_ms(move_latencies),
+            _p99_ms(wait_latencies))
+
+
+def _p99_ms(latencies: list[float]) -> float:
+    """Return the 99th percentile of <latencies>, which are in seconds, in
+    milliseconds.
+
+    >>> _p99_ms([0.001 * i for i in range(1, 101)])
+    100.0
+    """
+    latencies = sorted(latencies)
+    return 1000 * latencies[min(len(latencies) - 1,
+                                int(0.99 * len(latencies)))]
+
+
+if __name__ == '__main__':
+    random.seed(148)
+    print(f'{"games":>6} {"games/sec":>10} {"p99 move ms":>12} '
+          f'{"p99 wait ms":>12}')
+    for games in [1, 100, 1000]:
+        rate, move_latency, wait_latency = asyncio.run(run_load(games))
+        print(f'{games:>6} {rate:>10.1f} {move_latency:>12.2f} '
+              f'{wait_latency:>12.2f}')
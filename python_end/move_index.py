@@ -0,0 +1,253 @@
+""" Module Description:
+
+This file contains the MoveIndex class, which keeps track of the blocks of a
+board that each action can be applied to, so that valid moves can be drawn
+without trying actions on copies of the board.
+"""
+from __future__ import annotations
+import random
+
+from block import Block
+from actions import Action, ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PAINT, COMBINE
+from settings import COLOUR_LIST
+
+# The actions that can be applied to any block that has children.
+PARENT_ACTIONS = [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, SWAP_HORIZONTAL,
+                  SWAP_VERTICAL]
+
+
+def get_move_index(board: Block) -> MoveIndex:
+    """Return the MoveIndex of <board>, creating it if <board> is not indexed
+    yet.
+
+    Precondition:
+    - <board> is the root of its tree.
+    """
+    if board._index is None:
+        return MoveIndex(board)
+    return board._index
+
+
+class _BlockSet:
+    """A set of Blocks, compared by identity, that supports adding, removing
+    and choosing a uniformly random Block in constant time.
+
+    Private Instance Attributes:
+    - _blocks: The Blocks in this set, in no particular order.
+    - _positions: A dictionary mapping the id of each Block in this set to its
+                  index in _blocks.
+    """
+    _blocks: list[Block]
+    _positions: dict[int, int]
+
+    def __init__(self) -> None:
+        """Initialize this set with no Blocks.
+        """
+        self._blocks = []
+        self._positions = {}
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def __contains__(self, block: Block) -> bool:
+        return id(block) in self._positions
+
+    def __getitem__(self, i: int) -> Block:
+        return self._blocks[i]
+
+    def add(self, block: Block) -> None:
+        """Add <block> to this set, if it is not already in it.
+        """
+        if id(block) not in self._positions:
+            self._positions[id(block)] = len(self._blocks)
+            self._blocks.append(block)
+
+    def discard(self, block: Block) -> None:
+        """Remove <block> from this set, if it is in it.
+        """
+        position = self._positions.pop(id(block), None)
+        if position is not None:
+            last = self._blocks.pop()
+            if last is not block:
+                self._blocks[position] = last
+                self._positions[id(last)] = position
+
+
+class MoveIndex:
+    """The blocks of a board that each action can be applied to.
+
+    A MoveIndex registers itself with every Block of its board, and those
+    Blocks notify it whenever they are smashed, combined or painted. Rotations
+    and swaps never change which actions can be applied to which blocks.
+
+    Instance Attributes:
+    - smashable: The leaves whose level is less than max_depth.
+    - parents: The blocks that have children, which can be rotated and swapped.
+    - combinable: The blocks whose children are all leaves and have a majority
+                  colour.
+    - paintable: A dictionary mapping each colour to the leaves at max_depth
+                 of that colour.
+    """
+    smashable: _BlockSet
+    parents: _BlockSet
+    combinable: _BlockSet
+    paintable: dict[tuple[int, int, int], _BlockSet]
+
+    def __init__(self, board: Block) -> None:
+        """Initialize this MoveIndex with every Block of <board>, and register
+        it with them.
+
+        >>> board = Block(COLOUR_LIST[0], 0, 1)
+        >>> index = MoveIndex(board)
+        >>> len(index.smashable)
+        1
+        >>> board.smash()
+        True
+        >>> len(index.smashable), len(index.parents)
+        (0, 1)
+        >>> sum(len(leaves) for leaves in index.paintable.values())
+        4
+        """
+        self.smashable = _BlockSet()
+        self.parents = _BlockSet()
+        self.combinable = _BlockSet()
+        self.paintable = {colour: _BlockSet() for colour in COLOUR_LIST}
+        self._add_subtree(board)
+
+    def _add_subtree(self, block: Block) -> None:
+        """Register this MoveIndex with <block> and all its descendants, and
+        add them to the sets they belong in.
+        """
+        block._index = self
+        self._refresh(block)
+        for child in block.children:
+            self._add_subtree(child)
+
+    def _remove(self, block: Block) -> None:
+        """Remove <block> from every set of this MoveIndex.
+        """
+        self.smashable.discard(block)
+        self.parents.discard(block)
+        self.combinable.discard(block)
+        for leaves in self.paintable.values():
+            leaves.discard(block)
+
+    def _refresh(self, block: Block) -> None:
+        """Update the sets of this MoveIndex that <block> belongs in.
+        """
+        self._remove(block)
+        if SMASH.can_apply(block, {}):
+            self.smashable.add(block)
+        elif block.children == []:
+            self.paintable.setdefault(block.colour, _BlockSet()).add(block)
+        if ROTATE_CLOCKWISE.can_apply(block, {}):
+            self.parents.add(block)
+        if COMBINE.can_apply(block, {}):
+            self.combinable.add(block)
+
+    def _refresh_parent(self, block: Block) -> None:
+        """Update the sets that the parent of <block> belongs in, if <block>
+        has a parent.
+        """
+        if block._parent is not None:
+            self._refresh(block._parent)
+
+    def smashed(self, block: Block) -> None:
+        """Update this MoveIndex after <block> was smashed.
+        """
+        self._add_subtree(block)
+        self._refresh_parent(block)
+
+    def _remove_subtree(self, block: Block) -> None:
+        """Remove <block> and all its descendants from every set of this
+        MoveIndex, and unregister this MoveIndex with them.
+        """
+        self._remove(block)
+        block._index = None
+        for child in block.children:
+            self._remove_subtree(child)
+
+    def combined(self, block: Block, old_children: list[Block]) -> None:
+        """Update this MoveIndex after <block> was combined, or otherwise
+        turned into a leaf, removing its <old_children> and their
+        descendants.
+        """
+        for child in old_children:
+            self._remove_subtree(child)
+        self._refresh(block)
+        self._refresh_parent(block)
+
+    def painted(self, block: Block) -> None:
+        """Update this MoveIndex after <block> was painted.
+        """
+        self._refresh(block)
+        self._refresh_parent(block)
+
+    def _paint_targets(self, colour: tuple[int, int, int]) -> list[_BlockSet]:
+        """Return the sets of the leaves that can be painted with <colour>.
+        """
+        return [leaves for leaf_colour, leaves in self.paintable.items()
+                if leaf_colour != colour]
+
+    def num_moves(self, colour: tuple[int, int, int]) -> int:
+        """Return the number of valid moves, other than PASS, on the board of
+        this MoveIndex for a player who paints with <colour>.
+        """
+        return (len(self.smashable) + len(self.combinable)
+                + len(PARENT_ACTIONS) * len(self.parents)
+                + sum(len(leaves) for leaves in self._paint_targets(colour)))
+
+    def moves(self, colour: tuple[int, int, int]) -> list[tuple[Action, Block]]:
+        """Return every valid move, other than PASS, on the board of this
+        MoveIndex for a player who paints with <colour>.
+        """
+        moves = [(SMASH, self.smashable[i])
+                 for i in range(len(self.smashable))]
+        moves.extend((COMBINE, self.combinable[i])
+                     for i in range(len(self.combinable)))
+        for action in PARENT_ACTIONS:
+            moves.extend((action, self.parents[i])
+                         for i in range(len(self.parents)))
+        for leaves in self._paint_targets(colour):
+            moves.extend((PAINT, leaves[i]) for i in range(len(leaves)))
+        return moves
+
+    def random_move(self, colour: tuple[int, int, int]) \
+            -> tuple[Action, Block] | None:
+        """Return a uniformly random valid move, other than PASS, on the board
+        of this MoveIndex for a player who paints with <colour>.
+
+        Return None if there is no valid move.
+        """
+        total = self.num_moves(colour)
+        if total == 0:
+            return None
+        i = random.randrange(total)
+        if i < len(self.smashable):
+            return SMASH, self.smashable[i]
+        i -= len(self.smashable)
+        if i < len(self.combinable):
+            return COMBINE, self.combinable[i]
+        i -= len(self.combinable)
+        if i < len(PARENT_ACTIONS) * len(self.parents):
+            return (PARENT_ACTIONS[i // len(self.parents)],
+                    self.parents[i % len(self.parents)])
+        i -= len(PARENT_ACTIONS) * len(self.parents)
+        for leaves in self._paint_targets(colour):
+            if i < len(leaves):
+                return PAINT, leaves[i]
+            i -= len(leaves)
+        return None
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'random', 'typing', '__future__',
+            'actions', 'block', 'settings'
+        ],
+        'max-attributes': 15
+    })
@@ -0,0 +1,216 @@
+""" Module Description:
+
+This file contains an offscreen renderer for the self-play datasets written by
+dataset.py, which draws one frame per record and saves it to a PNG file,
+without a display and without waiting between frames.
+
+A frame shows the board of a record before its move, with the block that the
+move was applied to highlighted, and the move in the status line. Boards are
+drawn either one square at a time by Renderer.draw_board, or all at once from
+an array of pixels computed with NumPy by rasterize.
+
+Every worker process keeps one headless Renderer, so the surfaces of the
+screen, the instructions and the images are created once per process and
+reused for every frame.
+"""
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from block import Block, _block_to_squares
+from codec import decode_board
+from dataset import GOAL_KINDS, RECORD_ACTIONS, chunk_paths, iter_chunk
+from renderer import Renderer
+from settings import BOARD_SIZE, COLOUR_LIST, OUTLINE_COLOUR, \
+    OUTLINE_THICKNESS, colour_name
+
+# The colours of COLOUR_LIST, by their index, followed by OUTLINE_COLOUR, each
+# packed with a padding byte into a 32-bit integer, so that a whole colour is
+# looked up at once.
+_PALETTE = np.array([colour + (0,)
+                     for colour in COLOUR_LIST + [OUTLINE_COLOUR]],
+                    dtype=np.uint8).view(np.uint32).ravel()
+# The bit of the code of a unit cell that is set when it is on each edge of
+# its leaf, as used by rasterize.
+_EDGE_BITS = {'left': 1, 'right': 2, 'top': 4, 'bottom': 8}
+
+# The Renderer of a worker process.
+_renderer = None
+
+
+def rasterize(board: Block, size: int) -> np.ndarray:
+    """Return the colour of every pixel of <board> drawn with dimensions
+    <size> by <size> as by Renderer.draw_board, outlines included, as an array
+    of shape (size, size, 3) indexed by row and then column.
+
+    A pixel belongs to the leaf that includes its unit cell, which is the unit
+    cell that its upper left corner is in, as in Viewport.to_cell. The result
+    is the same as Renderer.draw_board with the whole board shown when every
+    leaf is at least LOD_SIZE pixels wide, since draw_board leaves out the
+    outlines of smaller squares.
+
+    Preconditions:
+    - board.level == 0
+
+    >>> board = Block(COLOUR_LIST[1], 0, 1)
+    >>> pixels = rasterize(board, 8)
+    >>> pixels.shape
+    (8, 8, 3)
+    >>> [tuple(pixels[0, x]) == OUTLINE_COLOUR for x in range(8)]
+    [True, True, True, True, True, True, True, True]
+    >>> [tuple(pixels[3, x]) == COLOUR_LIST[1] for x in range(8)]
+    [False, False, True, True, True, True, False, False]
+    """
+    depth = board.max_depth
+    n = 1 << depth
+    ids = np.empty((n, n), dtype=np.int32)
+    colours = []
+    stack = [(board, 0, 0)]
+    while stack:
+        block, col, row = stack.pop()
+        width = 1 << (depth - block.level)
+        children = block.children
+        if children == []:
+            ids[row:row + width, col:col + width] = len(colours)
+            colours.append(COLOUR_LIST.index(block.colour))
+        else:
+            half = width // 2
+            stack.append((children[0], col + half, row))
+            stack.append((children[1], col, row))
+            stack.append((children[2], col, row + half))
+            stack.append((children[3], col + half, row + half))
+    # The code of each unit cell is the index of its colour, shifted left by
+    # four bits, with the bits of _EDGE_BITS set for the edges of its leaf
+    # that it is on.
+    codes = np.array(colours, dtype=np.uint8)[ids] << 4
+    codes[:, 0] |= _EDGE_BITS['left']
+    codes[:, 1:] |= np.where(ids[:, 1:] != ids[:, :-1],
+                             _EDGE_BITS['left'], 0).astype(np.uint8)
+    codes[:, -1] |= _EDGE_BITS['right']
+    codes[:, :-1] |= np.where(ids[:, :-1] != ids[:, 1:],
+                              _EDGE_BITS['right'], 0).astype(np.uint8)
+    codes[0] |= _EDGE_BITS['top']
+    codes[1:] |= np.where(ids[1:] != ids[:-1], _EDGE_BITS['top'],
+                          0).astype(np.uint8)
+    codes[-1] |= _EDGE_BITS['bottom']
+    codes[:-1] |= np.where(ids[:-1] != ids[1:], _EDGE_BITS['bottom'],
+                           0).astype(np.uint8)
+    # The unit cell of each pixel offset, and the edges of its unit cell that
+    # are within OUTLINE_THICKNESS of it.
+    edges = -((-np.arange(n + 1, dtype=np.int64) * size) >> depth)
+    offsets = np.arange(size, dtype=np.int64)
+    cell_of = (offsets << depth) // size
+    near_start = offsets - edges[cell_of] < OUTLINE_THICKNESS
+    near_end = edges[cell_of + 1] - offsets <= OUTLINE_THICKNESS
+    near_x = (np.where(near_start, _EDGE_BITS['left'], 0)
+              | np.where(near_end, _EDGE_BITS['right'], 0)).astype(np.uint8)
+    # A row of pixels is the same as every other row in the same row of unit
+    # cells that is near the same edges, so each of the four kinds of rows
+    # is computed once per row of unit cells and copied to the others.
+    near_y = np.array([0, _EDGE_BITS['top'], _EDGE_BITS['bottom'],
+                       _EDGE_BITS['top'] | _EDGE_BITS['bottom']],
+                      dtype=np.uint8)
+    row_codes = codes[:, cell_of]
+    outline = (row_codes[None] & (near_y[:, None, None] | near_x)) != 0
+    rows = np.take(_PALETTE, np.where(outline, len(COLOUR_LIST),
+                                      row_codes[None] >> 4))
+    kinds = near_start.astype(np.int64) + 2 * near_end
+    pixels = np.take(rows.reshape(4 * n, size), kinds * n + cell_of, axis=0)
+    return pixels.view(np.uint8).reshape(size, size, 4)[:, :, :3]
+
+
+def draw_record(renderer: Renderer, record: tuple[bytes, int, int, int,
+                                                  tuple[int, int], int, int],
+                size: int, max_depth: int, rasterized: bool) -> None:
+    """Draw the frame of <record>, a record of a dataset of boards with
+    dimensions <size> by <size> and <max_depth>, with <renderer>.
+
+    If <rasterized>, draw the board with rasterize and Renderer.draw_pixels,
+    and otherwise with Renderer.draw_board.
+    """
+    encoding, kind, colour, action_id, (col, row), level, score = record
+    board = decode_board(encoding, max_depth)
+    action = RECORD_ACTIONS[action_id]
+    renderer.clear()
+    if rasterized:
+        renderer.draw_pixels(rasterize(board, size))
+    else:
+        renderer.draw_board(_block_to_squares(board), max_depth)
+    renderer.highlight_block((col, row), 1 << (max_depth - level), max_depth)
+    renderer.draw_status(f'{colour_name(COLOUR_LIST[colour])} '
+                         f'{GOAL_KINDS[kind].__name__} is {action.message} | '
+                         f'Score {score}')
+
+
+def _start_renderer(size: int) -> None:
+    """Create the headless Renderer of this worker process, for boards with
+    dimensions <size> by <size>.
+    """
+    global _renderer
+    _renderer = Renderer(size, headless=True)
+
+
+def _render_chunk(path: str, frames_directory: str, size: int,
+                  max_depth: int, rasterized: bool) -> int:
+    """Save the frame of every record in the chunk file at <path> to a PNG
+    file in <frames_directory>, named after the chunk and the index of the
+    record in it, and return the number of frames saved.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    num_frames = 0
+    for record in iter_chunk(path):
+        draw_record(_renderer, record, size, max_depth, rasterized)
+        _renderer.save_to_file(os.path.join(frames_directory,
+                                            f'{name}-{num_frames:06d}.png'))
+        num_frames += 1
+    return num_frames
+
+
+def render_dataset(directory: str, frames_directory: str, max_depth: int,
+                   num_workers: int, size: int = BOARD_SIZE,
+                   rasterized: bool = True) -> int:
+    """Save a frame for every record of the dataset of boards with dimensions
+    <size> by <size> and <max_depth> in <directory> to a PNG file in
+    <frames_directory>, which is created if it does not exist, with
+    <num_workers> worker processes. Return the number of frames saved.
+
+    The boards are drawn as described by draw_record.
+
+    Each worker process renders whole chunk files, so the frames of a chunk
+    are saved in order.
+
+    >>> import tempfile
+    >>> from dataset import generate_dataset
+    >>> directory = tempfile.mkdtemp()
+    >>> generate_dataset(directory, [1, 2], 3, 1, max_turns=2,
+    ...                  records_per_chunk=5)
+    8
+    >>> frames_directory = os.path.join(directory, 'frames')
+    >>> render_dataset(directory, frames_directory, 3, 2)
+    8
+    >>> sorted(os.listdir(frames_directory))[:2]
+    ['chunk-000000-000000.png', 'chunk-000000-000001.png']
+    """
+    os.makedirs(frames_directory, exist_ok=True)
+    with ProcessPoolExecutor(num_workers, initializer=_start_renderer,
+                             initargs=(size,)) as executor:
+        paths = chunk_paths(directory)
+        return sum(executor.map(_render_chunk, paths,
+                                [frames_directory] * len(paths),
+                                [size] * len(paths), [max_depth] * len(paths),
+                                [rasterized] * len(paths)))
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'os',
+            'concurrent.futures', 'numpy', 'block', 'codec', 'dataset',
+            'renderer', 'settings'
+        ],
+        'max-args': 7
+    })
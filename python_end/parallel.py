@@ -0,0 +1,191 @@
+""" Module Description:
+
+This file contains the ParallelEvaluator class, which scores candidate moves
+on many processes without sending the board to them on every move.
+
+The board being evaluated lives in a block of shared memory, as the buffer of
+a HeapBoard, followed by one 64-bit score per candidate move. Every worker
+process attaches to the shared memory once, when it starts. To evaluate a
+move, the parent writes the board into shared memory and sends each worker
+only the ids of the moves to score, and the workers write the scores back into
+shared memory.
+"""
+from __future__ import annotations
+import random
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+from actions import Action, ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, COMBINE, PAINT, PASS
+from goal import Goal
+from heap_board import HeapBoard, heap_board_from_cells, num_nodes
+
+# The actions that can be evaluated, in the order of their ids.
+EVAL_ACTIONS = [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, SWAP_HORIZONTAL,
+                SWAP_VERTICAL, SMASH, COMBINE, PAINT]
+
+# The score of a move that could not be applied.
+INVALID_SCORE = -2 ** 63
+
+# The shared memory that a worker process is attached to.
+_shared = None
+
+
+def _scores_offset(max_depth: int) -> int:
+    """Return the offset of the scores in the shared memory of a
+    ParallelEvaluator for boards of <max_depth>, which is the size of the board
+    rounded up to a multiple of 8 bytes.
+    """
+    return (num_nodes(max_depth) + 7) // 8 * 8
+
+
+def _attach(name: str) -> None:
+    """Attach this worker process to the shared memory called <name>.
+    """
+    global _shared
+    _shared = shared_memory.SharedMemory(name=name)
+
+
+def _evaluate(max_depth: int, goal: Goal,
+              moves: list[tuple[int, int, int]]) -> None:
+    """Score each move in <moves> on the board of <max_depth> in shared
+    memory, for <goal>.
+
+    Each move is a tuple of the index of its score in shared memory, the id of
+    its action and the heap index of the node it is applied to. The score of a
+    move accounts for its penalty, and is INVALID_SCORE if the move could not
+    be applied.
+    """
+    end = num_nodes(max_depth)
+    with _shared.buf[:end].toreadonly() as cells, \
+            _shared.buf[_scores_offset(max_depth):].cast('q') as scores:
+        for index, action_id, node in moves:
+            board = heap_board_from_cells(max_depth, cells)
+            action = EVAL_ACTIONS[action_id]
+            if action.apply(board.view(node), {'colour': goal.colour}):
+                scores[index] = goal.score(board.view()) - action.penalty
+            else:
+                scores[index] = INVALID_SCORE
+
+
+class ParallelEvaluator:
+    """A pool of worker processes that score moves on boards in shared
+    memory.
+
+    Instance Attributes:
+    - max_depth: The max_depth of the boards that can be evaluated.
+    - max_moves: The largest number of moves that can be evaluated at once.
+
+    Private Instance Attributes:
+    - _memory: The shared memory holding the board and the scores.
+    - _executor: The worker processes.
+    - _num_workers: The number of worker processes.
+    """
+    max_depth: int
+    max_moves: int
+    _memory: shared_memory.SharedMemory
+    _executor: ProcessPoolExecutor
+    _num_workers: int
+
+    def __init__(self, max_depth: int, max_moves: int,
+                 num_workers: int) -> None:
+        """Initialize this ParallelEvaluator with <num_workers> worker
+        processes that evaluate up to <max_moves> moves at once on boards of
+        <max_depth>.
+        """
+        self.max_depth = max_depth
+        self.max_moves = max_moves
+        self._memory = shared_memory.SharedMemory(
+            create=True, size=_scores_offset(max_depth) + 8 * max_moves)
+        self._num_workers = num_workers
+        self._executor = ProcessPoolExecutor(num_workers, initializer=_attach,
+                                             initargs=(self._memory.name,))
+
+    def evaluate(self, board: HeapBoard, goal: Goal,
+                 moves: list[tuple[Action, int]]) -> list[int]:
+        """Return the score for <goal> of applying each move in <moves> to a
+        copy of <board>, accounting for its penalty, or INVALID_SCORE if the
+        move cannot be applied.
+
+        Each move is an action in EVAL_ACTIONS and the heap index of the node
+        it is applied to.
+
+        Preconditions:
+        - board.max_depth == self.max_depth
+        - len(moves) <= self.max_moves
+        """
+        self._memory.buf[:len(board.cells)] = board.cells
+        jobs = [(i, EVAL_ACTIONS.index(action), node)
+                for i, (action, node) in enumerate(moves)]
+        futures = [self._executor.submit(_evaluate, board.max_depth, goal,
+                                         jobs[i::self._num_workers])
+                   for i in range(min(self._num_workers, len(jobs)))]
+        wait(futures)
+        for future in futures:
+            future.result()
+        with self._memory.buf[_scores_offset(self.max_depth):].cast('q') \
+                as scores:
+            return scores[:len(moves)].tolist()
+
+    def close(self) -> None:
+        """Stop the worker processes and free the shared memory.
+        """
+        self._executor.shutdown()
+        self._memory.close()
+        self._memory.unlink()
+
+
+def valid_moves(board: HeapBoard, colour: tuple[int, int, int]) \
+        -> list[tuple[Action, int]]:
+    """Return every valid move other than PASS on <board> for a player who
+    paints with <colour>, as an action in EVAL_ACTIONS and the heap index of the
+    node it is applied to.
+    """
+    return [(action, node) for node in board.nodes()
+            for action in EVAL_ACTIONS
+            if action.can_apply(board.view(node), {'colour': colour})]
+
+
+def smart_move(evaluator: ParallelEvaluator, board: HeapBoard, goal: Goal,
+               difficulty: int) -> tuple[Action, int]:
+    """Return the best of <difficulty> random valid moves on <board> for
+    <goal>, like SmartPlayer, scoring the moves with <evaluator>.
+
+    Every valid move is assessed if there are no more than <difficulty> of
+    them. Return PASS and the root if no move beats the current score.
+
+    Preconditions:
+    - difficulty <= evaluator.max_moves
+
+    >>> from goal import PerimeterGoal
+    >>> from heap_board import generate_heap_board
+    >>> from settings import COLOUR_LIST
+    >>> evaluator = ParallelEvaluator(3, 10, 2)
+    >>> board = generate_heap_board(3)
+    >>> action, node = smart_move(evaluator, board,
+    ...                           PerimeterGoal(COLOUR_LIST[0]), 10)
+    >>> action in EVAL_ACTIONS + [PASS] and node in board.nodes()
+    True
+    >>> evaluator.close()
+    """
+    moves = valid_moves(board, goal.colour)
+    if len(moves) > difficulty:
+        moves = random.sample(moves, difficulty)
+    best = (PASS, 0)
+    best_score = goal.score(board.view())
+    for move, score in zip(moves, evaluator.evaluate(board, goal, moves)):
+        if score > best_score:
+            best, best_score = move, score
+    return best
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'random',
+            'concurrent.futures', 'multiprocessing', 'actions', 'goal',
+            'heap_board'
+        ]
+    })
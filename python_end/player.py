@@ -4,18 +4,34 @@ This file contains the hierarchy of player classes.
 """
 from __future__ import annotations
 import random
-import pygame
+import time
+from typing import TYPE_CHECKING
 
-from block import Block
+from block import Block, replaced_key
 from goal import Goal, generate_goals
 
-from actions import Action, KEY_ACTION, ROTATE_CLOCKWISE, \
-    ROTATE_COUNTER_CLOCKWISE, \
-    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE
+from actions import Action, PASS
+from move_index import get_move_index
+from settings import MOVE_DEADLINE
 
+if TYPE_CHECKING:
+    import pygame
 
-def create_players(num_human: int, num_random: int, smart_players: list[int]) \
-        -> list[Player]:
+# A SmartPlayer with a time budget stops once its best score has not improved
+# for this many moves, or this fraction of the moves it expects to assess in
+# its budget, whichever is more.
+STALL_MOVES = 20
+STALL_FRACTION = 0.25
+
+# Whether a SmartPlayer scores the boards that are rotations or reflections of
+# one another once, with _move_score. bench_canonical_dedupe in benchmarks.py
+# finds that only about 8 to 13% of the moves of random boards of depths 3 to
+# 6 give such boards, which saves less time than finding them costs.
+DEDUPE_SCORES = False
+
+
+def create_players(num_human: int, num_random: int, smart_players: list[int],
+                   time_budget: float | None = None) -> list[Player]:
     """Return a new list of Player objects.
 
     <num_human> is the number of human player, <num_random> is the number of
@@ -26,6 +42,8 @@ def create_players(num_human: int, num_random: int, smart_players: list[int]) \
     <num_random> RandomPlayer objects, then the same number of SmartPlayer
     objects as the length of <smart_players>. The difficulty levels in
     <smart_players> should be applied to each SmartPlayer object, in order.
+    If <time_budget> is not None, every SmartPlayer instead assesses moves for
+    up to <time_budget> seconds per move.
 
     Player ids are given in the order that the players are created, starting
     at id 0.
@@ -38,45 +56,49 @@ def create_players(num_human: int, num_random: int, smart_players: list[int]) \
                       for i in range(num_random)]
     smart_players = [SmartPlayer(i + num_human + num_random,
                                  goals[i + num_human + num_random],
-                                 smart_players[i]) for i in
-                     range(len(smart_players))]
+                                 smart_players[i], time_budget)
+                     for i in range(len(smart_players))]
 
     return human_players + random_players + smart_players
 
 
-def _get_block(block: Block, location: tuple[int, int], level: int) -> \
+def _get_block(block: Block, cell: tuple[int, int], level: int) -> \
         Block | None:
-    """Return the Block within <block> that is at <level> and includes
-    <location>. <location> is a coordinate-pair (x, y).
+    """Return the Block within <block> that is at <level> and includes the
+    unit cell <cell>, a (column, row) pair.
 
-    A block includes all locations that are strictly inside it, as well as
-    locations on the top and left edges. A block does not include locations that
-    are on the bottom or right edge.
-
-    If a Block includes <location>, then so do its ancestors. <level> specifies
+    If a Block includes <cell>, then so do its ancestors. <level> specifies
     which of these blocks to return. If <level> is greater than the level of
-    the deepest block that includes <location>, then return that deepest block.
+    the deepest block that includes <cell>, then return that deepest block.
+
+    The child that includes <cell> at each level is read from the bits of the
+    column and row of <cell>.
 
-    If no Block can be found at <location>, return None.
+    If <block> does not include <cell>, return None.
 
     Preconditions:
         - block.level <= level <= block.max_depth
+
+    >>> from settings import COLOUR_LIST
+    >>> board = Block(COLOUR_LIST[0], 0, 2)
+    >>> board.smash()
+    True
+    >>> _get_block(board, (3, 1), 1) is board.children[0]
+    True
+    >>> _get_block(board, (4, 0), 1) is None
+    True
     """
-    if block.level == level and (block.position[0] <= location[0]
-                                 < block.position[0] + block.size
-                                 and block.position[1] <= location[1]
-                                 < block.position[1] + block.size):
-        return block
-    elif (block.position[0] <= location[0] < block.position[0] + block.size
-          and block.position[1] <= location[1]
-          < block.position[1] + block.size):
-        if block.children == []:
-            return block
-        for child in block.children:
-            if _get_block(child, location, level) is not None:
-                return _get_block(child, location, level)
-    else:
+    col, row = cell
+    x, y = block.cell
+    width = 1 << (block.max_depth - block.level)
+    if not (x <= col < x + width and y <= row < y + width):
         return None
+    while block.level < level and block.children != []:
+        shift = block.max_depth - block.level - 1
+        right = (col >> shift) & 1
+        lower = (row >> shift) & 1
+        block = block.children[[[1, 0], [2, 3]][lower][right]]
+    return block
 
 
 class Player:
@@ -154,25 +176,26 @@ class HumanPlayer(Player):
 
         If no block is selected by the player, return None.
         """
-        mouse_pos = pygame.mouse.get_pos()
-        block = _get_block(board, mouse_pos, self._level)
+        import controls
+        cell = controls.mouse_cell(board.max_depth)
+        if cell is None:
+            return None
+        block = _get_block(board, cell, self._level)
 
         return block
 
     def process_event(self, event: pygame.event.Event) -> None:
         """Respond to the relevant keyboard events made by the player based on
-        the mapping in KEY_ACTION, as well as the W and S keys for changing
-        the level.
+        the mapping in controls.KEY_ACTION, as well as the keys in
+        controls.KEY_LEVEL for changing the level.
         """
-        if event.type == pygame.KEYUP:
-            if event.key in KEY_ACTION:
-                self._desired_action = KEY_ACTION[event.key]
-            elif event.key == pygame.K_w:
-                self._level -= 1
-                self._desired_action = None
-            elif event.key == pygame.K_s:
-                self._level += 1
-                self._desired_action = None
+        import controls
+        key = controls.released_key(event)
+        if key in controls.KEY_ACTION:
+            self._desired_action = controls.KEY_ACTION[key]
+        elif key in controls.KEY_LEVEL:
+            self._level += controls.KEY_LEVEL[key]
+            self._desired_action = None
 
     def generate_move(self, board: Block) -> \
             tuple[Action, Block] | None:
@@ -210,20 +233,28 @@ class ComputerPlayer(Player):
     Instance Attributes:
     - _proceed: True when the player should make a move, False when the
                 player should wait.
+    - _deadline: The number of seconds after which this player stops
+                 looking for a better move and makes the best move it has
+                 found so far. The step that is running when the deadline
+                 passes is finished first, so choosing a move can take
+                 somewhat longer.
     """
     _proceed: bool
+    _deadline: float
 
-    def __init__(self, player_id: int, goal: Goal) -> None:
+    def __init__(self, player_id: int, goal: Goal,
+                 deadline: float = MOVE_DEADLINE) -> None:
         Player.__init__(self, player_id, goal)
 
         self._proceed = False
+        self._deadline = deadline
 
     def get_selected_block(self, board: Block) -> Block | None:
         return None
 
     def process_event(self, event: pygame.event.Event) -> None:
-        if (event.type == pygame.MOUSEBUTTONDOWN
-                and event.button == pygame.BUTTON_LEFT):
+        import controls
+        if controls.is_left_click(event):
             self._proceed = True
 
     # Note: this is included just to make pyTA happy; as it thinks
@@ -233,50 +264,36 @@ class ComputerPlayer(Player):
         raise NotImplementedError
 
 
-def _random_block(board: Block) -> Block:
-    """Return a random Block in <board>.
-    Pre-condition:
-    - board is not None
-    """
-    block = None
-    while block is None:
-        level = random.randint(0, board.max_depth)
-        location = (random.random() * board.size + board.position[0],
-                    random.random() * board.size + board.position[1])
-        block = _get_block(board, location, level)
-    return block
-
+def _move_score(board: Block, move: tuple[Action, Block], goal: Goal,
+                cache: dict | None) -> int:
+    """Return the score of <goal>, minus the penalty of the action, when <move>
+    is applied to <board>, without mutating <board>.
 
-def _random_action(block: Block, actions: list[Action], goal: Goal) -> Action:
-    """ Return a random valid action on <block> provided the goal colour in
-    <goal>.
+    If <cache> is not None, it holds the goal score of each canonical_key of
+    the boards that were already scored, along with the keys of <board> for
+    replaced_key, so that boards that are rotations or reflections of one
+    another are scored once, and only the keys of the moved block and its
+    ancestors are computed for each move. <cache> is filled in on the first
+    call for <board>, and must not be used once <board> changes.
 
-    Pre_condition:
-    - block is not None
-    """
-    action = actions[random.randint(0, len(actions) - 1)]
-    block_copy = block.create_copy()
-    while not action.apply(block_copy, {'colour': goal.colour}):
-        action = actions[random.randint(0, len(actions) - 1)]
-        block_copy = block.create_copy()
-    return action
-
-
-def _random_action_score(board: Block, actions: list[Action], goal: Goal) \
-        -> tuple[Action, Block, int]:
-    """ Randomly choose an action from <actions> on a random block of <board>.
-    Return a tuple consisting of the action, the block and the score when action
-     is applied on <board> without mutating it.
-    Pre_condition:
-    - block is not None
+    Preconditions:
+    - <move> is a valid move on <board>.
     """
-    block = _random_block(board)
+    action, block = move
     board_copy = board.create_copy()
-    block_copy = _get_block(board_copy, block.position, block.level)
-    action = _random_action(block_copy, actions, goal)
+    block_copy = _get_block(board_copy, block.cell, block.level)
     action.apply(block_copy, {'colour': goal.colour})
-    return action, block, goal.score(board_copy) - action.penalty
-
+    if cache is None:
+        return goal.score(board_copy) - action.penalty
+    if 'scores' not in cache:
+        cache['scores'] = {}
+        cache['keys'] = {}
+        cache['memo'] = {}
+    key = replaced_key(board, block, block_copy, cache['keys'], cache['memo'])
+    scores = cache['scores']
+    if key not in scores:
+        scores[key] = goal.score(board_copy)
+    return scores[key] - action.penalty
 
 class RandomPlayer(ComputerPlayer):
     """A computer player who chooses completely random moves."""
@@ -287,19 +304,20 @@ class RandomPlayer(ComputerPlayer):
         turn.  Return None if the player should not make a move yet.
 
         A valid move is a move other than PASS that can be successfully
-        performed on the <board>.
+        performed on the <board>. The move is drawn uniformly from all the valid
+        moves on the <board>, and this player passes if there are none. The
+        deadline is not checked, since drawing a move takes constant time once
+        the board is indexed.
 
         This function does not mutate <board>.
         """
         if not self._proceed or board is None:
             return None
-        block = _random_block(board)
-        actions = [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,
-                   SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT,
-                   COMBINE]
-        action = _random_action(block, actions, self.goal)
+        move = get_move_index(board).random_move(self.goal.colour)
         self._proceed = False
-        return action, block
+        if move is None:
+            return PASS, board
+        return move
 
 
 class SmartPlayer(ComputerPlayer):
@@ -309,10 +327,15 @@ class SmartPlayer(ComputerPlayer):
     Private Instance Attributes:
     - _num_test: The number of moves this SmartPlayer will test out before
                  choosing a move.
+    - _time_budget: The number of seconds this SmartPlayer will spend testing
+                    out moves, or None if it tests out _num_test moves.
     """
     _num_test: int
+    _time_budget: float | None
 
-    def __init__(self, player_id: int, goal: Goal, difficulty: int) -> None:
+    def __init__(self, player_id: int, goal: Goal, difficulty: int,
+                 time_budget: float | None = None,
+                 deadline: float = MOVE_DEADLINE) -> None:
         """Initialize this SmartPlayer with a <player_id> and <goal>.
 
         Use <difficulty> to determine and record how many moves this SmartPlayer
@@ -320,11 +343,19 @@ class SmartPlayer(ComputerPlayer):
         <difficulty>, the more moves this SmartPlayer will assess, and hence the
         more difficult an opponent this SmartPlayer will be.
 
+        If <time_budget> is not None, this SmartPlayer instead assesses moves
+        for up to <time_budget> seconds, so that it takes about as long on deep
+        boards as on shallow ones. Either way, it stops looking for a better
+        move after <deadline> seconds.
+
         Preconditions:
         - difficulty >= 0
+        - time_budget is None or time_budget > 0
+        - deadline >= 0
         """
-        ComputerPlayer.__init__(self, player_id, goal)
+        ComputerPlayer.__init__(self, player_id, goal, deadline)
         self._num_test = difficulty
+        self._time_budget = time_budget
 
     def generate_move(self, board: Block) -> \
             tuple[Action, Block] | None:
@@ -335,29 +366,75 @@ class SmartPlayer(ComputerPlayer):
 
         A valid move is a move other than PASS that can be successfully
         performed on the <board>. If no move can be found that is better than
-        the current score, this player will pass.
+        the current score, this player will pass. If there are no more valid
+        moves than the number of moves this player assesses, every valid move
+        is assessed once. A move is skipped without being applied if the upper
+        bound of its goal on the score after the move cannot beat the best
+        score so far, and skipped moves are not counted as assessed below.
+
+        With a time budget, valid moves are assessed in a random order until
+        the budget runs out, every valid move has been assessed, or the best
+        score has stalled, as described by STALL_MOVES and STALL_FRACTION.
+
+        In every case, no move is assessed once the time budget or the
+        deadline has passed, or the average time taken per move so far
+        predicts that it would end after them, and the best move found so far
+        is returned. The clock is also checked after indexing the board and
+        after listing the moves to assess, and this player passes if either
+        ends after them. None of these steps is interrupted, so a move can be
+        returned somewhat after the deadline.
 
         This method does not mutate <board>.
         """
         if not self._proceed or board is None:
             return None
-        actions = [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,
-                   SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT,
-                   COMBINE]
+        self._proceed = False
+        start = time.perf_counter()
+        stop = start + self._deadline
+        if self._time_budget is not None:
+            stop = min(stop, start + self._time_budget)
+        smart_move = PASS, board
+        index = get_move_index(board)
+        if time.perf_counter() >= stop:
+            return smart_move
+        if self._time_budget is not None:
+            candidates = index.moves(self.goal.colour)
+            random.shuffle(candidates)
+        elif index.num_moves(self.goal.colour) <= self._num_test:
+            candidates = index.moves(self.goal.colour)
+        else:
+            candidates = [index.random_move(self.goal.colour)
+                          for _ in range(self._num_test)]
+        if time.perf_counter() >= stop:
+            return smart_move
         # Score of the current state of the board if passed
-        smart_action, smart_block, max_score = (PASS, board,
-                                                self.goal.score
-                                                (board.create_copy()))
-        i = 0
-        while i < self._num_test:
-            action, block, score = _random_action_score(board, actions,
-                                                        self.goal)
+        max_score = self.goal.score(board)
+        # Rotations and reflections of a board all have the same score
+        scores = {} if DEDUPE_SCORES else None
+        bounds = {}
+        assessed = 0
+        stalled = 0
+        for move in candidates:
+            now = time.perf_counter()
+            if now >= stop or (assessed > 0
+                               and now + (now - start) / assessed > stop):
+                break
+            if (self._time_budget is not None and stalled >= STALL_MOVES
+                    and stalled >= (STALL_FRACTION * assessed
+                                    * self._time_budget / (now - start))):
+                break
+            action, block = move
+            if (self.goal.move_bound(board, block, bounds) - action.penalty
+                    <= max_score):
+                continue
+            assessed += 1
+            stalled += 1
+            score = _move_score(board, move, self.goal, scores)
             if score > max_score:
                 max_score = score
-                smart_action, smart_block = action, block
-            i += 1
-        self._proceed = False
-        return smart_action, smart_block
+                smart_move = move
+                stalled = 0
+        return smart_move
 
 
 if __name__ == '__main__':
@@ -366,9 +443,9 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-io': ['process_event'],
         'allowed-import-modules': [
-            'doctest', 'python_ta', 'random', 'typing', 'actions', 'block',
-            'goal', 'pygame', '__future__'
+            'doctest', 'python_ta', 'random', 'time', 'typing', 'actions',
+            'block', 'controls', 'goal', 'move_index', 'pygame', 'settings',
+            '__future__'
         ],
-        'max-attributes': 10,
-        'generated-members': 'pygame.*'
+        'max-attributes': 10
     })
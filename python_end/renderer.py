@@ -2,12 +2,20 @@
 
 This file contains the class that "renders" the image of our game.
 """
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
 import pygame
 
-from actions import Action, KEY_ACTION
+from actions import Action
+from controls import KEY_ACTION, KEY_UNDO, KEY_REDO, KEY_ZOOM
 from settings import BACKGROUND_COLOUR, TEXT_COLOUR, OUTLINE_THICKNESS, \
     OUTLINE_COLOUR, HIGHLIGHT_THICKNESS, HIGHLIGHT_COLOUR, COLOUR_LIST, \
-    colour_name
+    LOD_SIZE, colour_name
+from viewport import Viewport
+
+if TYPE_CHECKING:
+    import numpy as np
 
 Y_FONT_PADDING = 2
 
@@ -50,6 +58,12 @@ def _print_human_instructions(x: int, y: int, text_height: int,
     text_to_print = []
     text_to_print.append('Increase Level: S')
     text_to_print.append('Decrease Level: W')
+    text_to_print.append(f'Undo: {pygame.key.name(KEY_UNDO).upper()}')
+    text_to_print.append(f'Redo: {pygame.key.name(KEY_REDO).upper()}')
+    for key, steps in KEY_ZOOM.items():
+        text_to_print.append(f'Zoom {"In" if steps > 0 else "Out"}: '
+                             f'{pygame.key.name(key).upper()}')
+    text_to_print.append('Pan: Arrow Keys')
     for key, action in KEY_ACTION.items():
         key_name = pygame.key.name(key).upper()
         label = action.label
@@ -114,25 +128,51 @@ class Renderer:
     """
     A class designed to handle drawing the different aspects of a Blocky game.
 
+    The board is drawn through a Viewport, so squares, highlights and images
+    are given by their unit cells and widths on a board of a max_depth, as in
+    _block_to_squares, and the Viewport finds the pixels that they cover in
+    the part of the board that is shown.
+
+    Instance Attributes:
+    - viewport: The part of the board that is shown.
+    - lod_size: The size in pixels on the screen below which squares are drawn
+                without an outline.
+
     Private Instance Attributes:
     - _screen: The pygame image to draw on for visualizing graphics.
+    - _instructions: A copy of the cleared screen, with the instructions
+                     already printed on it.
+    - _board: The part of _screen that the board is drawn on.
     - _font: The font to use for text being drawn.
-    - _images: A dictionary mapping actions to images that are displayed
+    - _images: A dictionary mapping the short name of each action, and the
+               size it is scaled to or None, to the image that is displayed
                in the game.
     _status_position: The (x, y) position of the status messages.
     """
     _screen: pygame.Surface
     _instructions: pygame.Surface
+    _board: pygame.Surface
     _images: dict[tuple[str, int | None], pygame.Surface]
     _font: pygame.font.Font
     _status_position: tuple[int, int]
     _board_size: int
+    viewport: Viewport
+    lod_size: int
+
+    def __init__(self, size: int, headless: bool = False,
+                 lod_size: int = LOD_SIZE) -> None:
+        """Initialize this Renderer for a board with dimensions <size> x <size>,
+        drawing squares smaller than <lod_size> pixels without an outline.
 
-    def __init__(self, size: int) -> None:
-        """Initialize this Renderer for a board with dimensions <size> x <size>.
+        If <headless>, draw on an offscreen image instead of opening a window,
+        so that frames can be saved to files without a display.
         """
         self._board_size = size
+        self.viewport = Viewport(size)
+        self.lod_size = lod_size
 
+        if headless:
+            pygame.font.init()
         self._font = pygame.font.Font(pygame.font.get_default_font(), 14)
         status_height = self._font.size("Player")[1]
         instructions_width = 250
@@ -140,50 +180,101 @@ class Renderer:
         height = size + status_height + 2 * Y_FONT_PADDING
         width = size + instructions_width
 
-        self._screen = pygame.display.set_mode((width, height))
+        if headless:
+            self._screen = pygame.Surface((width, height))
+        else:
+            self._screen = pygame.display.set_mode((width, height))
+        self._board = self._screen.subsurface(((0, 0), (size, size)))
 
         self._status_position = (10, size + Y_FONT_PADDING)
 
         self._images = {}
         for action in KEY_ACTION.values():
-            self._images[action.short_name] = _load_image(f'images/'
-                                                          f'{action.short_name}'
-                                                          f'.png')
+            self._images[(action.short_name, None)] = _load_image(
+                f'images/{action.short_name}.png')
 
-    def clear(self) -> None:
-        """Clear the screen with BACKGROUND_COLOUR.
-        """
         self._screen.fill(BACKGROUND_COLOUR)
         _print_instructions(self._screen, self._board_size, self._font)
+        self._instructions = self._screen.copy()
 
-    def draw_image(self, action: Action,
-                   pos: tuple[int, int], size: int) -> None:
-        """Draw the image that coincides with action at pos, stretched to fit
-        size.
+    def clear(self) -> None:
+        """Clear the screen with BACKGROUND_COLOUR, and print the
+        instructions.
+        """
+        self._screen.blit(self._instructions, (0, 0))
+
+    def draw_image(self, action: Action, cell: tuple[int, int], width: int,
+                   max_depth: int) -> None:
+        """Draw the image that coincides with action over the square of a
+        board of <max_depth> at <cell> that is <width> unit cells wide,
+        stretched to fit it.
 
         If the action is not supported, no image is drawn.
         """
-
-        # just load the image each time?
-        image = _load_image(f'images/{action.short_name}.png')
-        image = pygame.transform.scale(image, (size, size))
-        self._screen.blit(image, pos)
+        if (action.short_name, None) not in self._images:
+            return
+        x, y, size, _ = self.viewport.to_screen(cell, width, max_depth)
+        if (action.short_name, size) not in self._images:
+            self._images[(action.short_name, size)] = pygame.transform.scale(
+                self._images[(action.short_name, None)], (size, size))
+        self._board.blit(self._images[(action.short_name, size)], (x, y))
 
     def draw_board(self, squares: list[tuple[tuple[int, int, int],
-                                             tuple[int, int], int]]) -> None:
-        """Draw each block in blocks onto the screen.
+                                             tuple[int, int], int]],
+                   max_depth: int) -> None:
+        """Draw each of <squares> of a board of <max_depth> onto the screen.
+
+        Squares that are smaller than lod_size on the screen are drawn
+        without an outline, which would cover most of them, and squares that
+        are smaller than a pixel are drawn one pixel wide.
+        """
+        to_screen = self.viewport.to_screen
+        # The whole board is shown as it is unless it is zoomed in, so the
+        # squares are cut from the edges of the unit cells
+        edges = self.viewport.cell_edges(max_depth) \
+            if self.viewport.zoom == 1 else None
+        for colour, cell, width in squares:
+            if edges is None:
+                rect = to_screen(cell, width, max_depth)
+            else:
+                left = edges[cell[0]]
+                top = edges[cell[1]]
+                rect = (left, top, edges[cell[0] + width] - left,
+                        edges[cell[1] + width] - top)
+                if rect[2] == 0 or rect[3] == 0:
+                    rect = to_screen(cell, width, max_depth)
+            self._board.fill(colour, rect)
+            if rect[2] >= self.lod_size:
+                pygame.draw.rect(self._board, OUTLINE_COLOUR, rect,
+                                 OUTLINE_THICKNESS)
+
+    def min_block_width(self, max_depth: int) -> float:
+        """Return the width in unit cells of a square of a board of
+        <max_depth> that is drawn lod_size pixels wide on the screen, at the
+        current zoom.
+
+        A divided block narrower than this can be drawn as a single square,
+        as by _lod_squares in block.py, since its squares would be drawn
+        without outlines.
         """
-        for colour, pos, size in squares:
-            rect = (pos[0], pos[1], size, size)
-            pygame.draw.rect(self._screen, colour, rect, 0)
-            pygame.draw.rect(self._screen, OUTLINE_COLOUR, rect,
-                             OUTLINE_THICKNESS)
-
-    def highlight_block(self, pos: tuple[int, int], size: int) -> None:
-        """Draw a highlighted square border at pos with size.
+        return (self.lod_size * (1 << max_depth)
+                / (self._board_size * self.viewport.zoom))
+
+    def draw_pixels(self, pixels: np.ndarray) -> None:
+        """Draw the board from <pixels>, an array of the colour of every
+        pixel of the board, indexed by row and then column.
+
+        The pixels are drawn as they are, whatever the viewport shows.
+        """
+        pygame.surfarray.blit_array(self._board, pixels.swapaxes(0, 1))
+
+    def highlight_block(self, cell: tuple[int, int], width: int,
+                        max_depth: int) -> None:
+        """Draw a highlighted square border around the square of a board of
+        <max_depth> at <cell> that is <width> unit cells wide.
         """
-        rect = (pos[0], pos[1], size, size)
-        pygame.draw.rect(self._screen, HIGHLIGHT_COLOUR, rect,
+        pygame.draw.rect(self._board, HIGHLIGHT_COLOUR,
+                         self.viewport.to_screen(cell, width, max_depth),
                          HIGHLIGHT_THICKNESS)
 
     def text_height(self) -> int:
@@ -214,8 +305,8 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-io': ['_load_image'],
         'allowed-import-modules': [
-            'doctest', 'python_ta', 'random', 'typing', 'actions', 'settings',
-            'pygame'
+            'doctest', 'python_ta', 'random', 'typing', '__future__',
+            'actions', 'controls', 'settings', 'viewport', 'numpy', 'pygame'
         ],
         'max-args': 6,
         'generated-members': 'pygame.*'
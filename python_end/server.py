@@ -0,0 +1,396 @@
+""" Module Description:
+
+This file contains a headless server that hosts many Blocky games in a single
+process.
+
+Clients connect over TCP or a Unix socket and send one JSON object per line.
+Each request gets exactly one JSON response line. The requests are:
+- {"op": "new", "max_depth": d, "num_human": h, "num_random": r,
+   "smart_players": [...], "max_turns": t}
+  starts a new game and responds with its "game" id.
+- {"op": "wait", "game": id}
+  responds with the status of the game once it is a human player's turn, or
+  the game is over.
+- {"op": "move", "game": id, "action": name, "x": x, "y": y, "level": level}
+  applies the action with the short name <name> to the block at <level> that
+  includes the unit cell at column x and row y for the human player whose
+  turn it is.
+- {"op": "board", "game": id}
+  responds with the squares that must be drawn to render the board, as
+  returned by _block_to_squares, in unit cells.
+
+The moves of computer players are computed in a bounded executor, so slow
+SmartPlayers never block the event loop or the other games.
+
+A request that is not a JSON object, or whose fields have the wrong type or
+are out of range, gets the response {"ok": false, "error": message}, and the
+client can keep sending requests.
+"""
+from __future__ import annotations
+import asyncio
+import itertools
+import json
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+from actions import Action, ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, COMBINE, PAINT, PASS
+from block import Block, generate_board, _block_to_squares
+from player import ComputerPlayer, Player, create_players, _get_block
+from game_data import GameData
+from settings import COLOUR_LIST
+
+# The actions that clients can request, by their short name.
+ACTIONS = {action.short_name: action for action in
+           [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, SWAP_HORIZONTAL,
+            SWAP_VERTICAL, SMASH, COMBINE, PAINT, PASS]}
+
+# The default number of threads that compute the moves of computer players.
+AI_WORKERS = 4
+
+# The largest max_depth of the board of a game that clients can request.
+MAX_GAME_DEPTH = 8
+
+
+class GameSession:
+    """A game of Blocky hosted by a GameServer.
+
+    The turn logic is the same as the logic of MainState: players move in
+    order, and a turn is over once every player has made a move.
+
+    Instance Attributes:
+    - data: The data of this game.
+    - turn: The current turn.
+    - current_player_index: The index of the player whose turn it is.
+
+    Private Instance Attributes:
+    - _ready: Set while it is a human player's turn, or the game is over.
+    - _lock: Held while a computer player computes its move, or the board is
+             being read, since computer players read the board in another
+             thread.
+    """
+    data: GameData
+    turn: int
+    current_player_index: int
+    _ready: asyncio.Event
+    _lock: asyncio.Lock
+
+    def __init__(self, data: GameData) -> None:
+        """Initialize this GameSession with <data>, at the first turn.
+        """
+        self.data = data
+        self.turn = 0
+        self.current_player_index = 0
+        self._ready = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def is_over(self) -> bool:
+        """Return True iff the game is over.
+        """
+        return self.turn >= self.data.max_turns
+
+    def current_player(self) -> Player:
+        """Return the player whose turn it is.
+        """
+        return self.data.players[self.current_player_index]
+
+    def status(self) -> dict:
+        """Return the status of this game, including the scores of every
+        player if the game is over.
+        """
+        status = {'turn': self.turn, 'player': self.current_player_index,
+                  'over': self.is_over()}
+        if self.is_over():
+            status['scores'] = self.data.calculate_all_scores()
+        return status
+
+    def _do_move(self, move: tuple[Action, Block]) -> bool:
+        """Attempt to do the current player's requested <move>, and pass the
+        turn on to the next player if it is successful.
+
+        Return True iff the action is successfully performed.
+        """
+        action, block = move
+        player = self.current_player()
+        if not action.apply(block, {'colour': player.goal.colour}):
+            return False
+        player.penalty += action.penalty
+        self.current_player_index = ((self.current_player_index + 1)
+                                     % len(self.data.players))
+        if self.current_player_index == 0:
+            self.turn += 1
+        return True
+
+    async def advance(self, executor: Executor) -> None:
+        """Let the computer players move until it is a human player's turn or
+        the game is over.
+
+        A computer player that fails to choose a move passes, and the clients
+        waiting on this game are always woken up, so that an error in one
+        player cannot leave them waiting forever.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while not self.is_over() and isinstance(self.current_player(),
+                                                    ComputerPlayer):
+                player = self.current_player()
+                async with self._lock:
+                    player._proceed = True
+                    try:
+                        move = await loop.run_in_executor(
+                            executor, player.generate_move, self.data.board)
+                    except Exception:
+                        move = None
+                        player._proceed = False
+                if move is None or not self._do_move(move):
+                    self._do_move((PASS, self.data.board))
+        finally:
+            self._ready.set()
+
+    async def wait(self) -> dict:
+        """Return the status of this game once it is a human player's turn
+        or the game is over.
+        """
+        await self._ready.wait()
+        return self.status()
+
+    def human_move(self, action: Action, cell: tuple[int, int],
+                   level: int) -> bool:
+        """Attempt to apply <action> to the block at <level> that includes the
+        unit <cell> for the human player whose turn it is.
+
+        Return True iff the action is successfully performed.
+        """
+        if not self._ready.is_set() or self.is_over():
+            return False
+        board = self.data.board
+        block = _get_block(board, cell,
+                           max(0, min(level, board.max_depth)))
+        if block is None or not self._do_move((action, block)):
+            return False
+        self._ready.clear()
+        return True
+
+    async def squares(self) -> list:
+        """Return the squares that must be drawn to render the board.
+        """
+        async with self._lock:
+            return _block_to_squares(self.data.board)
+
+
+class GameServer:
+    """A server hosting many concurrent games of Blocky.
+
+    Private Instance Attributes:
+    - _games: A dictionary mapping the id of each hosted game to its session.
+    - _ids: The ids to give to new games.
+    - _executor: The executor that computes the moves of computer players.
+    - _tasks: The tasks letting computer players move, which are kept so
+              that they are not garbage collected while running.
+    """
+    _games: dict[int, GameSession]
+    _ids: itertools.count
+    _executor: Executor
+    _tasks: set[asyncio.Task]
+
+    def __init__(self, executor: Executor | None = None) -> None:
+        """Initialize this GameServer with no games.
+
+        The moves of computer players are computed by <executor>, or by a pool
+        of AI_WORKERS threads if <executor> is None.
+        """
+        self._games = {}
+        self._ids = itertools.count()
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=AI_WORKERS)
+        self._executor = executor
+        self._tasks = set()
+
+    def _advance(self, game: GameSession) -> None:
+        """Start letting the computer players of <game> move.
+        """
+        task = asyncio.create_task(game.advance(self._executor))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def new_game(self, max_depth: int, num_human: int, num_random: int,
+                 smart_players: list[int], max_turns: int) -> int:
+        """Start a new game with the given configuration and return its id.
+
+        Preconditions:
+        - 0 <= max_depth <= MAX_GAME_DEPTH
+        - num_human >= 0 and num_random >= 0
+        - every difficulty in smart_players is >= 0
+        - 1 <= num_human + num_random + len(smart_players) <= len(COLOUR_LIST)
+        - max_turns >= 1
+        """
+        board = generate_board(max_depth)
+        players = create_players(num_human, num_random, smart_players)
+        data = GameData(board, players)
+        data.max_turns = max_turns
+        game_id = next(self._ids)
+        self._games[game_id] = GameSession(data)
+        self._advance(self._games[game_id])
+        return game_id
+
+    async def handle_request(self, request: dict) -> dict:
+        """Return the response to the client <request>.
+
+        Raise a ValueError if <request> is not a dict, or one of its fields
+        has the wrong type or is out of range.
+        """
+        if not isinstance(request, dict):
+            raise ValueError('request must be an object')
+        op = request.get('op')
+        if op == 'new':
+            game_id = self.new_game(*_new_game_args(request))
+            return {'ok': True, 'game': game_id}
+        game_id = _int_field(request, 'game', None, 0)
+        game = self._games.get(game_id)
+        if game is None:
+            return {'ok': False, 'error': 'unknown game'}
+        if op == 'wait':
+            status = await game.wait()
+            if status['over']:
+                self._games.pop(game_id, None)
+            return {'ok': True, **status}
+        elif op == 'move':
+            action = ACTIONS.get(request.get('action'))
+            if action is None:
+                return {'ok': False, 'error': 'unknown action'}
+            cell = (_int_field(request, 'x', 0, 0),
+                    _int_field(request, 'y', 0, 0))
+            level = _int_field(request, 'level', 0, 0)
+            if not game.human_move(action, cell, level):
+                return {'ok': False}
+            self._advance(game)
+            return {'ok': True}
+        elif op == 'board':
+            return {'ok': True, 'squares': await game.squares()}
+        return {'ok': False, 'error': 'unknown op'}
+
+    async def _respond(self, line: bytes) -> dict:
+        """Return the response to the request in the JSON <line> sent by a
+        client.
+
+        A request that cannot be handled gets a response with its error
+        instead, so that one bad request never drops the client.
+        """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {'ok': False, 'error': 'malformed request'}
+        try:
+            return await self.handle_request(request)
+        except ValueError as error:
+            return {'ok': False, 'error': str(error)}
+        except Exception as error:
+            return {'ok': False,
+                    'error': f'internal error: {type(error).__name__}'}
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        """Respond to each request line sent by a client until it
+        disconnects.
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self._respond(line)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve_tcp(self, host: str, port: int) -> asyncio.Server:
+        """Start accepting clients on the TCP <host> and <port>.
+        """
+        return await asyncio.start_server(self.handle_client, host, port,
+                                          limit=2 ** 20, backlog=2048)
+
+    async def serve_unix(self, path: str) -> asyncio.Server:
+        """Start accepting clients on the Unix socket at <path>.
+        """
+        return await asyncio.start_unix_server(self.handle_client, path,
+                                               limit=2 ** 20, backlog=2048)
+
+
+def _int_field(request: dict, key: str, default: int | None, low: int,
+               high: int | None = None) -> int:
+    """Return the int at <key> of <request>, or <default> if there is none.
+
+    Raise a ValueError if the value is not an int (a bool is not an int
+    here), or is not between <low> and <high>, where a <high> of None means
+    there is no upper bound.
+
+    >>> _int_field({'level': 2}, 'level', 0, 0, 3)
+    2
+    >>> _int_field({}, 'level', 0, 0, 3)
+    0
+    >>> _int_field({'level': 'x'}, 'level', 0, 0, 3)
+    Traceback (most recent call last):
+    ...
+    ValueError: level must be an int
+    >>> _int_field({'level': 4}, 'level', 0, 0, 3)
+    Traceback (most recent call last):
+    ...
+    ValueError: level must be between 0 and 3
+    """
+    value = request.get(key, default)
+    if type(value) is not int:
+        raise ValueError(f'{key} must be an int')
+    if value < low or (high is not None and value > high):
+        if high is None:
+            raise ValueError(f'{key} must be at least {low}')
+        raise ValueError(f'{key} must be between {low} and {high}')
+    return value
+
+
+def _new_game_args(request: dict) -> tuple[int, int, int, list[int], int]:
+    """Return the arguments of GameServer.new_game for the "new" <request>,
+    with the same defaults as the client protocol.
+
+    Raise a ValueError if they do not satisfy the preconditions of new_game.
+
+    >>> _new_game_args({'op': 'new', 'smart_players': [2]})
+    (3, 1, 0, [2], 5)
+    >>> _new_game_args({'op': 'new', 'num_human': 9})
+    Traceback (most recent call last):
+    ...
+    ValueError: a game must have between 1 and 4 players
+    >>> _new_game_args({'op': 'new', 'max_depth': 'x'})
+    Traceback (most recent call last):
+    ...
+    ValueError: max_depth must be an int
+    """
+    max_depth = _int_field(request, 'max_depth', 3, 0, MAX_GAME_DEPTH)
+    num_human = _int_field(request, 'num_human', 1, 0)
+    num_random = _int_field(request, 'num_random', 0, 0)
+    smart_players = request.get('smart_players', [])
+    if not isinstance(smart_players, list):
+        raise ValueError('smart_players must be a list')
+    for difficulty in smart_players:
+        if type(difficulty) is not int or difficulty < 0:
+            raise ValueError('smart_players must be a list of ints >= 0')
+    max_turns = _int_field(request, 'max_turns', 5, 1)
+    num_players = num_human + num_random + len(smart_players)
+    if not 1 <= num_players <= len(COLOUR_LIST):
+        raise ValueError('a game must have between 1 and '
+                         f'{len(COLOUR_LIST)} players')
+    return max_depth, num_human, num_random, smart_players, max_turns
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'asyncio',
+            'itertools', 'json', 'concurrent.futures', 'actions', 'block',
+            'game_data', 'player', 'settings'
+        ],
+        'max-attributes': 10
+    })
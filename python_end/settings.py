@@ -27,6 +27,11 @@ TEXT_COLOUR = WHITE
 OUTLINE_COLOUR = BLACK
 # Blocks will have this thick of an outline.
 OUTLINE_THICKNESS = 2
+# Blocks smaller than this many pixels on the screen will be drawn without an
+# outline, and divided blocks this small will be drawn as one square.
+LOD_SIZE = 2 * OUTLINE_THICKNESS + 1
+# The board can be magnified up to this many times.
+MAX_ZOOM = 64
 # Blocks will be highlighted with this colour.
 HIGHLIGHT_COLOUR = TEMPTING_TURQUOISE
 # Highlighted blocks will have this thickness to the highlight.
@@ -35,6 +40,10 @@ HIGHLIGHT_THICKNESS = 5
 # The number of seconds a move is animated for.
 ANIMATION_DURATION = 1
 
+# The number of seconds after which a computer player stops assessing moves
+# and makes the best move it has found so far.
+MOVE_DEADLINE = 10.0
+
 
 class UnknownColourError(Exception):
     """ An exception to be raised when the name of the colour is not known.
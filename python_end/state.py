@@ -6,54 +6,16 @@ This file contains the different game states for the Blocky game.
 from __future__ import annotations
 import pygame
 
+import controls
 from actions import Action
-from block import Block, _block_to_squares
+from block import Block, _block_to_squares, _lod_squares
+from game_data import GameData
+from history import MoveHistory, MoveRecord
 from player import Player
 from renderer import Renderer
 from settings import ANIMATION_DURATION
 
 
-class GameData:
-    """
-    A bundle of the data needed for a Blocky game.
-
-    Instance Attributes:
-    - max_turns: The maximum number of turns for the game.
-    - board: The Blocky board on which this game will be played.
-    - players: The entities that are playing this game.
-
-    Representation Invariants:
-    - len(self.players) >= 1
-    - self.max_turns >= 1
-    """
-    max_turns: int
-    board: Block
-    players: list[Player]
-
-    def __init__(self, board: Block, players: list[Player]) -> None:
-        """Initialize the game data, saving a reference to <board> and
-        <players>. The max_turns attribute is initially zero and will be later
-        set by the actual game when it is played.
-
-        Preconditions:
-        - len(players) >= 1
-        """
-        self.max_turns = 0
-        self.board = board
-        self.players = players
-
-    def calculate_score(self, player_id: int) -> tuple[int, int]:
-        """Return a tuple containing first the <player_id>'s score based on
-        their goal in the game and second the deductions from their score based
-        on the actions they've taken.
-        """
-        goal_score = self.players[player_id].goal.score(self.board)
-
-        penalty = self.players[player_id].penalty
-
-        return goal_score, penalty
-
-
 class GameState:
     """One of the different states that a Blocky game can be in.
     """
@@ -84,11 +46,13 @@ class MainState(GameState):
     - _data: A reference to the shared GameData.
     - _current_player_index: The index of the current player in GameData.players.
     - _current_score: The score of the current player, including penalties.
+    - _history: The moves made in this game, which can be undone and redone.
     """
     _turn: int
     _data: GameData
     _current_player_index: int
     _current_score: int
+    _history: MoveHistory
 
     def __init__(self, data: GameData) -> None:
         """Initialize this GameState.
@@ -96,6 +60,7 @@ class MainState(GameState):
         self._turn = 0
         self._data = data
         self._current_player_index = 0
+        self._history = MoveHistory()
 
         score, penalty = self._data.calculate_score(self._current_player().id)
         self._current_score = score - penalty
@@ -127,7 +92,9 @@ class MainState(GameState):
         action, block = move
         player = self._current_player()
 
-        move_successful = action.apply(block, {'colour': player.goal.colour})
+        record = MoveRecord(action, block, self._current_player_index,
+                            self._turn, self._current_score)
+        move_successful = self._history.do(record, player.goal.colour)
 
         if move_successful:
             player.penalty += action.penalty
@@ -135,8 +102,47 @@ class MainState(GameState):
 
         return move_successful
 
+    def undo(self) -> bool:
+        """Undo the most recent move that has not been undone, restoring the
+        board, the penalty of the player who made it, and the turn and score
+        from before it, so that it is that player's turn again.
+
+        Return True iff there was a move to undo.
+        """
+        record = self._history.undo()
+        if record is None:
+            return False
+        self._data.players[record.player_index].penalty -= \
+            record.action.penalty
+        self._current_player_index = record.player_index
+        self._turn = record.turn
+        self._current_score = record.score
+        return True
+
+    def redo(self) -> bool:
+        """Redo the most recently undone move, as if its player had made it
+        again.
+
+        Return True iff there was a move to redo.
+        """
+        record = self._history.redo()
+        if record is None:
+            return False
+        self._data.players[record.player_index].penalty += \
+            record.action.penalty
+        self._current_player_index = record.player_index
+        self._turn = record.turn
+        self._update_player()
+        return True
+
     def process_event(self, event: pygame.event.Event) -> None:
-        self._current_player().process_event(event)
+        key = controls.released_key(event)
+        if key == controls.KEY_UNDO:
+            self.undo()
+        elif key == controls.KEY_REDO:
+            self.redo()
+        else:
+            self._current_player().process_event(event)
 
     def update(self) -> GameState:
         if self._turn >= self._data.max_turns:
@@ -163,11 +169,18 @@ class MainState(GameState):
                 return self
 
     def render(self, renderer: Renderer) -> None:
-        renderer.draw_board(_block_to_squares(self._data.board))
+        # Only draw the blocks that are shown, in as much detail as is visible
+        max_depth = self._data.board.max_depth
+        renderer.draw_board(_lod_squares(self._data.board,
+                                         renderer.min_block_width(max_depth),
+                                         renderer.viewport.cell_region(
+                                             max_depth)),
+                            max_depth)
 
         b = self._current_player().get_selected_block(self._data.board)
         if b is not None:
-            renderer.highlight_block(b.position, b.size)
+            renderer.highlight_block(b.cell, 1 << (max_depth - b.level),
+                                     max_depth)
 
         p = self._current_player()
         p_type = str(p.__class__)
@@ -221,15 +234,16 @@ class AnimateMoveState(GameState):
             return self
 
     def render(self, renderer: Renderer) -> None:
-        renderer.draw_board(self._background)
+        b = self._move[1]
+        renderer.draw_board(self._background, b.max_depth)
 
         # Draw an outline around the selected block
-        b = self._move[1]
-        renderer.highlight_block(b.position, b.size)
+        width = 1 << (b.max_depth - b.level)
+        renderer.highlight_block(b.cell, width, b.max_depth)
 
         # Draw the image representing the move
         action = self._move[0]
-        renderer.draw_image(action, b.position, b.size)
+        renderer.draw_image(action, b.cell, width, b.max_depth)
 
         # Update the status message based on the action being performed.
         status = f'Player {self._player_id} is {action.message}'
@@ -250,9 +264,10 @@ class GameOverState(GameState):
         """Initialize this GameState.
         """
         self._scores = []
-        for p in data.players:
-            goal_score, penalty = data.calculate_score(p.id)
-            self._scores.append((p.id, goal_score, penalty))
+        all_scores = data.calculate_all_scores()
+        for i in range(len(data.players)):
+            goal_score, penalty = all_scores[i]
+            self._scores.append((data.players[i].id, goal_score, penalty))
         self._winner = max(self._scores, key=lambda item: item[1] - item[2])[0]
 
     def process_event(self, event: pygame.event.Event) -> None:
@@ -285,7 +300,8 @@ if __name__ == '__main__':
         'allowed-io': ['run_game'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'pygame', '__future__',
-            'block', 'player', 'renderer', 'settings', 'actions'
+            'block', 'controls', 'game_data', 'history', 'player',
+            'renderer', 'settings', 'actions'
         ],
         'generated-members': 'pygame.*'
     })
@@ -0,0 +1,202 @@
+""" Module Description:
+
+This file contains the Viewport class, which is the part of the board that is
+shown on the screen when it is zoomed in.
+
+The board is magnified by a power of 2, and the viewport can be moved around
+the board, but never past its edges. Squares of unit cells of the board are
+converted to rectangles on the screen, and positions on the screen to unit
+cells, so that blocks are drawn where they appear and the mouse selects the
+block under it. This is the only place where unit cells are turned into
+pixels.
+"""
+from __future__ import annotations
+import math
+
+from settings import MAX_ZOOM
+
+
+class Viewport:
+    """A square region of a board that is magnified to fill the screen.
+
+    Instance Attributes:
+    - size: The size of the board, and of the region of the screen that it is
+            drawn on, in pixels.
+    - zoom: The number of pixels on the screen for each pixel of the board.
+    - corner: The (x, y) coordinates on the board of the upper left corner of
+              the region that is shown.
+
+    Representation Invariants:
+    - 1 <= zoom <= MAX_ZOOM, and zoom is a power of 2
+    - 0 <= corner[0] <= size - size / zoom
+    - 0 <= corner[1] <= size - size / zoom
+    """
+    size: int
+    zoom: int
+    corner: tuple[float, float]
+
+    def __init__(self, size: int) -> None:
+        """Initialize this Viewport to show the whole of a board with
+        dimensions <size> by <size>.
+        """
+        self.size = size
+        self.zoom = 1
+        self.corner = (0, 0)
+
+    def region(self) -> tuple[tuple[float, float], float]:
+        """Return the upper left corner and the size of the region of the board
+        that is shown.
+        """
+        return self.corner, self.size / self.zoom
+
+    def zoom_by(self, steps: int) -> None:
+        """Magnify the board twice as much <steps> times, or half as much if
+        <steps> is negative, keeping the centre of the region that is shown
+        where it is, as far as the edges of the board allow.
+
+        >>> viewport = Viewport(800)
+        >>> viewport.zoom_by(2)
+        >>> viewport.region()
+        ((300.0, 300.0), 200.0)
+        >>> viewport.zoom_by(-5)
+        >>> viewport.region()
+        ((0.0, 0.0), 800.0)
+        """
+        (x, y), size = self.region()
+        zoom = self.zoom * 2 ** steps
+        self.zoom = int(min(max(zoom, 1), MAX_ZOOM))
+        new_size = self.size / self.zoom
+        self._move_to(x + (size - new_size) / 2, y + (size - new_size) / 2)
+
+    def pan(self, dx: float, dy: float) -> None:
+        """Move the region that is shown right by <dx> and down by <dy> times
+        its size, as far as the edges of the board allow.
+
+        >>> viewport = Viewport(800)
+        >>> viewport.zoom_by(1)
+        >>> viewport.pan(-0.25, 1)
+        >>> viewport.region()
+        ((100.0, 400.0), 400.0)
+        """
+        (x, y), size = self.region()
+        self._move_to(x + dx * size, y + dy * size)
+
+    def _move_to(self, x: float, y: float) -> None:
+        """Move the upper left corner of the region that is shown to (<x>,
+        <y>), or as close to it as the edges of the board allow.
+        """
+        limit = self.size - self.size / self.zoom
+        self.corner = (min(max(x, 0.0), limit), min(max(y, 0.0), limit))
+
+    def cell_region(self, max_depth: int) -> tuple[tuple[float, float], float]:
+        """Return the upper left corner and the width of the region of a board
+        of <max_depth> that is shown, in unit cells.
+
+        >>> viewport = Viewport(800)
+        >>> viewport.zoom_by(2)
+        >>> viewport.cell_region(4)
+        ((6.0, 6.0), 4.0)
+        """
+        (x, y), size = self.region()
+        cells_per_pixel = (1 << max_depth) / self.size
+        return ((x * cells_per_pixel, y * cells_per_pixel),
+                size * cells_per_pixel)
+
+    def to_screen(self, cell: tuple[int, int], width: int, max_depth: int) \
+            -> tuple[int, int, int, int]:
+        """Return the rectangle on the screen, as its x and y coordinates, its
+        width and its height, of the square of a board of <max_depth> with its
+        upper left unit cell at <cell> and <width> unit cells wide.
+
+        Each pixel shows the unit cell that its upper left corner is in, as
+        for to_cell, so squares that share an edge on the board share it on
+        the screen. A square that would not cover a whole pixel is drawn one
+        pixel wide, at the pixel that its upper left corner is in, so that no
+        square is lost or drawn off the board, however deep the board is.
+
+        >>> viewport = Viewport(800)
+        >>> viewport.to_screen((2, 4), 1, 4)
+        (100, 200, 50, 50)
+        >>> viewport.to_screen((4095, 0), 1, 12)
+        (799, 0, 1, 1)
+        >>> viewport.zoom_by(1)
+        >>> viewport.to_screen((6, 5), 1, 4)
+        (200, 100, 100, 100)
+        """
+        pixels_per_cell = self.size / (1 << max_depth)
+        x, y = self.corner
+        length = width * pixels_per_cell * self.zoom
+        left, right = _span((cell[0] * pixels_per_cell - x) * self.zoom,
+                            length)
+        top, bottom = _span((cell[1] * pixels_per_cell - y) * self.zoom,
+                            length)
+        return left, top, right - left, bottom - top
+
+    def cell_edges(self, max_depth: int) -> list[int]:
+        """Return the coordinate on the screen of the left (or top) edge of
+        every column (or row) of unit cells of a board of <max_depth>, and of
+        the right (or bottom) edge of the board, when the whole board is
+        shown.
+
+        These are the edges of the rectangles of to_screen at a zoom of 1,
+        except for squares that do not cover a whole pixel.
+
+        >>> Viewport(750).cell_edges(3)
+        [0, 94, 188, 282, 375, 469, 563, 657, 750]
+        """
+        return [-((-i * self.size) >> max_depth)
+                for i in range((1 << max_depth) + 1)]
+
+    def to_cell(self, position: tuple[int, int], max_depth: int) \
+            -> tuple[int, int] | None:
+        """Return the unit cell of a board of <max_depth> that is shown at
+        <position> on the screen, or None if <position> is outside the region
+        of the screen that the board is drawn on.
+
+        >>> viewport = Viewport(800)
+        >>> viewport.to_cell((799, 50), 4)
+        (15, 1)
+        >>> viewport.to_cell((799, 50), 12)
+        (4090, 256)
+        >>> viewport.zoom_by(1)
+        >>> viewport.to_cell((201, 0), 4)
+        (6, 4)
+        >>> viewport.to_cell((1000, 100), 4) is None
+        True
+        """
+        if not (0 <= position[0] < self.size and 0 <= position[1] < self.size):
+            return None
+        x, y = self.corner
+        last = (1 << max_depth) - 1
+        cells_per_pixel = (1 << max_depth) / self.size
+        return (min(int((x + position[0] / self.zoom) * cells_per_pixel), last),
+                min(int((y + position[1] / self.zoom) * cells_per_pixel), last))
+
+
+def _span(start: float, length: float) -> tuple[int, int]:
+    """Return the first pixel and the pixel after the last pixel of the span
+    from <start> that is <length> pixels long, where a pixel is in the span
+    iff its left edge is.
+
+    A span that has no pixels is given the pixel that <start> is in.
+
+    >>> _span(2.5, 2.0), _span(0.2, 0.5)
+    ((3, 5), (0, 1))
+    """
+    first = math.ceil(start)
+    last = math.ceil(start + length)
+    if last == first:
+        first = math.floor(start)
+        last = first + 1
+    return first, last
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'math',
+            'settings'
+        ]
+    })